@@ -1,20 +1,22 @@
 import sys
-import socket
+import logging
+import asyncio
 import threading
 from PyQt5 import QtWidgets, QtCore
 from play_video import VideoPlayer
-import re
 from viseme_generator import GenerateVideoAndAudio
+from async_server import JobServer
 
 class VideoApplication(QtWidgets.QApplication):
     play_video_signal = QtCore.pyqtSignal(str)  # Signal to play video
 
-    def __init__(self, argv):
+    def __init__(self, argv, idle_videos=()):
         print("Initing VideoPlayer")
         super().__init__(argv)
-        self.player = VideoPlayer()
+        # The idle loops stay loaded, so switching modes and returning from a reply is instant.
+        self.player = VideoPlayer(idle_videos)
         self.player.show()
-        # self.play_video_signal.connect(self.player.play_video)
+        self.play_video_signal.connect(self.player.play_video)
 
     def play_video(self, path):
         self.play_video_signal.emit(path)  # Emit signal from any thread
@@ -24,88 +26,43 @@ def play_video_test():
     print("Do nothing")
 
 
-def handle_client(client_socket, address, app):
-    print(f"Connected to {address}")
+# Mode command -> (generator mode, idle video to play or None, label)
+MODES = {
+    "beff-mode": ("beff-mode", None, "El Jeffe Mode"),
+    "jigar-mode": ("jigar-mode", None, "Jigario Mode"),
+    "regular-mode": ("regular-mode", None, "Regular Mode"),
+    "sarayu-mode": ("sarayu-mode", "video/sarayu.mp4", "Sarayu Mode"),
+    "mickey-mode": ("mickey-mode", None, "Mickey Mode"),
+    "beff-local-mode": ("beff-local-mode", None, "El Jeffe Mode (local)"),
+    "hulk-local-mode": ("hulk-local-mode", None, "Hulk Mode (local)"),
+}
 
-    try:
-        while True:
-            data = client_socket.recv(8192).decode('utf-8')
-            if not data:
-                break
-
-            if "beff-mode" in data: 
-                generateVideoAndAudio.set_mode("beff-mode")
-                # app.play_video("video/beff.mp4")
-                print("\n El Jeffe Mode \n")
-
-            if "jigar-mode" in data: 
-                generateVideoAndAudio.set_mode("jigar-mode")
-                # app.play_video("video/jigar.mp4")
-                print("\n Jigario Mode \n")
-                
-
-            if "regular-mode" in data:
-                generateVideoAndAudio.set_mode("regular-mode")
-                # app.play_video("video/default.mp4")
-                print("\n Regular Mode \n")
 
-            if "sarayu-mode" in data:
-                generateVideoAndAudio.set_mode("sarayu-mode")
-                app.play_video("video/sarayu.mp4")
-                print("\n Sarayu Mode \n")
+def on_mode(app, mode):
+    # The mode itself travels with each job, switching it here would leak into other clients' requests.
+    generator_mode, idle_video, label = MODES[mode]
+    if idle_video is not None:
+        app.play_video(idle_video)
+    print(f"\n {label} \n")
 
-            if "mickey-mode" in data:
-                generateVideoAndAudio.set_mode("mickey-mode")
-                # app.play_video("video/hulk.mp4")
-                print("\n Mickey Mode \n")
 
-            if "ssml" in data:
-                print(f"Raw data {address}: {data}")
-                extracted_strings = re.findall(r"<speak>(.*)</speak>", data)
-                print(f"Received from {address}: {extracted_strings}")
-                if(isinstance(extracted_strings, (list))):
-                    extracted_strings = extracted_strings[0].replace("\\n","")
-                else:
-                    extracted_strings = extracted_strings.replace("\\n","")
-                # print(f"Cleaned up: {address}: {extracted_strings}")
-                extracted_strings = extracted_strings.replace("\\", "")
-                # print(f"Cleaned up 2: {address}: {extracted_strings}")
-                # generateVideoAndAudio = GenerateVideoAndAudio(play_video_test, "beff-mode")
-                generateVideoAndAudio.generateViseme(extracted_strings)
-                # app.play_video("video/2.mp4")
-                # print(f"Raw Data: {data}")
+def run_job(mode, text):
+    job = generateVideoAndAudio.generateViseme(text, MODES[mode][0] if mode is not None else None)
+    return job.final_path
 
-            # Example of triggering video playback from the worker thread
-            
-
-            client_socket.send("Data received".encode('utf-8'))
-            if data == 'close':
-                print(f"Closing connection with {address} as requested.")
-                break
-    finally:
-        client_socket.close()
 
 def start_server(app):
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    # server_socket.bind(('192.168.0.229', 12345))
-    server_socket.bind(('192.168.0.229', 12345))
-    server_socket.listen(5)
-
-    print("Starting Server")
-
+    job_server = JobServer(run_job, on_mode=lambda mode: on_mode(app, mode))
     try:
-        while True:
-            client_socket, address = server_socket.accept()
-            threading.Thread(target=handle_client, args=(client_socket, address, app)).start()
+        asyncio.run(job_server.serve('192.168.0.229', 12345))
     except KeyboardInterrupt:
         pass
-    finally:
-        server_socket.close()
 
 if __name__ == '__main__':
-    app = VideoApplication(sys.argv)
+    app = VideoApplication(sys.argv, sorted({idle_video for _, idle_video, _ in MODES.values() if idle_video is not None}))
     print("VideoApplication init")
-    generateVideoAndAudio = GenerateVideoAndAudio(play_video_test, "beff-mode")
+    generateVideoAndAudio = GenerateVideoAndAudio(play_video_test, "beff-mode", play_callback=app.play_video)
+    logging.basicConfig(stream=sys.stdout, level=generateVideoAndAudio.get_args().log_level, format="[%(asctime)s] %(message)s")
     server_thread = threading.Thread(target=start_server, args=(app,))
     server_thread.start()
     sys.exit(app.exec_())
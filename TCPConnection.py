@@ -1,13 +1,14 @@
 import sys
-import socket
+import logging
+import asyncio
 import threading
 from PyQt5 import QtWidgets, QtCore
 from play_video import VideoPlayer
-import re
 from viseme_generator import GenerateVideoAndAudio
+from async_server import JobServer
 
 """
-This script sets up a server that interacts with a PyQt5-based video player application, allowing remote clients to send commands via socket communication to play different videos or generate lip-synced videos using visemes. It uses a multithreaded architecture to handle multiple clients concurrently and perform video playback in a PyQt5 GUI. The `GenerateVideoAndAudio` class is used to process SSML (Speech Synthesis Markup Language) input and generate videos synchronized with viseme data.
+This script sets up a server that interacts with a PyQt5-based video player application, allowing remote clients to send commands via socket communication to play different videos or generate lip-synced videos using visemes. Connections are served by an asyncio front end (`async_server.JobServer`) that queues requests for a fixed pool of workers, while video playback happens in a PyQt5 GUI. The `GenerateVideoAndAudio` class is used to process SSML (Speech Synthesis Markup Language) input and generate videos synchronized with viseme data.
 
 ### Key Components:
 
@@ -16,23 +17,25 @@ This script sets up a server that interacts with a PyQt5-based video player appl
    - The class defines a `play_video_signal`, which is used to trigger video playback from different threads safely (since GUI operations must occur in the main thread).
    
 2. **Client Command Handling**:
-   - The server listens for incoming socket connections. Each client connection is handled by a separate thread (`handle_client`), allowing multiple clients to send commands concurrently.
    - Commands like `"beff-mode"`, `"jigar-mode"`, and `"ssml"` trigger specific modes in the `GenerateVideoAndAudio` class and play the corresponding video.
-   - For SSML input, the script extracts text from the SSML markup, generates viseme-based videos using `GenerateVideoAndAudio`, and plays the resulting video.
+   - For SSML input, the script extracts text from the SSML markup and queues a job that generates the viseme-based video using `GenerateVideoAndAudio` and plays it.
+   - When the job queue is full the client receives `Busy` instead of the request being run.
+   - A `stats` message (or `GET /metrics` over HTTP) returns the per-stage latency histograms, counters and queue depth (`tracing.py`).
+   - With `--live` the replies are shown on a `live_player.LivePlayer` window while they are synthesized, instead of being encoded and played from a file.
 
 3. **Socket Server**:
-   - The `start_server` function initializes a TCP server on a specific IP and port (`192.168.0.229:12345`), accepting multiple clients.
-   - It spawns a new thread for each client connection to handle incoming commands without blocking other clients.
+   - The `start_server` function runs the asyncio server on a specific IP and port (`192.168.0.229:12345`), accepting multiple clients on one event loop.
 
 ### Key Functions:
 
-1. **`handle_client(client_socket, address, app)`**:
-   - Handles incoming client messages, processes different commands (modes and SSML input), and sends responses back to the client.
-   - It triggers video playback in the PyQt5 application by emitting the `play_video_signal`.
+1. **`on_mode(app, mode)`**:
+   - Plays the idle video of the selected mode. The mode is remembered per connection and passed with each job, so clients no longer switch each other's voice.
 
-2. **`start_server(app)`**:
-   - Initializes a server socket and listens for incoming client connections.
-   - Each client connection is handled in a separate thread by calling `handle_client`.
+2. **`run_job(app, mode, text)`**:
+   - Runs on a worker thread: generates the lip-synced video for the text in its own job workspace and plays it in the PyQt5 application by emitting the `play_video_signal`.
+
+3. **`start_server(app)`**:
+   - Starts the `JobServer` and serves clients until interrupted.
 
 3. **`GenerateVideoAndAudio.generateViseme(extracted_strings)`**:
    - When the server receives an SSML command, the script extracts the text, generates viseme data, and produces a video file with the appropriate mouth movements synchronized to the audio.
@@ -48,10 +51,11 @@ This script sets up a server that interacts with a PyQt5-based video player appl
 class VideoApplication(QtWidgets.QApplication):
     play_video_signal = QtCore.pyqtSignal(str)  # Signal to play video
 
-    def __init__(self, argv):
+    def __init__(self, argv, idle_videos=()):
         print("Initing VideoPlayer")
         super().__init__(argv)
-        self.player = VideoPlayer()
+        # The idle loops stay loaded, so switching modes and returning from a reply is instant.
+        self.player = VideoPlayer(idle_videos)
         self.player.show()
         self.play_video_signal.connect(self.player.play_video)
 
@@ -63,88 +67,51 @@ def play_video_test():
     print("Do nothing")
 
 
-def handle_client(client_socket, address, app):
-    print(f"Connected to {address}")
+# Mode command -> (generator mode, idle video to play, label)
+MODES = {
+    "beff-mode": ("beff-mode", "video/beff.mp4", "El Beffe Mode"),
+    "jigar-mode": ("jigar-mode", "video/jigar.mp4", "Jigario Mode"),
+    "regular-mode": ("regular-mode", "video/default.mp4", "Regular Mode"),
+    "sarayu-mode": ("phone-mode", "video/sarayu.mp4", "Sarayu Mode"),
+    "mickey-mode": ("mickey-mode", "video/hulk.mp4", "Mickey Mode"),
+    "beff-local-mode": ("beff-local-mode", "video/beff.mp4", "El Beffe Mode (local)"),
+    "hulk-local-mode": ("hulk-local-mode", "video/hulk.mp4", "Hulk Mode (local)"),
+}
 
-    try:
-        while True:
-            data = client_socket.recv(8192).decode('utf-8')
-            if not data:
-                break
-
-            if "beff-mode" in data: 
-                generateVideoAndAudio.set_mode("beff-mode")
-                app.play_video("video/beff.mp4")
-                print("\n El Beffe Mode \n")
-
-            if "jigar-mode" in data: 
-                generateVideoAndAudio.set_mode("jigar-mode")
-                app.play_video("video/jigar.mp4")
-                print("\n Jigario Mode \n")
-                
-
-            if "regular-mode" in data:
-                generateVideoAndAudio.set_mode("regular-mode")
-                app.play_video("video/default.mp4")
-                print("\n Regular Mode \n")
-
-            if "sarayu-mode" in data:
-                generateVideoAndAudio.set_mode("phone-mode")
-                app.play_video("video/sarayu.mp4")
-                print("\n Sarayu Mode \n")
-
-            if "mickey-mode" in data:
-                generateVideoAndAudio.set_mode("mickey-mode")
-                app.play_video("video/hulk.mp4")
-                print("\n Mickey Mode \n")
-
-            if "ssml" in data:
-                print(f"Raw data {address}: {data}")
-                extracted_strings = re.findall(r"<speak>(.*)</speak>", data)
-                print(f"Received from {address}: {extracted_strings}")
-                if(isinstance(extracted_strings, (list))):
-                    extracted_strings = extracted_strings[0].replace("\\n","")
-                else:
-                    extracted_strings = extracted_strings.replace("\\n","")
-                # print(f"Cleaned up: {address}: {extracted_strings}")
-                extracted_strings = extracted_strings.replace("\\", "")
-                # print(f"Cleaned up 2: {address}: {extracted_strings}")
-                # generateVideoAndAudio = GenerateVideoAndAudio(play_video_test, "beff-mode")
-                generateVideoAndAudio.generateViseme(extracted_strings)
-                app.play_video("video/2.mp4")
-                # print(f"Raw Data: {data}")
-
-            # Example of triggering video playback from the worker thread
-            
-
-            client_socket.send("Data received".encode('utf-8'))
-            if data == 'close':
-                print(f"Closing connection with {address} as requested.")
-                break
-    finally:
-        client_socket.close()
 
-def start_server(app):
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    # server_socket.bind(('192.168.0.229', 12345))
-    server_socket.bind(('192.168.0.229', 12345))
-    server_socket.listen(5)
+def on_mode(app, mode):
+    # The mode itself travels with each job, switching it here would leak into other clients' requests.
+    generator_mode, idle_video, label = MODES[mode]
+    app.play_video(idle_video)
+    print(f"\n {label} \n")
 
-    print("Starting Server")
 
+def run_job(app, mode, text):
+    job = generateVideoAndAudio.generateViseme(text, MODES[mode][0] if mode is not None else None)
+    if not job.streamed_to_player and job.final_path is not None:
+        app.play_video(job.final_path)
+        job.trace.mark("handoff")
+    return job.final_path
+
+
+def start_server(app):
+    job_server = JobServer(lambda mode, text: run_job(app, mode, text), on_mode=lambda mode: on_mode(app, mode))
     try:
-        while True:
-            client_socket, address = server_socket.accept()
-            threading.Thread(target=handle_client, args=(client_socket, address, app)).start()
+        asyncio.run(job_server.serve('192.168.0.229', 12345))
     except KeyboardInterrupt:
         pass
-    finally:
-        server_socket.close()
 
 if __name__ == '__main__':
-    app = VideoApplication(sys.argv)
+    app = VideoApplication(sys.argv, sorted({idle_video for _, idle_video, _ in MODES.values()}))
     print("VideoApplication init")
-    generateVideoAndAudio = GenerateVideoAndAudio(play_video_test, "beff-mode")
+    generateVideoAndAudio = GenerateVideoAndAudio(play_video_test, "beff-mode", play_callback=app.play_video)
+    logging.basicConfig(stream=sys.stdout, level=generateVideoAndAudio.get_args().log_level, format="[%(asctime)s] %(message)s")
+    if generateVideoAndAudio.get_args().live:
+        # Imported here, QtMultimedia is only needed by the live player.
+        from live_player import LivePlayer
+        live_player = LivePlayer()
+        live_player.show()
+        generateVideoAndAudio.live_player = live_player
     server_thread = threading.Thread(target=start_server, args=(app,))
     server_thread.start()
     sys.exit(app.exec_())
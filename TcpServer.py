@@ -1,6 +1,7 @@
 import socket
 import threading
 import re
+import logging
 from viseme_generator import GenerateVideoAndAudio
 from PyQt5 import QtWidgets
 import sys
@@ -94,6 +95,7 @@ def start_server():
 
 
 if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="[%(asctime)s] %(message)s")
     start_server()
     # while True:
     #     print("While loop")
@@ -0,0 +1,223 @@
+import asyncio
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tracing import metrics
+from wire_protocol import MAGIC, FrameDecoder, ProtocolError, encode_frame
+
+
+"""
+This module is the asyncio front end of the TCP servers (`TCP.py`, `TCPConnection.py`). Connections are accepted on a single event loop and cost almost nothing, while the expensive work (TTS, rendering, muxing) runs in a fixed pool of worker threads fed by a bounded job queue. When the queue is full the client gets an explicit `Busy` response instead of another job piling onto the CPU.
+
+### Key Components:
+
+1. **`parse_message(data)`**:
+   - Extracts the mode commands (`"beff-mode"`, `"jigar-mode"`, ...) and the SSML text from a raw client message, the same way the previous thread-per-client handlers did.
+
+2. **`JobServer` Class**:
+   - `serve(host, port)` runs the asyncio server until cancelled.
+   - Each connection remembers the last mode it selected; a request is queued as `(mode, text)` and answered with `Data received` once its job finishes, or with `Busy` if the queue is full.
+   - `workers` worker tasks take jobs from the queue and run `run_job(mode, text)` in a thread pool of the same size.
+   - `on_mode(mode)` is called on the event loop for every mode command, e.g. to switch the idle video.
+   - Clients that open with `wire_protocol.MAGIC` speak the framed protocol instead: requests are length-prefixed JSON frames with an ID, they can be pipelined on one connection, and each response is sent as soon as its job finishes, tagged with the request ID.
+   - The queue depth, busy workers, time spent waiting in the queue and `Busy` rejections are recorded in `tracing.metrics`. They are read with the `stats` command: a legacy `stats` message is answered with the Prometheus text exposition, a framed `{"type": "stats"}` request with the metrics as JSON, and an HTTP `GET /metrics` on the same port with the Prometheus text, so the server can be scraped directly.
+"""
+
+MODE_COMMANDS = ["beff-mode", "jigar-mode", "regular-mode", "sarayu-mode", "mickey-mode", "beff-local-mode", "hulk-local-mode"]
+# Every job runs in its own workspace (workspace.JobWorkspace), so they can run side by side.
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_QUEUE_SIZE = 8
+BUSY_RESPONSE = "Busy"
+RECEIVED_RESPONSE = "Data received"
+STATS_COMMAND = "stats"
+
+
+def parse_message(data):
+    modes = [mode for mode in MODE_COMMANDS if mode in data]
+    text = None
+    if "ssml" in data:
+        extracted_strings = re.findall(r"<speak>(.*)</speak>", data)
+        if extracted_strings:
+            text = extracted_strings[0].replace("\\n", "").replace("\\", "")
+    return modes, text
+
+
+class JobServer:
+    def __init__(self, run_job, on_mode=None, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.run_job = run_job
+        self.on_mode = on_mode
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue = None
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def serve(self, host, port):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        worker_tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Starting Server on {host}:{port} with {self.workers} workers.")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in worker_tasks:
+                task.cancel()
+            self.executor.shutdown(wait=False)
+
+    async def worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            mode, text, future, queued_at = await self.queue.get()
+            metrics.observe("queue_wait", time.perf_counter() - queued_at)
+            metrics.set_gauge("job_queue_depth", self.queue.qsize())
+            metrics.adjust_gauge("workers_busy", 1)
+            try:
+                result = await loop.run_in_executor(self.executor, self.run_job, mode, text)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                print(f"Job failed: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                metrics.adjust_gauge("workers_busy", -1)
+                self.queue.task_done()
+
+    def submit(self, mode, text):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((mode, text, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            metrics.increment("requests_busy")
+            return None
+        metrics.increment("requests")
+        metrics.set_gauge("job_queue_depth", self.queue.qsize())
+        return future
+
+    async def handle_connection(self, reader, writer):
+        address = writer.get_extra_info("peername")
+        print(f"Connected to {address}")
+        try:
+            data = await reader.read(8192)
+            while data and len(data) < len(MAGIC) and MAGIC.startswith(data):
+                more = await reader.read(8192)
+                if not more:
+                    break
+                data += more
+            if data.startswith(MAGIC):
+                await self.handle_framed(reader, writer, address, data[len(MAGIC):])
+            elif data.startswith(b"GET /metrics"):
+                await self.handle_metrics_http(writer)
+            else:
+                await self.handle_legacy(reader, writer, address, data)
+        except ConnectionError as e:
+            print(f"Connection with {address} lost: {e}")
+        finally:
+            writer.close()
+
+    async def handle_legacy(self, reader, writer, address, data):
+        mode = None
+        while True:
+            data = data.decode("utf-8")
+            if not data:
+                break
+
+            if data.strip() == STATS_COMMAND:
+                writer.write(metrics.to_prometheus().encode("utf-8"))
+                await writer.drain()
+                data = await reader.read(8192)
+                continue
+
+            modes, text = parse_message(data)
+            for selected_mode in modes:
+                mode = selected_mode
+                if self.on_mode is not None:
+                    self.on_mode(selected_mode)
+
+            response = RECEIVED_RESPONSE
+            if text is not None:
+                print(f"Received from {address}: {text}")
+                future = self.submit(mode, text)
+                if future is None:
+                    print(f"Job queue full, rejecting request from {address}.")
+                    response = BUSY_RESPONSE
+                else:
+                    try:
+                        await future
+                    except Exception:
+                        pass
+
+            writer.write(response.encode("utf-8"))
+            await writer.drain()
+            if data == "close":
+                print(f"Closing connection with {address} as requested.")
+                break
+            data = await reader.read(8192)
+
+    async def handle_framed(self, reader, writer, address, data):
+        decoder = FrameDecoder()
+        mode = None
+        responses = set()
+        try:
+            if not data:
+                # The magic bytes may arrive on their own, before the first frame.
+                data = await reader.read(65536)
+            while data:
+                for message in decoder.feed(data):
+                    request_id = message.get("id")
+                    if message.get("type") == "close":
+                        print(f"Closing connection with {address} as requested.")
+                        return
+                    if message.get("type") == STATS_COMMAND:
+                        self.send_frame(writer, {"id": request_id, "status": "ok", "result": metrics.snapshot()})
+                        continue
+                    if message.get("mode") is not None:
+                        if message["mode"] not in MODE_COMMANDS:
+                            self.send_frame(writer, {"id": request_id, "status": "error", "error": f"Unknown mode {message['mode']}."})
+                            continue
+                        mode = message["mode"]
+                        if self.on_mode is not None:
+                            self.on_mode(mode)
+                    if not message.get("text"):
+                        self.send_frame(writer, {"id": request_id, "status": "ok", "result": None})
+                        continue
+                    future = self.submit(mode, message["text"])
+                    if future is None:
+                        print(f"Job queue full, rejecting request {request_id} from {address}.")
+                        self.send_frame(writer, {"id": request_id, "status": "busy"})
+                        continue
+                    response = asyncio.create_task(self.respond(writer, request_id, future))
+                    responses.add(response)
+                    response.add_done_callback(responses.discard)
+                await writer.drain()
+                data = await reader.read(65536)
+        except ProtocolError as e:
+            print(f"Protocol error from {address}: {e}")
+            self.send_frame(writer, {"id": None, "status": "error", "error": str(e)})
+        finally:
+            # Pipelined requests still in flight are answered before the connection closes.
+            if responses:
+                await asyncio.gather(*responses, return_exceptions=True)
+            await writer.drain()
+
+    async def handle_metrics_http(self, writer):
+        body = metrics.to_prometheus().encode("utf-8")
+        writer.write(
+            b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+        )
+        await writer.drain()
+
+    def send_frame(self, writer, message):
+        if not writer.is_closing():
+            writer.write(encode_frame(message))
+
+    async def respond(self, writer, request_id, future):
+        try:
+            result = await future
+            message = {"id": request_id, "status": "ok", "result": result}
+        except Exception as e:
+            message = {"id": request_id, "status": "error", "error": str(e)}
+        self.send_frame(writer, message)
+        await writer.drain()
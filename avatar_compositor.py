@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import cv2
+import numpy as np
+from frame_atlas import frame_atlas, VISEME_FILE_PATTERN
+
+
+"""
+This module renders the avatar modes locally: the viseme sprites (mouth shapes) are blended into the mouth of an avatar photo, instead of uploading the photo and the audio to the remote lipsync API (`lipsync_jeff.LipSync`), waiting for it and downloading the result.
+
+Everything that does not depend on the reply is done once per avatar and image set, so a reply costs what the regular mode costs: one frame lookup and one write per frame.
+
+### Key Components:
+
+1. **`get_mouth_geometry(avatar_path, avatar)`**:
+   - The mouth box `(x, y, width, height)` of an avatar, in its pixels. It is read from `<avatar>.json` (`{"mouth": [x, y, width, height]}`) if there is one, otherwise found with OpenCV's Haar face detector (the mouth sits in the lower part of the face box) when that OpenCV build ships it, otherwise assumed for a centered portrait. `beff.json` and `hulk.json` are measured on their photos, since the assumed box misses them when the detector is not available.
+   - The result is cached per avatar file.
+
+2. **`AvatarCompositor` Class**:
+   - `prepare()` runs once: it scales the avatar to at most `max_height` pixels, paints over its own mouth (`cv2.inpaint`), cuts the lips out of every sprite (the saturated regions, closed and filled, so both lips of a closed mouth are kept), matches their colors to the avatar's lips, scales them to the mouth box and builds a feathered alpha mask per sprite.
+   - `get_frame(id)` returns the finished avatar frame for a viseme. All frames of a set are blended at once with integer NumPy arithmetic and kept in the shared `frame_atlas`, under its memory budget.
+
+3. **`AVATAR_MODES` and `get_compositor(mode, im_dir)`**:
+   - The avatar modes (`"beff-local-mode"`, `"hulk-local-mode"`) and their photos, and the process-wide compositor of each mode and image set, used by `VideoMaker`.
+"""
+
+AVATAR_MODES = {
+    "beff-local-mode": "avatars/beff.jpg",
+    "hulk-local-mode": "avatars/hulk.jpg",
+}
+DEFAULT_MAX_HEIGHT = 720
+# Lips are the only saturated part of the sprites, the face around them is grey.
+LIP_SATURATION = 60
+# Saturated regions at least this large relative to the largest one are part of the lips, smaller ones are JPEG noise.
+LIP_REGION_FRACTION = 0.2
+# The closed sprite mouth is drawn slightly wider than the avatar's, so it covers it.
+MOUTH_SCALE = 1.15
+FEATHER = 0.08
+COLOR_MATCH = 0.6
+
+geometry_cache = {}
+compositors = {}
+compositors_lock = threading.Lock()
+
+
+def mouth_from_face(x, y, width, height):
+    return int(x + width * 0.28), int(y + height * 0.7), int(width * 0.44), int(height * 0.14)
+
+
+def detect_mouth(avatar):
+    cascade_dir = getattr(getattr(cv2, "data", None), "haarcascades", None)
+    if hasattr(cv2, "CascadeClassifier") and cascade_dir:
+        cascade_path = os.path.join(cascade_dir, "haarcascade_frontalface_default.xml")
+        if os.path.exists(cascade_path):
+            gray = cv2.cvtColor(avatar, cv2.COLOR_BGR2GRAY)
+            min_size = (avatar.shape[1] // 8, avatar.shape[0] // 8)
+            faces = cv2.CascadeClassifier(cascade_path).detectMultiScale(gray, 1.1, 5, minSize=min_size)
+            if len(faces):
+                return mouth_from_face(*max(faces, key=lambda face: face[2] * face[3])), "detected"
+    height, width = avatar.shape[:2]
+    return mouth_from_face(width * 0.25, height * 0.2, width * 0.5, height * 0.5), "assumed"
+
+
+def get_mouth_geometry(avatar_path, avatar):
+    key = (os.path.abspath(avatar_path), os.path.getmtime(avatar_path))
+    geometry = geometry_cache.get(key)
+    if geometry is None:
+        override_path = os.path.splitext(avatar_path)[0] + ".json"
+        if os.path.exists(override_path):
+            with open(override_path, "r") as f:
+                geometry = tuple(json.load(f)["mouth"]), "configured"
+        else:
+            geometry = detect_mouth(avatar)
+        print(f"Mouth of {avatar_path} at {geometry[0]} ({geometry[1]}).")
+        geometry_cache[key] = geometry
+    return geometry
+
+
+def get_sprite_size(im_dir):
+    for image in sorted(os.listdir(im_dir)):
+        if VISEME_FILE_PATTERN.match(image):
+            frame = cv2.imread(os.path.join(im_dir, image))
+            if frame is not None:
+                return frame.shape[1], frame.shape[0]
+    raise FileNotFoundError(f"No viseme images in {im_dir}.")
+
+
+def lip_mask(sprite):
+    saturated = (cv2.cvtColor(sprite, cv2.COLOR_BGR2HSV)[..., 1] > LIP_SATURATION).astype(np.uint8)
+    # Joins lips split by a thin unsaturated line, like the crease of a closed mouth.
+    size = max(3, min(sprite.shape[:2]) // 50) | 1
+    saturated = cv2.morphologyEx(saturated, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size)))
+    contours, _ = cv2.findContours(saturated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    mask = np.zeros_like(saturated)
+    if contours:
+        largest = max(cv2.contourArea(contour) for contour in contours)
+        lips = [contour for contour in contours if cv2.contourArea(contour) >= largest * LIP_REGION_FRACTION]
+        if len(lips) > 1:
+            # Upper and lower lip still apart (e.g. teeth between them), the mouth is their hull.
+            lips = [cv2.convexHull(np.vstack(lips))]
+        # Filled, so the teeth and the inside of the mouth are kept.
+        cv2.drawContours(mask, lips, -1, 255, cv2.FILLED)
+    return mask
+
+
+def match_colors(crops, masks, target):
+    # Moves the sprites' lip colors part of the way towards the avatar's own lips (mean and spread in Lab).
+    crops_lab = cv2.cvtColor(crops.reshape(-1, crops.shape[2], 3), cv2.COLOR_BGR2LAB).astype(np.float32)
+    lips = crops_lab.reshape(-1, 3)[masks.reshape(-1) > 0]
+    target_lab = cv2.cvtColor(target, cv2.COLOR_BGR2LAB).reshape(-1, 3).astype(np.float32)
+    source_mean, source_std = lips.mean(axis=0), lips.std(axis=0) + 1e-3
+    target_mean, target_std = target_lab.mean(axis=0), target_lab.std(axis=0)
+    matched = (crops_lab - source_mean) * (target_std / source_std) + target_mean
+    blended = crops_lab + (matched - crops_lab) * COLOR_MATCH
+    blended = cv2.cvtColor(np.clip(blended, 0, 255).astype(np.uint8), cv2.COLOR_LAB2BGR)
+    return blended.reshape(crops.shape)
+
+
+class AvatarCompositor:
+    def __init__(self, avatar_path, im_dir, max_height=DEFAULT_MAX_HEIGHT):
+        self.avatar_path = avatar_path
+        self.im_dir = im_dir
+        self.avatar = cv2.imread(avatar_path)
+        if self.avatar is None:
+            raise FileNotFoundError(f"Could not read avatar image {avatar_path}.")
+        height, width = self.avatar.shape[:2]
+        self.scale = min(1.0, max_height / height)
+        self.size = (int(round(width * self.scale)), int(round(height * self.scale)))
+        self.mouth, self.mouth_source = get_mouth_geometry(avatar_path, self.avatar)
+        self.prepared = None
+        self.lock = threading.Lock()
+
+    def prepare(self):
+        # Geometry, base image, sprite crops and alpha masks, built once and reused whenever the frames are rebuilt.
+        with self.lock:
+            if self.prepared is not None:
+                return self.prepared
+            avatar = cv2.resize(self.avatar, self.size, interpolation=cv2.INTER_AREA)
+            x, y, width, height = (int(round(value * self.scale)) for value in self.mouth)
+            sprites = frame_atlas.get_set(self.im_dir, None, get_sprite_size(self.im_dir))
+            ids = sorted(sprites)
+            masks = {viseme_id: lip_mask(sprites[viseme_id]) for viseme_id in ids}
+
+            # The neutral mouth (viseme 0) sets the scale, the union of all mouths sets the size of the blended region.
+            neutral = masks.get(0, masks[ids[0]])
+            nx, ny, nw, nh = cv2.boundingRect(neutral)
+            ux, uy, uw, uh = cv2.boundingRect(np.maximum.reduce(list(masks.values())))
+            scale = width * MOUTH_SCALE / max(nw, 1)
+            roi_w, roi_h = max(1, int(round(uw * scale))), max(1, int(round(uh * scale)))
+            left = int(round(x + width / 2 - (nx + nw / 2 - ux) * scale))
+            top = int(round(y + height / 2 - (ny + nh / 2 - uy) * scale))
+
+            crops = np.stack([cv2.resize(sprites[i][uy:uy + uh, ux:ux + uw], (roi_w, roi_h), interpolation=cv2.INTER_AREA) for i in ids])
+            alphas = np.stack([cv2.resize(masks[i][uy:uy + uh, ux:ux + uw], (roi_w, roi_h), interpolation=cv2.INTER_AREA) for i in ids])
+
+            # Paint over the avatar's own mouth, so a small sprite mouth does not show it around its edges.
+            covered = np.zeros(avatar.shape[:2], np.uint8)
+            cv2.ellipse(covered, (x + width // 2, y + height // 2), (int(width * 0.6), int(height * 0.75)), 0, 0, 360, 255, cv2.FILLED)
+            own_lips = avatar[covered > 0]
+            base = cv2.inpaint(avatar, covered, max(3, width // 20), cv2.INPAINT_TELEA)
+            crops = match_colors(crops, alphas, own_lips.reshape(-1, 1, 3))
+
+            # Clip the blended region to the frame.
+            x0, y0 = max(left, 0), max(top, 0)
+            x1, y1 = min(left + roi_w, self.size[0]), min(top + roi_h, self.size[1])
+            crops = crops[:, y0 - top:y1 - top, x0 - left:x1 - left]
+            alphas = alphas[:, y0 - top:y1 - top, x0 - left:x1 - left]
+            # The sprite edges are blended with their grey face, so the soft edge is moved inside the lips. A thin mouth
+            # gets a narrower edge, so it is not eroded away.
+            feather = max(3, int(min(width * FEATHER, nh * scale / 3))) | 1
+            inside = np.ones((feather // 2 + 1, feather // 2 + 1), np.uint8)
+            alphas = np.stack([cv2.GaussianBlur(cv2.erode(alpha, inside), (feather, feather), 0) for alpha in alphas])
+
+            self.prepared = {
+                "ids": ids,
+                "base": base,
+                "box": (x0, y0, x1, y1),
+                "crops": crops.astype(np.uint16),
+                "alphas": alphas[..., None].astype(np.uint16),
+            }
+            return self.prepared
+
+    def build_frames(self):
+        prepared = self.prepare()
+        x0, y0, x1, y1 = prepared["box"]
+        base = prepared["base"]
+        background = base[y0:y1, x0:x1].astype(np.uint16)
+        alphas = prepared["alphas"]
+        # Every viseme in one vectorized blend, rounded integer arithmetic on 0-255 alpha.
+        blended = ((prepared["crops"] * alphas + background * (255 - alphas) + 127) // 255).astype(np.uint8)
+        frames = {}
+        for index, viseme_id in enumerate(prepared["ids"]):
+            frame = base.copy()
+            frame[y0:y1, x0:x1] = blended[index]
+            frame.flags.writeable = False
+            frames[viseme_id] = frame
+        print(f"Composited {len(frames)} viseme frames on {self.avatar_path}.")
+        return frames
+
+    def get_frames(self):
+        key = (f"{self.avatar_path} with {self.im_dir}", os.path.abspath(self.im_dir), self.size)
+        return frame_atlas.get_or_build(key, self.build_frames)
+
+    def get_frame(self, id):
+        return self.get_frames()[int(id)]
+
+
+def get_compositor(mode, im_dir, max_height=DEFAULT_MAX_HEIGHT):
+    key = (mode, os.path.abspath(im_dir), max_height)
+    with compositors_lock:
+        compositor = compositors.get(key)
+        if compositor is None:
+            compositor = AvatarCompositor(AVATAR_MODES[mode], im_dir, max_height)
+            compositors[key] = compositor
+        return compositor
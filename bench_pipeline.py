@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import fake_speechsdk
+
+# Every module below that imports the Speech SDK gets the deterministic stub instead.
+fake_speechsdk.install()
+from async_server import JobServer
+from ffmpeg_writer import mux_audio
+from pcm_audio import PcmAudio
+from video_generator import RENDERED_MODES, VideoMaker
+from viseme_generator import GenerateVideoAndAudio
+from viseme_timeline import build_frame_plan_from_visemes
+from wire_protocol import FramedClient
+
+
+"""
+This script benchmarks the whole reply pipeline offline. `speechsdk` is replaced by `fake_speechsdk`, which emits deterministic viseme events and PCM audio for a text, so runs need no Azure key and are comparable across commits and machines.
+
+For every utterance length (`--seconds`) and frame rate (`--fps`) it times:
+- **timeline**: building the frame plan from the viseme events (`viseme_timeline.build_frame_plan_from_visemes`).
+- **frames**: producing every frame of the plan (`VideoMaker.make_frame`), written to a sink that discards them.
+- **encode**: encoding those frames with the writer of `--render_mode` (`FfmpegWriter`, or `VfrWriter` for `vfr`), without audio.
+- **mux**: adding the in-memory audio to the encoded video (`ffmpeg_writer.mux_audio`).
+- **videomaker_job**: a whole `VideoMaker.render_visemes` call, frames and audio encoded in one pass.
+- **tcp_job**: a whole request through the TCP server path: a `FramedClient` request to a local `JobServer` running `GenerateVideoAndAudio.generateViseme` (synthesis with the stub, render, mux), until the response arrives.
+
+Each measurement is repeated `--repeat` times after one untimed warm-up run; the median and the minimum are reported. Results are written as JSON (with the commit, machine and settings) to `--out`, and `--compare` prints the ratio against an earlier results file.
+
+### How to Use:
+```bash
+python bench_pipeline.py --seconds 5 20 60 --fps 30 60 --repeat 3
+python bench_pipeline.py --compare bench_results/pipeline_<old commit>.json
+python bench_pipeline.py --mode beff-local-mode --stages frames videomaker_job
+python bench_pipeline.py --render_mode vfr --stages encode videomaker_job
+```
+`--render_mode vfr` measures the variable frame rate writer, which encodes one frame per viseme run. `--mode` renders one of the local avatar modes (`avatar_compositor.py`) instead of the regular mouth images, `--transition_ms` renders with cross-faded transitions (`transition_cache.py`).
+The output of the pipeline itself (frame by frame prints) is discarded while timing.
+"""
+
+STAGES = ["timeline", "frames", "encode", "mux", "videomaker_job", "tcp_job"]
+WORDS = (
+    "thanks for asking here is a short overview of how the avatar turns a reply into speech and matching mouth "
+    "shapes every sentence becomes audio and a list of visemes which are drawn frame by frame and encoded"
+).split()
+
+
+class NullWriter:
+    def __init__(self):
+        self.frames = 0
+
+    def write(self, frame):
+        self.frames += 1
+
+    def release(self):
+        pass
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def make_text(seconds):
+    # Adds words until the stub would speak for the requested time, sentences of about 12 words.
+    words = []
+    while fake_speechsdk.fake_timeline(" ".join(words))[2] < seconds * 1000:
+        word = WORDS[len(words) % len(WORDS)]
+        words.append(word + ("." if len(words) % 12 == 11 else ""))
+    return " ".join(words).capitalize()
+
+
+def synthesize_visemes(text):
+    offsets, ids, duration_ms = fake_speechsdk.fake_timeline(text)
+    visemes = [{"offset": offset, "id": viseme_id} for offset, viseme_id in zip(offsets, ids)]
+    return visemes, PcmAudio(fake_speechsdk.fake_audio(duration_ms))
+
+
+def measure(function, repeat):
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Untimed warm-up: sprite decoding, synthesizer connections and the job server's first request.
+        function()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "runs": timings}
+
+
+def get_free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_job_server(generator):
+    port = get_free_port()
+    server = JobServer(lambda mode, text: generator.generateViseme(text, mode).final_path, workers=1)
+    threading.Thread(target=lambda: asyncio.run(server.serve("127.0.0.1", port)), daemon=True).start()
+    for _ in range(100):
+        try:
+            return FramedClient("127.0.0.1", port, timeout=600)
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("The benchmark job server did not start.")
+
+
+def bench_config(args, seconds, fps, work_dir):
+    text = make_text(seconds)
+    visemes, audio = synthesize_visemes(text)
+    video_maker = VideoMaker(
+        args.im_dir, work_dir, None, work_dir, fps, None, None, args.mode, args.render_mode, transition_ms=args.transition_ms
+    )
+    encoded_path = os.path.join(work_dir, f"encoded_{seconds}_{fps}.mp4")
+
+    def timeline():
+        return build_frame_plan_from_visemes(visemes, fps, audio.duration_ms)
+
+    plan = timeline()
+
+    def write_frames(output):
+        previous = None
+        for mapped, count in plan:
+            video_maker.write_run(output, previous, mapped, count)
+            previous = mapped
+        output.release()
+
+    # The generator reads its settings from the command line, like the TCP servers.
+    sys.argv = [
+        sys.argv[0], "--fps", str(fps), "--no_cache", "--work_dir", os.path.join(work_dir, "jobs"), "--transition_ms", str(args.transition_ms),
+        "--render_mode", args.render_mode,
+    ]
+    generator = GenerateVideoAndAudio(None, args.mode)
+    client = start_job_server(generator)
+    request_ids = iter(range(1_000_000))
+
+    def tcp_job():
+        client.send(next(request_ids), text, args.mode)
+        response = client.receive()
+        if response["status"] != "ok":
+            raise RuntimeError(f"TCP job failed: {response}")
+
+    stages = {
+        "timeline": timeline,
+        "frames": lambda: write_frames(NullWriter()),
+        "encode": lambda: write_frames(video_maker.get_out(encoded_path)),
+        "mux": lambda: mux_audio(encoded_path, audio, os.path.join(work_dir, f"muxed_{seconds}_{fps}.mp4")),
+        "videomaker_job": lambda: video_maker.render_visemes(
+            visemes, os.path.join(work_dir, f"job_{seconds}_{fps}.mp4"), audio, mux_audio=True
+        ),
+        "tcp_job": tcp_job,
+    }
+    results = []
+    for stage in args.stages:
+        result = measure(stages[stage], args.repeat)
+        result.update({
+            "stage": stage, "mode": args.mode, "render_mode": args.render_mode, "transition_ms": args.transition_ms, "seconds": seconds, "fps": fps, "visemes": len(visemes), "frames": plan.total_frames
+        })
+        results.append(result)
+        print(f"{stage:15s} {seconds:6.1f} s @ {fps:3d} fps: median {result['median_s'] * 1000:9.1f} ms, min {result['min_s'] * 1000:9.1f} ms")
+    client.close()
+    return results
+
+
+def make_result_key(entry):
+    # Results written before --mode, --render_mode and --transition_ms existed are direct regular-mode results without transitions.
+    return (
+        entry["stage"], entry.get("mode", "regular-mode"), entry.get("render_mode", "direct"), entry.get("transition_ms", 0),
+        entry["seconds"], entry["fps"]
+    )
+
+
+def load_baseline(baseline_file):
+    with open(baseline_file, "r") as f:
+        return {make_result_key(entry): entry for entry in json.load(f)["results"]}
+
+
+def compare(results, baseline, baseline_file):
+    print(f"\nCompared with {baseline_file} (new / old median):")
+    for entry in results:
+        old = baseline.get(make_result_key(entry))
+        if old is not None:
+            print(f"{entry['stage']:15s} {entry['seconds']:6.1f} s @ {entry['fps']:3d} fps: {entry['median_s'] / old['median_s']:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the reply pipeline.")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[5, 20, 60], help="Utterance lengths in seconds.")
+    parser.add_argument("--fps", type=int, nargs="+", default=[30, 60], help="Frame rates to render at.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement.")
+    parser.add_argument("--stages", type=str, nargs="+", default=STAGES, choices=STAGES, help="Stages to measure.")
+    parser.add_argument("--im_dir", type=str, default="image/mouth", help="Directory with viseme images.")
+    parser.add_argument(
+        "--mode", type=str, default="regular-mode", choices=RENDERED_MODES,
+        help="Mode to render, regular-mode or one of the local avatar modes."
+    )
+    parser.add_argument(
+        "--render_mode", type=str, default="direct", choices=["direct", "vfr", "mp4v"], help="Writer to encode with."
+    )
+    parser.add_argument("--transition_ms", type=float, default=0, help="Cross-fade length between mouth shapes.")
+    parser.add_argument("--out", type=str, default=None, help="Results file (default bench_results/pipeline_<commit>.json).")
+    parser.add_argument("--compare", type=str, default=None, help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    # Synthesis is instant in the stub unless asked otherwise, so the stages measure this code, not a simulated network.
+    fake_speechsdk.service.connect_latency = 0
+    fake_speechsdk.service.first_byte_latency = 0
+    commit = get_commit()
+    # Read first, the new results may be written to the same file.
+    baseline = load_baseline(args.compare) if args.compare is not None else None
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as work_dir:
+        for seconds in args.seconds:
+            for fps in args.fps:
+                results.extend(bench_config(args, seconds, fps, work_dir))
+
+    suffix = "" if args.mode == "regular-mode" else f"_{args.mode}"
+    suffix += "" if args.render_mode == "direct" else f"_{args.render_mode}"
+    suffix += f"_transition{args.transition_ms:g}" if args.transition_ms else ""
+    out = args.out or os.path.join("bench_results", f"pipeline_{commit}{suffix}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    report = {
+        "commit": commit,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {out}.")
+    if baseline is not None:
+        compare(results, baseline, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import tempfile
+import time
+from bench_viseme_timeline import synthetic_timeline
+from render_pool import RenderJob, RenderPool
+
+
+"""
+This script measures how render throughput scales with the number of worker processes in `render_pool.RenderPool`. It renders the same batch of synthetic replies with 1, 2, 4, ... workers (up to the core count) and reports jobs per second and the speedup over a single worker.
+
+### How to Use:
+```bash
+python bench_render_pool.py --jobs 16 --seconds 20 --render_mode mp4v
+```
+`mp4v` keeps the benchmark render-bound (OpenCV writer, no audio). `direct` includes the ffmpeg encode, which is itself multi-threaded and scales less cleanly.
+"""
+
+
+def make_jobs(count, seconds, im_dir, out_dir, fps, render_mode):
+    offsets, ids, audio_duration_ms = synthetic_timeline(seconds / 3600)
+    visemes = [{"offset": float(offset), "id": int(viseme_id)} for offset, viseme_id in zip(offsets, ids)]
+    extension = "avi" if render_mode == "mp4v" else "mp4"
+    return [
+        RenderJob(visemes, None, im_dir, os.path.join(out_dir, f"bench_{index}.{extension}"), fps, render_mode)
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark render throughput against the number of worker processes.")
+    parser.add_argument("--jobs", type=int, default=16, help="Number of replies rendered per run.")
+    parser.add_argument("--seconds", type=float, default=20, help="Length of each synthetic reply in seconds.")
+    parser.add_argument("--im_dir", type=str, default="image/mouth", help="Directory with viseme images.")
+    parser.add_argument("--fps", type=int, default=60, help="Frame rate (in frames per second) to generate video.")
+    parser.add_argument("--render_mode", type=str, default="mp4v", choices=["mp4v", "direct", "vfr"], help="Writer used by the jobs.")
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count(), help="Largest pool size to measure.")
+    args = parser.parse_args()
+
+    worker_counts = []
+    workers = 1
+    while workers < args.max_workers:
+        worker_counts.append(workers)
+        workers *= 2
+    worker_counts.append(args.max_workers)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        jobs = make_jobs(args.jobs, args.seconds, args.im_dir, out_dir, args.fps, args.render_mode)
+        baseline = None
+        for workers in worker_counts:
+            pool = RenderPool(workers)
+            # Warm up every worker so process start-up and sprite decoding are not measured.
+            list(pool.map(make_jobs(workers, 1, args.im_dir, out_dir, args.fps, args.render_mode)))
+            start = time.perf_counter()
+            list(pool.map(jobs))
+            elapsed = time.perf_counter() - start
+            pool.shutdown()
+            throughput = args.jobs / elapsed
+            baseline = baseline or throughput
+            print(f"{workers:3d} workers: {elapsed:7.2f} s, {throughput:6.2f} jobs/s, speedup {throughput / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
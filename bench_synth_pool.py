@@ -0,0 +1,88 @@
+import argparse
+import time
+import fake_speechsdk
+from synth_pool import SynthesizerPool
+
+
+"""
+This script measures what the synthesizer pool (`synth_pool.py`) saves per request, offline, against the SDK stub (`fake_speechsdk.py`). The stub charges `--connect_ms` for every connection it has to open, like the TCP/TLS/websocket setup of the real service.
+
+It reports the time until the result of a short reply:
+- **cold**: a new `SpeechSynthesizer` per request, as before the pool.
+- **pooled**: a synthesizer borrowed from a warm pool.
+
+It then checks recovery: a request that fails gets its synthesizer rebuilt, and connections dropped while idle are reconnected by the keep-warm thread before the next request.
+
+### How to Use:
+```bash
+python bench_synth_pool.py --requests 20 --connect_ms 250
+```
+"""
+
+SSML = "<speak><voice name=\"{}\">Hello there, how can I help you today?</voice></speak>"
+
+
+def synthesize(synthesizer, voice):
+    visemes = []
+    synthesizer.viseme_received.connect(visemes.append)
+    result = synthesizer.speak_ssml_async(SSML.format(voice)).get()
+    return result, visemes
+
+
+def time_requests(function, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled against per-request speech synthesizers (offline).")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per measurement.")
+    parser.add_argument("--connect_ms", type=float, default=250, help="Simulated connection setup time in milliseconds.")
+    parser.add_argument("--voice", type=str, default="en-US-EmmaNeural", help="Voice used by the requests.")
+    args = parser.parse_args()
+
+    sdk = fake_speechsdk
+    sdk.service.connect_latency = args.connect_ms / 1000
+    speech_config = sdk.SpeechConfig(subscription="offline", region="local")
+
+    def cold():
+        synthesize(sdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None), args.voice)
+
+    pool = SynthesizerPool(speech_config, sdk, size=1, keep_warm_interval=0.2)
+    pool.warm([args.voice])
+
+    def pooled():
+        with pool.acquire(args.voice) as entry:
+            synthesize(entry.synthesizer, args.voice)
+
+    cold_median, cold_worst = time_requests(cold, args.requests)
+    pooled_median, pooled_worst = time_requests(pooled, args.requests)
+    print(f"cold:   median {cold_median:7.1f} ms, worst {cold_worst:7.1f} ms")
+    print(f"pooled: median {pooled_median:7.1f} ms, worst {pooled_worst:7.1f} ms")
+
+    # A failed request must not poison the pool.
+    sdk.service.fail_next = 1
+    with pool.acquire(args.voice) as entry:
+        result, _ = synthesize(entry.synthesizer, args.voice)
+        if result.reason == sdk.ResultReason.Canceled:
+            entry.mark_failed()
+    with pool.acquire(args.voice) as entry:
+        result, visemes = synthesize(entry.synthesizer, args.voice)
+    print(f"after a failed request: {result.reason.name}, {len(visemes)} visemes")
+
+    # Connections dropped while idle are reopened by the keep-warm thread, not by the next request.
+    sdk.service.drop_connections()
+    time.sleep(0.5)
+    dropped_median, _ = time_requests(pooled, 1)
+    print(f"first request after idle connections were dropped: {dropped_median:.1f} ms")
+    print(f"pool stats: {pool.stats()}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import time
+import numpy as np
+from viseme_timeline import build_frame_plan
+
+
+"""
+This script benchmarks the frame plan built by `viseme_timeline.build_frame_plan` against the previous per-viseme rounding loop on synthetic timelines (1 hour of speech by default). It reports the build time of both approaches and the drift, in frames, between the legacy frame count and the exact audio length.
+
+### How to Use:
+```bash
+python bench_viseme_timeline.py --hours 1 --fps 60 --repeat 5
+```
+"""
+
+
+def synthetic_timeline(hours, seed=0):
+    rng = np.random.default_rng(seed)
+    # Azure reports visemes roughly every 50-150 ms, in multiples of 12.5 ms.
+    count = int(hours * 3600 * 1000 / 90)
+    steps = rng.integers(4, 13, size=count) * 12.5
+    offsets = np.cumsum(steps) - steps[0] + 50.0
+    ids = rng.integers(0, 22, size=count)
+    audio_duration_ms = offsets[-1] + 500.0
+    return offsets, ids, audio_duration_ms
+
+
+def legacy_frame_counts(offsets, ids, fps):
+    # Mirrors the previous VideoMaker loop: each duration is rounded to frames on its own.
+    counts = []
+    total_time = 0
+    for offset, viseme_id in zip(offsets.tolist(), ids.tolist()):
+        dur = offset - total_time
+        total_time += dur
+        counts.append((viseme_id, int(np.round(dur / 1000 * fps, 0))))
+    return counts
+
+
+def time_call(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the viseme frame plan on synthetic timelines.")
+    parser.add_argument("--hours", type=float, default=1.0, help="Length of the synthetic timeline in hours.")
+    parser.add_argument("--fps", type=int, default=60, help="Frame rate (in frames per second) of the plan.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs, the best one is reported.")
+    args = parser.parse_args()
+
+    offsets, ids, audio_duration_ms = synthetic_timeline(args.hours)
+    print(f"Synthetic timeline: {len(offsets)} visemes, {audio_duration_ms / 1000:.1f} seconds of audio.")
+
+    plan_time, plan = time_call(lambda: build_frame_plan(offsets, ids, args.fps, audio_duration_ms), args.repeat)
+    legacy_time, legacy = time_call(lambda: legacy_frame_counts(offsets, ids, args.fps), args.repeat)
+
+    expected_frames = int(np.rint(audio_duration_ms * args.fps / 1000))
+    # The legacy loop stops at the last offset, so it is compared against that instead of the audio length.
+    legacy_expected_frames = int(np.rint(offsets[-1] * args.fps / 1000))
+    legacy_frames = sum(count for _, count in legacy)
+    print(f"Frame plan:  {plan_time * 1000:8.2f} ms, {len(plan)} runs, {plan.total_frames} frames "
+          f"(drift {plan.total_frames - expected_frames} frames).")
+    print(f"Legacy loop: {legacy_time * 1000:8.2f} ms, {len(legacy)} chunks, {legacy_frames} frames "
+          f"(drift {legacy_frames - legacy_expected_frames} frames).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import re
+import sys
+import threading
+import time
+import types
+from datetime import timedelta
+from enum import Enum
+import numpy as np
+
+
+"""
+This module is a local stand-in for the parts of `azure.cognitiveservices.speech` used by this project, so synthesis, pooling and the rest of the pipeline can be exercised offline and without a Speech key. It behaves like the service in the ways that matter for performance work:
+
+- A synthesizer whose connection is not open pays `service.connect_latency` (DNS, TCP, TLS and websocket setup) before its first request, and the connection is dropped after `service.idle_timeout` seconds without traffic, like the real service closes idle sockets.
+- Visemes are emitted on a background thread while "synthesizing", one per letter (40-120 ms each, always the same for the same text) with a silence between words, paced by `service.realtime_factor` (0 emits them at once, 1 in real time). The audio (24 kHz 16-bit mono PCM of the matching length) arrives in `synthesizing` events as it is produced, and whole in the result.
+- `service.fail_next` makes the next N requests fail with a cancellation error, `service.drop_connections()` closes every open connection, for testing recovery.
+
+### Key Components:
+
+1. **`SpeechConfig`, `SpeechSynthesizer`, `Connection`, `ResultReason`, `CancellationReason`, `SpeechSynthesisOutputFormat`, `audio.AudioOutputConfig`**: same names and call signatures as the SDK.
+2. **`service`**: the simulated service settings and counters (`connections_opened`, `requests`).
+3. **`fake_timeline(ssml)`**: the viseme offsets, IDs and audio length the stub produces for a text, e.g. to size benchmark inputs.
+4. **`install()`**: registers this module as `azure.cognitiveservices.speech`, so code that imports the SDK gets the stub. Call it before importing `viseme_generator`.
+"""
+
+SAMPLE_RATE = 24000
+
+
+def fake_timeline(ssml):
+    # Deterministic stand-in for Azure's phoneme timing: one viseme per letter lasting 40-120 ms,
+    # and a short silence (viseme 0) between words.
+    text = re.sub(r"<[^>]+>", " ", ssml)
+    offsets = []
+    ids = []
+    offset_ms = 50.0
+    for word in text.split():
+        letters = [character.lower() for character in word if character.isalpha()]
+        if not letters:
+            continue
+        for character in letters:
+            offsets.append(offset_ms)
+            ids.append(1 + ord(character) % 21)
+            offset_ms += 40 + (ord(character) * 37) % 9 * 10
+        offsets.append(offset_ms)
+        ids.append(0)
+        offset_ms += 60
+    return offsets, ids, offset_ms + 200
+
+
+def fake_audio(duration_ms):
+    # A quiet tone rather than silence, so audio encoding costs about what speech costs.
+    samples = np.arange(int(SAMPLE_RATE * duration_ms / 1000))
+    return (np.sin(samples * (2 * np.pi * 220 / SAMPLE_RATE)) * 3000).astype("<i2").tobytes()
+
+
+class FakeService:
+    def __init__(self):
+        self.connect_latency = 0.25
+        self.first_byte_latency = 0.05
+        self.realtime_factor = 0.0
+        self.idle_timeout = 30.0
+        self.fail_next = 0
+        self.connections_opened = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.connections = []
+        self.reaper = None
+
+    def start_reaper(self):
+        with self.lock:
+            if self.reaper is not None:
+                return
+            self.reaper = threading.Thread(target=self.reap, daemon=True)
+            self.reaper.start()
+
+    def reap(self, poll_interval=0.1):
+        # Closes idle connections from the "server" side, the client sees a disconnected event.
+        while True:
+            time.sleep(poll_interval)
+            with self.lock:
+                connections = list(self.connections)
+            for connection in connections:
+                if time.monotonic() - connection.last_used > self.idle_timeout:
+                    connection.close()
+
+    def take_failure(self):
+        with self.lock:
+            self.requests += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+            return False
+
+    def drop_connections(self):
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+
+
+service = FakeService()
+
+
+class ResultReason(Enum):
+    SynthesizingAudio = 9
+    SynthesizingAudioCompleted = 10
+    Canceled = 1
+
+
+class CancellationReason(Enum):
+    Error = 1
+    EndOfStream = 2
+
+
+class SpeechSynthesisOutputFormat(Enum):
+    Riff24Khz16BitMonoPcm = 8
+    Raw24Khz16BitMonoPcm = 11
+
+
+class EventSignal:
+    def __init__(self):
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def connect(self, callback):
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def disconnect_all(self):
+        with self.lock:
+            self.callbacks = []
+
+    def signal(self, event):
+        with self.lock:
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            callback(event)
+
+
+class SpeechConfig:
+    def __init__(self, subscription=None, region=None):
+        self.subscription = subscription
+        self.region = region
+        self.speech_synthesis_voice_name = None
+        self.output_format = SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
+
+    def set_speech_synthesis_output_format(self, output_format):
+        self.output_format = output_format
+
+
+class AudioOutputConfig:
+    def __init__(self, filename=None, use_default_speaker=False):
+        self.filename = filename
+
+
+audio = types.SimpleNamespace(AudioOutputConfig=AudioOutputConfig)
+
+
+class SpeechSynthesisVisemeEventArgs:
+    def __init__(self, audio_offset, viseme_id):
+        self.audio_offset = audio_offset
+        self.viseme_id = viseme_id
+        self.animation = ""
+
+    def __str__(self):
+        return f"SpeechSynthesisVisemeEventArgs(audio_offset={self.audio_offset}, viseme_id={self.viseme_id})"
+
+
+class SpeechSynthesisResult:
+    def __init__(self, reason, audio_data=b"", error_details=None):
+        self.reason = reason
+        self.audio_data = audio_data
+        self.audio_duration = timedelta(milliseconds=len(audio_data) * 1000 / (SAMPLE_RATE * 2))
+        self.cancellation_details = None
+        if error_details is not None:
+            self.cancellation_details = types.SimpleNamespace(reason=CancellationReason.Error, error_details=error_details)
+
+
+class ResultFuture:
+    def __init__(self, function):
+        self.result = None
+        self.thread = threading.Thread(target=self.run, args=(function,), daemon=True)
+        self.thread.start()
+
+    def run(self, function):
+        self.result = function()
+
+    def get(self):
+        self.thread.join()
+        return self.result
+
+
+class Connection:
+    def __init__(self, synthesizer):
+        self.synthesizer = synthesizer
+        self.is_open = False
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+        self.connected = EventSignal()
+        self.disconnected = EventSignal()
+
+    @classmethod
+    def from_speech_synthesizer(cls, synthesizer):
+        return synthesizer.connection
+
+    def open(self, for_continuous_recognition=False):
+        service.start_reaper()
+        with self.lock:
+            if self.is_open:
+                return
+            time.sleep(service.connect_latency)
+            self.is_open = True
+            self.last_used = time.monotonic()
+            with service.lock:
+                service.connections_opened += 1
+                service.connections.append(self)
+        self.connected.signal(types.SimpleNamespace(session_id=id(self)))
+
+    def close(self):
+        with self.lock:
+            closed = self.is_open
+            self.is_open = False
+            with service.lock:
+                if self in service.connections:
+                    service.connections.remove(self)
+        if closed:
+            self.disconnected.signal(types.SimpleNamespace(session_id=id(self)))
+
+    def touch(self):
+        with self.lock:
+            self.last_used = time.monotonic()
+
+
+class SpeechSynthesizer:
+    def __init__(self, speech_config=None, audio_config=None):
+        self.speech_config = speech_config
+        self.audio_config = audio_config
+        self.connection = Connection(self)
+        self.viseme_received = EventSignal()
+        self.synthesis_started = EventSignal()
+        self.synthesizing = EventSignal()
+        self.synthesis_completed = EventSignal()
+        self.synthesis_canceled = EventSignal()
+
+    def send_audio(self, chunk):
+        if chunk:
+            self.synthesizing.signal(types.SimpleNamespace(result=SpeechSynthesisResult(ResultReason.SynthesizingAudio, chunk)))
+
+    def speak_ssml_async(self, ssml):
+        return ResultFuture(lambda: self.synthesize(ssml))
+
+    def synthesize(self, ssml):
+        # Requests on a closed (or expired) connection pay the handshake first, like the SDK's implicit connect.
+        self.connection.open()
+        if service.take_failure():
+            self.connection.close()
+            return SpeechSynthesisResult(ResultReason.Canceled, error_details="Connection was closed by the remote host.")
+        time.sleep(service.first_byte_latency)
+        self.synthesis_started.signal(types.SimpleNamespace(result=None))
+        offsets, ids, duration_ms = fake_timeline(ssml)
+        audio_data = fake_audio(duration_ms)
+        previous_ms = 0.0
+        sent_bytes = 0
+        for offset_ms, viseme_id in zip(offsets, ids):
+            if service.realtime_factor:
+                time.sleep((offset_ms - previous_ms) / 1000 * service.realtime_factor)
+            previous_ms = offset_ms
+            self.viseme_received.signal(SpeechSynthesisVisemeEventArgs(int(offset_ms * 10000), viseme_id))
+            # The audio up to the viseme, whole samples only.
+            end = int(SAMPLE_RATE * offset_ms / 1000) * 2
+            self.send_audio(audio_data[sent_bytes:end])
+            sent_bytes = max(sent_bytes, end)
+        self.send_audio(audio_data[sent_bytes:])
+        self.connection.touch()
+        result = SpeechSynthesisResult(ResultReason.SynthesizingAudioCompleted, audio_data)
+        self.synthesis_completed.signal(types.SimpleNamespace(result=result))
+        return result
+
+
+def install():
+    module = sys.modules[__name__]
+    azure = sys.modules.setdefault("azure", types.ModuleType("azure"))
+    cognitiveservices = sys.modules.setdefault("azure.cognitiveservices", types.ModuleType("azure.cognitiveservices"))
+    azure.cognitiveservices = cognitiveservices
+    cognitiveservices.speech = module
+    sys.modules["azure.cognitiveservices.speech"] = module
+    return module
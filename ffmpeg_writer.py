@@ -0,0 +1,300 @@
+import atexit
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
+import cv2
+import numpy as np
+from pcm_audio import PcmAudio
+
+
+"""
+This module streams raw video frames straight into a single `ffmpeg` process. When audio is given, the same process muxes it in, so the final audio/video file is written in one pass instead of writing an mp4v file with OpenCV and re-encoding it twice with `moviepy`.
+
+### Key Components:
+
+1. **`get_ffmpeg_exe()`**:
+   - Returns the `ffmpeg` binary bundled with `imageio-ffmpeg` (installed together with `moviepy`), falling back to `ffmpeg` on the `PATH`.
+
+2. **`AudioInput` Class**:
+   - Turns the audio of a reply into ffmpeg input arguments. A WAV path is passed as is. In-memory PCM (`pcm_audio.PcmAudio`) is fed through an extra pipe (`pipe:<fd>`) by a background thread, so it never touches the disk; on platforms without `pass_fds` it is spilled to a temporary WAV file instead.
+
+3. **`FfmpegWriter` Class**:
+   - Drop-in replacement for `cv2.VideoWriter` (`write(frame)` / `release()`). Frames are BGR arrays piped as raw video to `ffmpeg`, encoded with `libx264` and, if present, muxed with the audio track (`aac`) and trimmed to the shorter stream. The audio can be a WAV path or a `PcmAudio` buffer.
+   - When `out_path` is an `.m3u8` playlist, the output is segmented (HLS with fMP4 segments). A key frame is forced at every segment boundary so each segment decodes on its own, and the playlist grows as segments finish. `on_first_segment(playlist)` is called as soon as the first segment is listed, so playback can start while the rest is still rendering.
+
+4. **`VfrWriter` Class**:
+   - Same interface, but writes a variable frame rate video: consecutive writes of the same frame become one frame whose duration covers all of them, so the encoder sees one frame per viseme run instead of one per output frame, and the encode time and file size follow the number of visemes rather than the duration and fps.
+   - The runs are handed to ffmpeg as an `ffconcat` list of image files when the writer is released. Each distinct frame is written to an image file once per process (`frame_files`): the shared, read-only frames of the frame atlas, the composited avatars and the transitions are reused by every later video.
+
+5. **`mux_audio(video_file, audio, out_path)`**:
+   - Adds an audio track to an already encoded video without re-encoding the video stream. Used by the streaming render, where the audio is only complete after the frames have been encoded.
+"""
+
+
+def get_ffmpeg_exe():
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return "ffmpeg"
+
+
+class AudioInput:
+    def __init__(self, audio):
+        self.audio = audio
+        self.read_fd = None
+        self.write_fd = None
+        self.tmp_path = None
+        self.feeder = None
+        if not isinstance(audio, PcmAudio):
+            self.args = ["-i", audio]
+        elif os.name == "posix":
+            self.read_fd, self.write_fd = os.pipe()
+            self.args = audio.ffmpeg_input_args() + ["-i", f"pipe:{self.read_fd}"]
+        else:
+            tmp_file, self.tmp_path = tempfile.mkstemp(suffix=".wav")
+            os.close(tmp_file)
+            self.args = ["-i", audio.write_wav(self.tmp_path)]
+
+    def pass_fds(self):
+        return (self.read_fd,) if self.read_fd is not None else ()
+
+    def start(self):
+        # Called once ffmpeg runs: it owns the read end now, the samples are written from a thread so
+        # ffmpeg can interleave reading audio and frames.
+        if self.read_fd is None:
+            return
+        os.close(self.read_fd)
+        self.feeder = threading.Thread(target=self.feed, daemon=True)
+        self.feeder.start()
+
+    def feed(self):
+        try:
+            with os.fdopen(self.write_fd, "wb") as pipe:
+                pipe.write(self.audio.data)
+        except BrokenPipeError:
+            # With -shortest ffmpeg may stop reading before the end of the audio.
+            pass
+
+    def close(self):
+        if self.feeder is not None:
+            self.feeder.join()
+        elif self.write_fd is not None:
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+        if self.tmp_path is not None:
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+
+
+def run_ffmpeg(command, audio_input=None, stdin=None):
+    pass_fds = audio_input.pass_fds() if audio_input is not None else ()
+    try:
+        process = subprocess.Popen(command, stdin=stdin, pass_fds=pass_fds)
+    except Exception:
+        if audio_input is not None:
+            audio_input.close()
+        raise
+    if audio_input is not None:
+        audio_input.start()
+    return process
+
+
+def get_video_args(codec):
+    # yuv420p needs even dimensions, the viseme images are not guaranteed to have them.
+    return [
+        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+        "-c:v", codec, "-preset", "veryfast", "-pix_fmt", "yuv420p",
+    ]
+
+
+class FfmpegWriter:
+    def __init__(self, out_path, fps, size, audio=None, codec="libx264", audio_codec="aac", segment_time=1, on_first_segment=None):
+        self.out_path = out_path
+        width, height = size
+        command = [
+            get_ffmpeg_exe(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        ]
+        self.audio_input = AudioInput(audio) if audio is not None else None
+        if self.audio_input is not None:
+            command += self.audio_input.args + ["-map", "0:v:0", "-map", "1:a:0", "-c:a", audio_codec, "-shortest"]
+        command += get_video_args(codec)
+        if out_path.endswith(".m3u8"):
+            command += [
+                "-force_key_frames", f"expr:gte(t,n_forced*{segment_time})",
+                "-f", "hls", "-hls_time", str(segment_time), "-hls_playlist_type", "event",
+                "-hls_segment_type", "fmp4", "-hls_flags", "independent_segments+temp_file",
+                "-hls_segment_filename", os.path.join(os.path.dirname(out_path), "segment_%05d.m4s"),
+                out_path,
+            ]
+        else:
+            command += ["-movflags", "+faststart", out_path]
+        self.process = run_ffmpeg(command, self.audio_input, subprocess.PIPE)
+        self.stdin_closed = False
+        if on_first_segment is not None:
+            threading.Thread(target=self.watch_playlist, args=(on_first_segment,), daemon=True).start()
+
+    def has_segment(self):
+        try:
+            with open(self.out_path, "r") as playlist:
+                return "#EXTINF" in playlist.read()
+        except OSError:
+            return False
+
+    def watch_playlist(self, on_first_segment, poll_interval=0.02):
+        while not self.has_segment():
+            if self.process.poll() is not None and not self.has_segment():
+                return
+            time.sleep(poll_interval)
+        on_first_segment(self.out_path)
+
+    def write(self, frame):
+        if self.stdin_closed:
+            return
+        try:
+            self.process.stdin.write(frame.data if frame.flags.c_contiguous else frame.tobytes())
+        except BrokenPipeError:
+            # With -shortest ffmpeg stops reading once the audio ends, the remaining frames are trimmed anyway.
+            self.stdin_closed = True
+
+    def release(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        return_code = self.process.wait()
+        if self.audio_input is not None:
+            self.audio_input.close()
+        if return_code != 0:
+            raise RuntimeError(f"ffmpeg exited with code {return_code} while writing {self.out_path}.")
+
+
+class FrameFiles:
+    def __init__(self):
+        self.dir = None
+        self.paths = {}
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def make_path(self):
+        with self.lock:
+            if self.dir is None:
+                self.dir = tempfile.mkdtemp(prefix="vfr_frames_")
+                atexit.register(shutil.rmtree, self.dir, True)
+            self.count += 1
+            # Uncompressed, ffmpeg opens and decodes a file for every run.
+            return os.path.join(self.dir, f"frame_{self.count:06d}.bmp")
+
+    def get_path(self, frame):
+        # Keyed by the frame object: shared frames are read-only, so the same object always has the same pixels.
+        key = id(frame)
+        with self.lock:
+            entry = self.paths.get(key)
+            if entry is not None and entry[0]() is frame:
+                return entry[1]
+        path = self.make_path()
+        cv2.imwrite(path, frame)
+        with self.lock:
+            self.paths[key] = (weakref.ref(frame, lambda ref: self.forget(key, ref, path)), path)
+        return path
+
+    def forget(self, key, ref, path):
+        # The frame is gone (e.g. evicted from the atlas), so is its file.
+        with self.lock:
+            if key in self.paths and self.paths[key][0] is ref:
+                del self.paths[key]
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+frame_files = FrameFiles()
+
+
+class VfrWriter:
+    def __init__(self, out_path, fps, size, audio=None, codec="libx264", audio_codec="aac"):
+        self.out_path = out_path
+        self.fps = fps
+        self.audio = audio
+        self.codec = codec
+        self.audio_codec = audio_codec
+        # [frame, frame count] per run, the frames are kept alive until ffmpeg has read their files.
+        self.runs = []
+        # The frame object passed to the last write, the run holds a copy of it if it was writable.
+        self.last_source = None
+
+    def write(self, frame):
+        if self.runs and frame is self.last_source:
+            stored = self.runs[-1][0]
+            # A writable frame may have been changed in place since, then it starts a run of its own.
+            if stored is frame or np.array_equal(stored, frame):
+                self.runs[-1][1] += 1
+                return
+        self.last_source = frame
+        if frame.flags.writeable:
+            # The caller may change a writable frame after writing it, its pixels are kept as they are now.
+            frame = frame.copy()
+            frame.flags.writeable = False
+        self.runs.append([frame, 1])
+
+    def write_concat_list(self, list_path):
+        lines = ["ffconcat version 1.0"]
+        runs = [tuple(run) for run in self.runs]
+        if runs and runs[-1][1] > 1:
+            # The last frame of a video only lasts one frame in the container, so the last run ends with a frame of its own.
+            frame, count = runs.pop()
+            runs += [(frame, count - 1), (frame, 1)]
+        start_us = 0
+        frames = 0
+        for frame, count in runs:
+            path = frame_files.get_path(frame).replace("'", "'\\''")
+            # Durations come from the absolute frame boundaries, so their rounding does not add up. The image
+            # demuxer's frame rate sets the time base, so every run starts exactly where it would at a constant rate.
+            frames += count
+            end_us = round(frames * 1000000 / self.fps)
+            lines += [f"file '{path}'", f"option framerate {self.fps}", f"duration {end_us - start_us}us"]
+            start_us = end_us
+        with open(list_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def release(self):
+        list_path = os.path.splitext(self.out_path)[0] + ".ffconcat"
+        audio_input = None
+        try:
+            self.write_concat_list(list_path)
+            command = [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+            if self.audio is not None:
+                audio_input = AudioInput(self.audio)
+                # No -shortest: it drops the last, long frame. The runs already end with the audio, to the nearest frame.
+                command += audio_input.args + ["-map", "0:v:0", "-map", "1:a:0", "-c:a", self.audio_codec]
+            command += get_video_args(self.codec) + ["-fps_mode", "vfr", "-movflags", "+faststart", self.out_path]
+            return_code = run_ffmpeg(command, audio_input).wait()
+        finally:
+            if audio_input is not None:
+                audio_input.close()
+            if os.path.exists(list_path):
+                os.remove(list_path)
+        self.runs = []
+        if return_code != 0:
+            raise RuntimeError(f"ffmpeg exited with code {return_code} while writing {self.out_path}.")
+
+
+def mux_audio(video_file, audio, out_path, audio_codec="aac"):
+    audio_input = AudioInput(audio)
+    command = [
+        get_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", video_file, *audio_input.args,
+        "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", "-c:a", audio_codec, "-shortest",
+        "-movflags", "+faststart", out_path,
+    ]
+    return_code = run_ffmpeg(command, audio_input).wait()
+    audio_input.close()
+    if return_code != 0:
+        raise RuntimeError(f"ffmpeg exited with code {return_code} while muxing {out_path}.")
@@ -0,0 +1,112 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import cv2
+
+
+"""
+This module keeps the viseme images (mouth shapes) decoded in memory so that video generation never has to read the same JPEG from disk twice. Each image set (e.g. `image/mouth`, `image/mouth_dark_mode` or a per-avatar set) is decoded, rotated and resized once and stored in an atlas keyed by `(directory, orientation, size)`.
+
+### Key Components:
+
+1. **`FrameAtlas` Class**:
+   - Holds the decoded image sets in an LRU ordered dictionary bounded by a byte budget. When the budget is exceeded the least recently used set is dropped.
+   - Loading is guarded per key, so concurrent requests for the same set decode it once and share the result.
+   - The stored frames are marked read-only because they are shared across requests and modes.
+   - `get_or_build(key, build)` stores frame sets that are computed rather than decoded (e.g. the composited avatars of `avatar_compositor.py`) under the same budget.
+
+2. **`frame_atlas`**:
+   - The process-wide atlas used by `VideoMaker`. A long-running server keeps it warm across requests.
+"""
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+VISEME_FILE_PATTERN = re.compile(r"^viseme-id-(\d+)\.jpg$")
+
+
+class FrameAtlas:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.sets = OrderedDict()
+        self.set_bytes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.loading_locks = {}
+
+    def make_key(self, im_dir, rotation, size):
+        return os.path.abspath(im_dir), rotation, (int(size[0]), int(size[1]))
+
+    def decode_set(self, im_dir, rotation, size):
+        frames = {}
+        for image in os.listdir(im_dir):
+            match = VISEME_FILE_PATTERN.match(image)
+            if match is None:
+                continue
+            frame = cv2.imread(os.path.join(im_dir, image))
+            if frame is None:
+                print(f"Error: could not decode {image} in {im_dir}.")
+                continue
+            if rotation is not None:
+                frame = cv2.rotate(frame, rotation)
+            frame = cv2.resize(frame, size)
+            frame.flags.writeable = False
+            frames[int(match.group(1))] = frame
+        print(f"Decoded {len(frames)} viseme images from {im_dir}.")
+        return frames
+
+    def get_set(self, im_dir, rotation, size):
+        key = self.make_key(im_dir, rotation, size)
+        return self.get_or_build(key, lambda: self.decode_set(key[0], rotation, key[2]))
+
+    def get_or_build(self, key, build):
+        # key[0] names the set in log messages, build() returns its {viseme id: frame} dictionary.
+        with self.lock:
+            frames = self.sets.get(key)
+            if frames is not None:
+                self.sets.move_to_end(key)
+                self.hits += 1
+                return frames
+            loading_lock = self.loading_locks.setdefault(key, threading.Lock())
+
+        with loading_lock:
+            with self.lock:
+                frames = self.sets.get(key)
+                if frames is not None:
+                    self.sets.move_to_end(key)
+                    self.hits += 1
+                    return frames
+            try:
+                frames = build()
+                with self.lock:
+                    self.misses += 1
+                    self.store(key, frames)
+            finally:
+                # Also after a failed build, so a missing image does not leave its lock behind.
+                with self.lock:
+                    self.loading_locks.pop(key, None)
+            return frames
+
+    def get_frame(self, im_dir, id, rotation, size):
+        return self.get_set(im_dir, rotation, size)[int(id)]
+
+    def store(self, key, frames):
+        nbytes = sum(frame.nbytes for frame in frames.values())
+        self.sets[key] = frames
+        self.set_bytes[key] = nbytes
+        self.nbytes += nbytes
+        # Never evict the set that was just stored, even if it alone exceeds the budget.
+        while self.nbytes > self.max_bytes and len(self.sets) > 1:
+            old_key, _ = self.sets.popitem(last=False)
+            self.nbytes -= self.set_bytes.pop(old_key)
+            print(f"Evicted viseme image set {old_key[0]} from the frame atlas.")
+
+    def clear(self):
+        with self.lock:
+            self.sets.clear()
+            self.set_bytes.clear()
+            self.nbytes = 0
+
+
+frame_atlas = FrameAtlas()
@@ -1,6 +1,7 @@
 import cv2
 import json
 from moviepy.editor import VideoFileClip, AudioFileClip
+from viseme_timeline import build_frame_plan_from_visemes, get_audio_duration_ms
 
 
 """
@@ -14,7 +15,7 @@ This script combines images (representing visemes) and an audio file to generate
 
 2. **Generating the Video**:
    - The video is created frame-by-frame by combining images (one per viseme) with specific durations.
-   - The duration for each viseme is calculated based on the difference between the current viseme's `offset` and the next one.
+   - The number of frames for each viseme is taken from a drift-free frame plan (`viseme_timeline.build_frame_plan`), built from the absolute `offset` values and the audio length.
    - Frames per second (FPS) is set at 25, and each image is resized to match the video dimensions.
 
 3. **Merging Audio and Video**:
@@ -46,40 +47,29 @@ with open(json_file_path, 'r') as f:
     data = json.load(f)
 
 # Assuming your JSON structure contains a list of visemes with id and offset
-# Example: [{"visemeId": 1, "offset": 1000}, {"visemeId": 2, "offset": 2000}]
-# and you have the duration of each viseme to calculate the time it should be displayed
+# Example: [{"id": 1, "offset": 1000}, {"id": 2, "offset": 2000}]
+# Each viseme is shown until the next one starts, the last one until the end of the audio
 
 # Settings for the video
 fps = 25  # Frames per second
-frame_duration = 1000 / fps  # Duration of each frame in milliseconds
 
 # Prepare the video writer
 fourcc = cv2.VideoWriter_fourcc(*'mp4v')
 height, width = 901,859  # Set the height and width according to your viseme images
 video_writer = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
 
-for viseme in data:
-    viseme_id = viseme["id"]
-    start_offset = viseme["offset"]
-    # Assuming you have a way to calculate the end of each viseme, perhaps the start of the next one
-    # For the last viseme, you might need to estimate or define a fixed duration
-    if viseme != data[-1]:
-        end_offset = data[data.index(viseme) + 1]["offset"]
-    else:
-        end_offset = start_offset + 1000  # Example fixed duration of 1 second for the last viseme
-    duration = end_offset - start_offset
-    
-    # Calculate how many frames to generate for this viseme
-    frame_count = int(duration / frame_duration)
-    
-    # Load the viseme image
-    viseme_image_path = f'{viseme_image_dir}viseme-id-{viseme_id}.jpg'
-    viseme_image = cv2.imread(viseme_image_path)
-    viseme_image = cv2.resize(viseme_image, (width, height))  # Ensure image fits video dimensions
-    
+plan = build_frame_plan_from_visemes(data, fps, get_audio_duration_ms(audio_file_path))
+viseme_images = {}
+for viseme_id, frame_count in plan:
+    # Load the viseme image once per viseme id
+    if viseme_id not in viseme_images:
+        viseme_image_path = f'{viseme_image_dir}viseme-id-{viseme_id}.jpg'
+        viseme_image = cv2.imread(viseme_image_path)
+        viseme_images[viseme_id] = cv2.resize(viseme_image, (width, height))  # Ensure image fits video dimensions
+
     # Write the image frames to the video
     for _ in range(frame_count):
-        video_writer.write(viseme_image)
+        video_writer.write(viseme_images[viseme_id])
 
 # Release the video writer
 video_writer.release()
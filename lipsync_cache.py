@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import threading
+from render_cache import DEFAULT_MAX_BYTES, RenderCache
+
+
+"""
+This module caches the videos of the remote lipsync API (`lipsync_jeff.LipSync`) on disk, so a face image and audio that were lip-synced before are not uploaded again and do not wait for the remote processing: the stored (already rotated) video is returned at once.
+
+### Key Components:
+
+1. **`LipSyncCache` Class**:
+   - A `render_cache.RenderCache` (atomic entries, LRU eviction within a disk budget, hit and miss counters) keyed by content, not by file names: `make_key(face_path, audio_path, payload)` hashes the SHA-256 of the face image, of the audio and the request options. The hash of an unchanged file (same path, size and modification time) is remembered, so the avatar photo is read once per process.
+   - `get_or_generate(key, generate)` returns the cached video, or calls `generate()` (which returns the path of a new video, or `None` if it failed), stores its video and returns the stored copy. It is single-flight: while one call generates a key, identical calls wait for its result instead of sending their own request.
+   - `stats()` adds the number of calls that waited for another one (`coalesced`) to the `RenderCache` counters.
+
+2. **`get_lipsync_cache(root, max_bytes)`**:
+   - Returns the process-wide cache for a directory, so concurrent jobs share their in-flight requests.
+"""
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# (path, size, modification time) -> SHA-256 of the file.
+file_digests = {}
+file_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with file_digests_lock:
+        digest = file_digests.get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with file_digests_lock:
+            file_digests[key] = digest
+    return digest
+
+
+class InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.video = None
+
+
+class LipSyncCache(RenderCache):
+    def __init__(self, root="cache/lipsync", max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(root, max_bytes)
+        self.in_flight = {}
+        self.coalesced = 0
+
+    def make_key(self, face_path, audio_path, payload=None):
+        request = [file_digest(face_path), file_digest(audio_path), payload or {}]
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get_or_generate(self, key, generate):
+        with self.lock:
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = InFlight()
+                self.in_flight[key] = flight
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            return flight.video
+        try:
+            entry = self.get(key)
+            if entry is None:
+                video = generate()
+                entry = self.put(key, {"video": video}) if video is not None else None
+                # Not stored (e.g. no disk space), the new video is still good.
+                flight.video = entry["video"] if entry is not None else video
+            else:
+                print(f"LipSync cache hit {key}, using {entry['video']}.")
+                flight.video = entry["video"]
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight.done.set()
+        return flight.video
+
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats["coalesced"] = self.coalesced
+        return stats
+
+
+lipsync_caches = {}
+lipsync_caches_lock = threading.Lock()
+
+
+def get_lipsync_cache(root="cache/lipsync", max_bytes=DEFAULT_MAX_BYTES):
+    with lipsync_caches_lock:
+        cache = lipsync_caches.get(os.path.abspath(root))
+        if cache is None:
+            cache = LipSyncCache(root, max_bytes)
+            lipsync_caches[os.path.abspath(root)] = cache
+        return cache
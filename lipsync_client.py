@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+"""
+This module is the HTTP client for the remote lipsync API used by the `beff-mode` and `Hulk-mode` avatars (`lipsync_jeff.LipSync`). All requests of a process go through one `requests.Session`, so connections (and their TLS handshakes) are reused instead of opened per request, every request has a timeout, and the result video is streamed to disk in chunks instead of being held in memory.
+
+### Key Components:
+
+1. **`LipSyncClient` Class**:
+   - One session with a connection pool of `pool_size` connections per host and bounded retries with exponential backoff (`retries`, `backoff`): failed connections, and `429` / `5xx` answers (honouring `Retry-After`), are retried, other errors are raised as `LipSyncError`.
+   - `submit(face_path, audio_path, api_key, payload=None)` uploads the face image and the audio and returns the URL of the result video. The files are opened for the upload only and always closed.
+   - `download(url, out_path)` streams the video in `CHUNK_SIZE` chunks to `<out_path>.part` and renames it to `out_path` once complete, so a failed or partial download never leaves a truncated video behind. A download cut off midway is started again, up to `retries` times.
+   - `generate(face_path, audio_path, out_path, api_key, payload=None)` does both.
+   - `stats()` reports the requests, retries and downloaded bytes.
+
+2. **`generate_many(jobs, workers=DEFAULT_WORKERS)`**:
+   - Runs several jobs (e.g. one `LipSync.generateVideo` per avatar) at the same time, sharing the client's connections.
+
+3. **`get_lipsync_client(api_url=API_URL)`**:
+   - Returns the process-wide client of an API URL.
+
+`mock_lipsync_server.py` serves the same API locally, for tests without an API key.
+"""
+
+API_URL = "https://api.gooey.ai/v2/Lipsync/form/"
+DEFAULT_POOL_SIZE = 4
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+CONNECT_TIMEOUT = 10
+# The API answers the upload once the video is generated, which takes a while.
+READ_TIMEOUT = 600
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CHUNK_SIZE = 1 << 20
+
+
+class LipSyncError(RuntimeError):
+    pass
+
+
+class LipSyncClient:
+    def __init__(self, api_url=API_URL, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.api_url = api_url
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = (connect_timeout, read_timeout)
+        # The upload is encoded once, so a retried POST sends the same body again.
+        retry = Retry(
+            total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "POST"]), raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.requests = 0
+        self.retried = 0
+        self.downloaded_bytes = 0
+        self.lock = threading.Lock()
+
+    def count(self, response):
+        with self.lock:
+            self.requests += 1
+            self.retried += len(response.raw.retries.history) if response.raw.retries is not None else 0
+
+    def submit(self, face_path, audio_path, api_key, payload=None):
+        with open(face_path, "rb") as face, open(audio_path, "rb") as audio:
+            response = self.session.post(
+                self.api_url,
+                headers={"Authorization": "Bearer " + api_key},
+                files=[("input_face", face), ("input_audio", audio)],
+                data={"json": json.dumps(payload or {})},
+                timeout=self.timeout,
+            )
+        self.count(response)
+        if response.status_code != 200:
+            raise LipSyncError(f"The lipsync API answered {response.status_code}: {response.text[:200]}")
+        return response.json()["output"]["output_video"]
+
+    def download(self, url, out_path):
+        part_path = out_path + ".part"
+        for attempt in range(self.retries + 1):
+            try:
+                with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                    self.count(response)
+                    if response.status_code != 200:
+                        raise LipSyncError(f"Downloading {url} failed with status {response.status_code}.")
+                    with open(part_path, "wb") as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                            with self.lock:
+                                self.downloaded_bytes += len(chunk)
+                os.replace(part_path, out_path)
+                return out_path
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                # Cut off after the headers, which the session's retries do not cover.
+                if attempt == self.retries:
+                    raise LipSyncError(f"Downloading {url} failed: {e}")
+                print(f"Download of {url} was interrupted, retrying.")
+                time.sleep(self.backoff * 2 ** attempt)
+                with self.lock:
+                    self.retried += 1
+            finally:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+
+    def generate(self, face_path, audio_path, out_path, api_key, payload=None):
+        video_url = self.submit(face_path, audio_path, api_key, payload)
+        return self.download(video_url, out_path)
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "retries": self.retried, "downloaded_bytes": self.downloaded_bytes}
+
+    def close(self):
+        self.session.close()
+
+
+def generate_many(jobs, workers=DEFAULT_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+lipsync_clients = {}
+lipsync_clients_lock = threading.Lock()
+
+
+def get_lipsync_client(api_url=API_URL):
+    with lipsync_clients_lock:
+        client = lipsync_clients.get(api_url)
+        if client is None:
+            client = LipSyncClient(api_url)
+            lipsync_clients[api_url] = client
+        return client
@@ -1,31 +1,35 @@
 import os
-import requests
-import json
+import threading
 import moviepy.editor as mpy
+from lipsync_client import LipSyncError, generate_many, get_lipsync_client
 
 """
-This class, `LipSync`, provides functionality for generating a lip-sync video by uploading an image and an audio file to a remote service, handling API keys securely, and post-processing the video (such as rotating it). The class uses the `moviepy` library to manipulate video files and `requests` for API communication.
+This class, `LipSync`, provides functionality for generating a lip-sync video by uploading an image and an audio file to a remote service, handling API keys securely, and post-processing the video (such as rotating it). The class uses the `moviepy` library to manipulate video files and `lipsync_client.LipSyncClient` for API communication.
 
 ### Key Functions:
 
-1. **`__init__(self, person)`**:
-   - Initializes the `LipSync` object with the name of the person (used to find the input image file).
+1. **`__init__(self, person, out_dir="video", audio_path="audio/24.wav", client=None, cache=None)`**:
+   - Initializes the `LipSync` object with the name of the person (used to find the input image file `avatars/{person}.jpg`), the directory the videos are written to (a job's workspace when called from `VideoMaker`) and the audio to lip-sync.
+   - `client` is the `LipSyncClient` to send the request with, by default the process-wide one, so every `LipSync` reuses the same connections.
+   - `cache` is an optional `lipsync_cache.LipSyncCache`.
    
 2. **`save_int(value)` and `load_int()`**:
-   - Save and load an integer value from a file (`secret_key.txt`). These methods are used to switch between two secret keys (`sk_1` and `sk_2`) for API authentication.
+   - Save and load an integer value from a file (`secret_key.txt`). These methods are used to switch between two secret keys (`sk_1` and `sk_2`) for API authentication (`next_key()`, one request at a time).
 
-3. **`load_images()`**:
-   - Loads the necessary image and audio files (hardcoded to `24.wav` for audio and `{person}.jpg` for the image) into the `files` list, which will be sent with the API request.
-
-4. **`rotate()`**:
+3. **`rotate()`**:
    - Rotates the downloaded video using `moviepy` (currently set up to save the video without rotating, but can be adjusted to rotate by degrees, e.g., 90 degrees).
-   - Saves the rotated (or non-rotated) video to `'video/2.mp4'`.
+   - Saves the rotated (or non-rotated) video to `2.mp4` in the output directory.
 
-5. **`generateVideo()`**:
+4. **`generateVideo()`**:
    - Uploads the image and audio files to the API to generate a lip-sync video.
    - Switches between two secret API keys for authentication and saves the current key usage to `secret_key.txt`.
-   - Once the API response is received, it downloads the generated video and saves it to `'video/lipsync.mp4'`.
+   - Once the API response is received, it streams the generated video to `lipsync.mp4` in the output directory.
    - Optionally rotates the downloaded video using the `rotate()` method.
+   - Returns the path of the video, or `None` if the request failed.
+   - With a `cache`, a face image, audio and payload that were lip-synced before return the stored video (`out_path` then points into the cache) without calling the API, and identical requests running at the same time make one call (`request_video()` is the uncached request).
+
+5. **`generate_videos(lip_syncs, workers)`**:
+   - Generates the videos of several `LipSync` objects (e.g. one per avatar) at the same time.
 
 ### How to Use:
 
@@ -35,9 +39,19 @@ This class, `LipSync`, provides functionality for generating a lip-sync video by
    pip install requests moviepy
 """
 
+key_lock = threading.Lock()
+
+
 class LipSync:
-    def __init__(self, person):
+    def __init__(self, person, out_dir="video", audio_path="audio/24.wav", client=None, cache=None):
         self.person = person
+        self.out_dir = out_dir
+        self.face_path = os.path.join("avatars", f"{person}.jpg")
+        self.audio_path = audio_path
+        self.client = client or get_lipsync_client()
+        self.cache = cache
+        self.download_path = os.path.join(out_dir, "lipsync.mp4")
+        self.out_path = os.path.join(out_dir, "2.mp4")
 
     def save_int(self, value):
         with open('secret_key.txt', 'w') as f:
@@ -47,13 +61,6 @@ class LipSync:
         with open('secret_key.txt', 'r') as f:
             return int(f.read())
 
-    files = []
-    
-    def load_images(self): 
-        self.files = [
-            ("input_face", open(f"{self.person}.jpg", "rb")),
-            ("input_audio", open("audio/24.wav", "rb")),
-        ]
     payload = {}
 
     sk_1 = "sk-"
@@ -61,52 +68,48 @@ class LipSync:
 
     def rotate(self):
         # Load the video
-        clip = mpy.VideoFileClip('video/lipsync.mp4')
+        clip = mpy.VideoFileClip(self.download_path)
 
         # Rotate the video (adjust the rotation degree as needed)
         # rotated_clip = clip.rotate(90)  
 
-        # Save the rotated video
-        clip.write_videofile('video/2.mp4')
+        # Save the rotated video, then close the reader so its ffmpeg process and file handle do not outlive the job
+        clip.write_videofile(self.out_path)
+        clip.close()
+
+    def next_key(self):
+        with key_lock:
+            secret_key = self.sk_1
+            which_key = self.load_int()
+            if which_key == 1:
+                secret_key = self.sk_2
+                self.save_int(2)
+                print("which key: 1")
+            else:
+                self.save_int(1)
+                print("which key: 2")
+            return secret_key
 
     def generateVideo(self):
-        self.load_images()
-        secret_key = self.sk_1 
-        which_key = self.load_int()
-        if which_key == 1:
-            secret_key = self.sk_2
-            self.save_int(2)
-            print("which key: 1")
-        else: 
-            self.save_int(1)
-            print("which key: 2")
-
-        response = requests.post(
-            "https://api.gooey.ai/v2/Lipsync/form/",
-            headers={
-                "Authorization": "Bearer " + secret_key,
-            },
-            files = self.files,
-            data={"json": json.dumps(self.payload)},
-        )
-
-        # assert response.ok, response.content
-
-        result = response.json()
-        print(response.status_code, result)
-        # Parse the JSON string into a Python dictionary
-
-        # Access the output_video URL from the parsed JSON
-        if response.status_code == 200:
-            data = result
-            video_url = data['output']['output_video']
-            video_download_request = requests.get(video_url)
-            if video_download_request.status_code == 200:
-                # Save the video to a file
-                with open('video/lipsync.mp4', 'wb') as file:
-                    file.write(video_download_request.content)
-                self.rotate() # <- This is optional for my use case I needed it :)
-                print("Download successful!")
-                
-        else:
-            print("Failed to download the video. Status code:", response.status_code)
+        if self.cache is None:
+            return self.request_video()
+        key = self.cache.make_key(self.face_path, self.audio_path, self.payload)
+        video = self.cache.get_or_generate(key, self.request_video)
+        if video is not None:
+            self.out_path = video
+        return video
+
+    def request_video(self):
+        secret_key = self.next_key()
+        try:
+            self.client.generate(self.face_path, self.audio_path, self.download_path, secret_key, self.payload)
+        except LipSyncError as e:
+            print("Failed to download the video:", e)
+            return None
+        self.rotate() # <- This is optional for my use case I needed it :)
+        print("Download successful!")
+        return self.out_path
+
+
+def generate_videos(lip_syncs, workers=None):
+    return generate_many([lip_sync.generateVideo for lip_sync in lip_syncs], workers or len(lip_syncs))
@@ -0,0 +1,220 @@
+import bisect
+import threading
+import time
+from collections import deque
+import cv2
+from PyQt5 import QtCore, QtGui, QtMultimedia, QtWidgets
+
+
+"""
+This module shows a reply on screen while it is being synthesized, without encoding it: the viseme frames go straight to a Qt widget and the TTS audio (raw PCM) straight to the audio device. The mouth follows the audio playback clock, so it starts moving as soon as the first audio arrives and stays in sync even if Azure delivers more slowly than real time.
+
+### Key Components:
+
+1. **`LiveSession` Class**:
+   - One reply. The synthesis thread pushes visemes (`push_viseme(offset_ms, id)`) and PCM chunks (`push_audio(data)`) as Azure delivers them, and calls `finish(duration_ms)` or `cancel()`; `is_finished()` tells whether either was called.
+   - Thread-safe: it is filled by a worker thread and read by the widget on the Qt thread.
+
+2. **`LivePlayer` Class (PyQt5 widget)**:
+   - `start_session(get_frame, frame_set_key)` queues a new reply and returns its `LiveSession`. It can be called from any thread; replies play one after the other.
+   - A timer on the Qt thread writes the pending audio into a `QAudioOutput` (24 kHz 16-bit mono, the format `GenerateVideoAndAudio` synthesizes), reads the playback position (`processedUSecs()`) and shows the frame of the viseme at that position. Frames are converted to `QPixmap` once per viseme and frame set, so a tick costs a lookup.
+   - Without a usable audio device it follows the wall clock from the first audio instead, so the video still plays.
+   - Between replies it shows the idle frame (viseme 0) of the last frame set.
+
+### How to Use:
+Create the widget on the Qt thread and pass it to `GenerateVideoAndAudio(..., live_player=player)`, then run with `--live` (see `TCPConnection.py`).
+"""
+
+SAMPLE_RATE = 24000
+BYTES_PER_MS = SAMPLE_RATE * 2 / 1000
+TICK_MS = 10
+# Audio queued in the device. Small, so the playback position (and the mouth) is close to what is heard.
+AUDIO_BUFFER_MS = 100
+IDLE_VISEME_ID = 0
+
+
+class LiveSession:
+    def __init__(self, get_frame, frame_set_key):
+        self.get_frame = get_frame
+        self.frame_set_key = frame_set_key
+        self.offsets = []
+        self.ids = []
+        self.audio = bytearray()
+        self.duration_ms = None
+        self.canceled = False
+        self.lock = threading.Lock()
+
+    def push_viseme(self, offset_ms, viseme_id):
+        with self.lock:
+            index = bisect.bisect_right(self.offsets, offset_ms)
+            self.offsets.insert(index, offset_ms)
+            self.ids.insert(index, viseme_id)
+
+    def push_audio(self, data):
+        with self.lock:
+            self.audio += data
+
+    def finish(self, duration_ms):
+        with self.lock:
+            self.duration_ms = duration_ms
+
+    def cancel(self):
+        with self.lock:
+            self.canceled = True
+
+    def is_finished(self):
+        with self.lock:
+            return self.duration_ms is not None or self.canceled
+
+    def take_audio(self, max_bytes):
+        with self.lock:
+            # Whole 16-bit samples only.
+            chunk = bytes(self.audio[:max_bytes - max_bytes % 2])
+            del self.audio[:len(chunk)]
+            return chunk
+
+    def viseme_at(self, position_ms):
+        with self.lock:
+            index = bisect.bisect_right(self.offsets, position_ms) - 1
+            return self.ids[index] if index >= 0 else None
+
+    def is_complete(self):
+        # Synthesis is done and all of its audio was handed to the player.
+        with self.lock:
+            return self.duration_ms is not None and not self.audio
+
+    def is_done(self, position_ms):
+        with self.lock:
+            if self.canceled:
+                return True
+        return self.is_complete() and position_ms >= self.duration_ms
+
+
+class LivePlayer(QtWidgets.QWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Live Avatar")
+        self.setGeometry(100, 100, 480, 640)
+        self.label = QtWidgets.QLabel(self)
+        self.label.setScaledContents(True)
+        self.layout = QtWidgets.QVBoxLayout()
+        self.layout.addWidget(self.label)
+        self.setLayout(self.layout)
+
+        self.format = QtMultimedia.QAudioFormat()
+        self.format.setSampleRate(SAMPLE_RATE)
+        self.format.setChannelCount(1)
+        self.format.setSampleSize(16)
+        self.format.setCodec("audio/pcm")
+        self.format.setByteOrder(QtMultimedia.QAudioFormat.LittleEndian)
+        self.format.setSampleType(QtMultimedia.QAudioFormat.SignedInt)
+        self.audio_output = None
+        self.audio_device = None
+        self.audio_played = False
+        self.clock_start = None
+
+        self.sessions = deque()
+        self.sessions_lock = threading.Lock()
+        self.session = None
+        self.pixmaps = {}
+        self.pixmap_set = None
+        self.shown = None
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(TICK_MS)
+
+    def start_session(self, get_frame, frame_set_key):
+        session = LiveSession(get_frame, frame_set_key)
+        with self.sessions_lock:
+            self.sessions.append(session)
+        return session
+
+    def tick(self):
+        if self.session is None:
+            with self.sessions_lock:
+                self.session = self.sessions.popleft() if self.sessions else None
+            if self.session is None:
+                return
+            self.start_audio()
+        session = self.session
+        self.feed_audio(session)
+        position_ms = self.get_position_ms()
+        viseme_id = session.viseme_at(position_ms)
+        self.show_frame(session, IDLE_VISEME_ID if viseme_id is None else viseme_id)
+        if session.is_done(position_ms) or (self.is_drained() and session.is_complete()):
+            self.end_session()
+
+    def is_drained(self):
+        # The device played everything it was given. It is idle before the first write too, so only after playing.
+        if self.audio_device is None:
+            return False
+        state = self.audio_output.state()
+        if state == QtMultimedia.QAudio.ActiveState:
+            self.audio_played = True
+        return self.audio_played and state == QtMultimedia.QAudio.IdleState
+
+    def start_audio(self):
+        self.clock_start = None
+        self.audio_played = False
+        self.audio_output = QtMultimedia.QAudioOutput(self.format, self)
+        self.audio_output.setBufferSize(int(BYTES_PER_MS * AUDIO_BUFFER_MS))
+        self.audio_device = self.audio_output.start()
+        if self.audio_device is None or self.audio_output.error() != QtMultimedia.QAudio.NoError:
+            print("No audio output available, the live player follows the wall clock.")
+            self.audio_device = None
+
+    def feed_audio(self, session):
+        if self.audio_device is None:
+            # No device to pace playback, the audio is consumed as it arrives.
+            chunk = session.take_audio(1 << 30)
+        else:
+            chunk = session.take_audio(self.audio_output.bytesFree())
+            if chunk:
+                self.audio_device.write(chunk)
+        if chunk and self.clock_start is None:
+            self.clock_start = time.monotonic()
+
+    def get_position_ms(self):
+        if self.clock_start is None:
+            return -1.0
+        if self.audio_device is not None:
+            # Stops when the device runs out of audio, so the mouth waits for a slow synthesis instead of running ahead.
+            return self.audio_output.processedUSecs() / 1000
+        return (time.monotonic() - self.clock_start) * 1000
+
+    def get_pixmap(self, session, viseme_id):
+        if self.pixmap_set != session.frame_set_key:
+            self.pixmaps = {}
+            self.pixmap_set = session.frame_set_key
+        pixmap = self.pixmaps.get(viseme_id)
+        if pixmap is None:
+            frame = cv2.cvtColor(session.get_frame(viseme_id), cv2.COLOR_BGR2RGB)
+            height, width, channels = frame.shape
+            image = QtGui.QImage(frame.data, width, height, channels * width, QtGui.QImage.Format_RGB888)
+            pixmap = QtGui.QPixmap.fromImage(image.copy())
+            self.pixmaps[viseme_id] = pixmap
+        return pixmap
+
+    def show_frame(self, session, viseme_id):
+        key = (session.frame_set_key, viseme_id)
+        if key == self.shown:
+            return
+        self.label.setPixmap(self.get_pixmap(session, viseme_id))
+        self.shown = key
+
+    def end_session(self):
+        if self.audio_output is not None:
+            self.audio_output.stop()
+            self.audio_output.deleteLater()
+        self.audio_output = None
+        self.audio_device = None
+        self.show_frame(self.session, IDLE_VISEME_ID)
+        self.session = None
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        if self.audio_output is not None:
+            self.audio_output.stop()
+        super().closeEvent(event)
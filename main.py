@@ -3,8 +3,8 @@ import json
 import cv2
 from moviepy.editor import VideoFileClip, AudioFileClip
 import argparse
-import numpy as np
 import azure.cognitiveservices.speech as speechsdk
+from viseme_timeline import build_frame_plan_from_visemes, get_audio_duration_ms
 
 duration = 95
 fps = 1 / (duration / 1000)
@@ -78,17 +78,14 @@ class VideoMaker:
     def get_out(self, out_path):
         return cv2.VideoWriter(out_path, self.fourcc, self.fps, (self.width, self.height))
 
-    def read_chunk_data(self, chunk):
-        return chunk["id"], duration
-
     def make_frame(self, id):
         print(f"Generating frame for viseme id {id}.")
         frame = cv2.imread(os.path.join(self.im_dir, f"viseme-id-{id}.jpg"))
         frame = cv2.rotate(frame, cv2.ROTATE_180)
         return cv2.resize(frame, (self.width, self.height))
 
-    def frame_to_video(self, output, frame, dur):
-        for i in range(int(np.round(dur / 1000 * self.fps, 0))):
+    def frame_to_video(self, output, frame, count):
+        for i in range(count):
             output.write(frame)
 
     def generate_video(self, in_file):
@@ -98,13 +95,12 @@ class VideoMaker:
         output = self.get_out(self.out_path)
         data = self.load_json("metadata/24.json")
         print(len(data))
-        viseme_dur = 0
-        for chunk in data:
-            mapped, dur = self.read_chunk_data(chunk)
-            print(f"Viseme id {mapped} has duration {dur} milliseconds.")
+        plan = build_frame_plan_from_visemes(data, self.fps, get_audio_duration_ms("audio/24.wav"))
+        for mapped, count in plan:
+            print(f"Viseme id {mapped} is shown for {count} frames.")
             frame = self.make_frame(mapped)
-            self.frame_to_video(output, frame, dur)
-            viseme_dur += dur
+            self.frame_to_video(output, frame, count)
+        viseme_dur = plan.duration_ms
         output.release()
         cv2.destroyAllWindows()
         print(f"Generated video of {viseme_dur} milliseconds from viseme images.")
@@ -178,8 +174,6 @@ service_region = "westus2"
 speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
 speech_config.speech_synthesis_voice_name = "en-US-AriaNeural"
 
-input_text = input("")
-
 speech_config_text = """
     <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="en-US">
         <voice name="en-US-EmmaNeural">
@@ -192,34 +186,36 @@ speech_config_text = """
         </voice>
     </speak>"""
 
-ssml = speech_config_text.format(input_text)
 
+def synthesize(input_text):
+    ssml = speech_config_text.format(input_text)
 
-file_name = "audio/24.wav"
-file_config = speechsdk.audio.AudioOutputConfig(filename=file_name)
+    file_name = "audio/24.wav"
+    file_config = speechsdk.audio.AudioOutputConfig(filename=file_name)
 
-speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=file_config)
+    speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=file_config)
 
-viseme_data = []
+    viseme_data = []
 
+    def viseme_callback(event):
+        print(event)
+        viseme_data.append({"offset": event.audio_offset / 10000, "id": event.viseme_id})
 
-def viseme_callback(event):
-    print(event)
-    viseme_data.append({"offset": event.audio_offset / 10000, "id": event.viseme_id})
+    speech_synthesizer.viseme_received.connect(viseme_callback)
 
+    result = speech_synthesizer.speak_ssml_async(ssml=ssml).get()
 
-speech_synthesizer.viseme_received.connect(viseme_callback)
+    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+        with open("metadata/24.json", "w") as f:
+            json.dump(viseme_data, f, indent=4)
+            print("Done generating Viseme")
 
-result = speech_synthesizer.speak_ssml_async(ssml=ssml).get()
+    elif result.reason == speechsdk.ResultReason.Canceled:
+        cancellation_details = result.cancellation_details
+        if cancellation_details.reason == speechsdk.CancellationReason.Error:
+            print("Error details: {}".format(cancellation_details.error_details))
 
-if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-    with open("metadata/24.json", "w") as f:
-        json.dump(viseme_data, f, indent=4)
-        print("Done generating Viseme")
-       
-elif result.reason == speechsdk.ResultReason.Canceled:
-    cancellation_details = result.cancellation_details
-    if cancellation_details.reason == speechsdk.CancellationReason.Error:
-        print("Error details: {}".format(cancellation_details.error_details))
 
-generate()
\ No newline at end of file
+if __name__ == "__main__":
+    synthesize(input(""))
+    generate()
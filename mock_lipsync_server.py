@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+"""
+This module serves a local stand-in for the remote lipsync API (`lipsync_client.API_URL`), so `lipsync_client.LipSyncClient` and `lipsync_jeff.LipSync` can be tested without an API key or network. It answers the upload like the real API does (`{"output": {"output_video": <url>}}`) and serves the result video from the same server, and it can misbehave on purpose:
+
+- `fail_first`: the first N uploads are answered with `503 Service Unavailable`, which the client retries.
+- `truncate_first`: the first N downloads are cut off halfway, which the client starts again.
+- `latency`: seconds each upload takes, like the video being generated.
+
+The result video is `video_path` if given, otherwise `video_bytes` of generated data, sent in chunks so large outputs cost the server no memory either. Connections are kept alive (HTTP/1.1), and `stats()` counts the connections opened, uploads and downloads, so tests can check that the client reuses its connections.
+
+### Key Components:
+
+1. **`MockLipSyncServer` Class**:
+   - `start()` / `stop()` (or `with MockLipSyncServer() as server:`) run the server on a background thread; `api_url` is the URL to give the client.
+
+### How to Use:
+```bash
+python mock_lipsync_server.py --port 8765 --video_bytes 200000000 --fail_first 2
+```
+Then point a client at `http://127.0.0.1:8765/v2/Lipsync/form/`.
+"""
+
+API_PATH = "/v2/Lipsync/form/"
+VIDEO_PATH = "/videos/"
+CHUNK_SIZE = 1 << 16
+
+
+class MockLipSyncHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.mock.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != API_PATH:
+            self.send_json(404, {"detail": "Not found"})
+            return
+        if mock.take("fail_first"):
+            self.send_json(503, {"detail": "Service unavailable"})
+            return
+        if not self.headers.get("Authorization", "").startswith("Bearer ") or b'name="input_face"' not in body or b'name="input_audio"' not in body:
+            self.send_json(400, {"detail": "input_face, input_audio and an API key are required"})
+            return
+        time.sleep(mock.latency)
+        upload = mock.count("uploads")
+        host, port = self.server.server_address[:2]
+        self.send_json(200, {"output": {"output_video": f"http://{host}:{port}{VIDEO_PATH}{upload}.mp4"}})
+
+    def do_GET(self):
+        mock = self.server.mock
+        if not self.path.startswith(VIDEO_PATH):
+            self.send_json(404, {"detail": "Not found"})
+            return
+        mock.count("downloads")
+        size = mock.get_video_size()
+        # Half of the video, then the connection is closed.
+        sent_size = size // 2 if mock.take("truncate_first") else size
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        for chunk in mock.read_video(sent_size):
+            self.wfile.write(chunk)
+        if sent_size < size:
+            self.close_connection = True
+
+
+class MockLipSyncServer:
+    def __init__(self, host="127.0.0.1", port=0, video_path=None, video_bytes=1 << 20, fail_first=0, truncate_first=0, latency=0):
+        self.video_path = video_path
+        self.video_bytes = video_bytes
+        self.latency = latency
+        self.counters = {"connections": 0, "uploads": 0, "downloads": 0, "fail_first": fail_first, "truncate_first": truncate_first}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), MockLipSyncHandler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.thread = None
+
+    @property
+    def api_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+            return self.counters[name]
+
+    def take(self, name):
+        # Uses up one of the requested failures, if any are left.
+        with self.lock:
+            if self.counters[name] > 0:
+                self.counters[name] -= 1
+                return True
+            return False
+
+    def get_video_size(self):
+        return os.path.getsize(self.video_path) if self.video_path is not None else self.video_bytes
+
+    def read_video(self, size):
+        if self.video_path is not None:
+            with open(self.video_path, "rb") as f:
+                while size > 0:
+                    chunk = f.read(min(CHUNK_SIZE, size))
+                    if not chunk:
+                        return
+                    size -= len(chunk)
+                    yield chunk
+            return
+        block = bytes(range(256)) * (CHUNK_SIZE // 256)
+        while size > 0:
+            yield block[:size]
+            size -= len(block)
+
+    def stats(self):
+        with self.lock:
+            return {name: self.counters[name] for name in ("connections", "uploads", "downloads")}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the remote lipsync API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--video", type=str, default=None, help="Video file served as the result.")
+    parser.add_argument("--video_bytes", type=int, default=1 << 20, help="Size of the generated result without --video.")
+    parser.add_argument("--fail_first", type=int, default=0, help="Answer the first N uploads with 503.")
+    parser.add_argument("--truncate_first", type=int, default=0, help="Cut off the first N downloads halfway.")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds each upload takes.")
+    args = parser.parse_args()
+
+    server = MockLipSyncServer(args.host, args.port, args.video, args.video_bytes, args.fail_first, args.truncate_first, args.latency)
+    print(f"Mock lipsync API listening on {server.api_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+        print(f"Served {server.stats()}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import wave
+
+
+"""
+This module holds synthesized speech in memory as raw PCM, so a reply can go from Azure to the encoder and the cache without writing a WAV file and reading it back.
+
+### Key Components:
+
+1. **`PcmAudio` Class**:
+   - Signed 16-bit little-endian PCM samples (`data`) with their sample rate and channel count. The defaults match Azure's `Raw24Khz16BitMonoPcm` output format, which is what `GenerateVideoAndAudio` requests.
+   - `duration_ms` is computed from the buffer length, no file or ffmpeg probe is needed.
+   - `ffmpeg_input_args()` describes the buffer to ffmpeg as an `s16le` input (see `ffmpeg_writer.AudioInput`).
+   - `write_wav(path)` persists the audio, only when a WAV file is explicitly needed (`--save_audio`, the legacy `mp4v` moviepy path or a cache entry).
+   - `from_wav(path)` loads an existing WAV file into memory.
+"""
+
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+
+
+class PcmAudio:
+    def __init__(self, data, sample_rate=SAMPLE_RATE, channels=1):
+        self.data = bytes(data)
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    @property
+    def duration_ms(self):
+        return len(self.data) * 1000 / (self.sample_rate * self.channels * SAMPLE_WIDTH)
+
+    def ffmpeg_input_args(self):
+        return ["-f", "s16le", "-ar", str(self.sample_rate), "-ac", str(self.channels)]
+
+    def write_wav(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with wave.open(path, "wb") as wav_file:
+            wav_file.setnchannels(self.channels)
+            wav_file.setsampwidth(SAMPLE_WIDTH)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(self.data)
+        return path
+
+    @classmethod
+    def from_wav(cls, path):
+        with wave.open(path, "rb") as wav_file:
+            if wav_file.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"{path} has {wav_file.getsampwidth() * 8}-bit samples, only 16-bit PCM is supported.")
+            return cls(wav_file.readframes(wav_file.getnframes()), wav_file.getframerate(), wav_file.getnchannels())
@@ -1,37 +1,172 @@
 import sys
 import os
-from PyQt5 import QtWidgets
+from PyQt5 import QtWidgets, QtCore
 import vlc
 
+"""
+This module plays the avatar videos with VLC in a PyQt5 window, without gaps or black frames between the idle loop of a mode and the replies.
+
+### Key Components:
+
+1. **`Surface` Class**:
+   - One VLC player drawing into its own frame of a `QStackedWidget`. `load(path)` parses the media and opens it paused, so its decoders are running before it is shown.
+
+2. **`VideoPlayer` Class (PyQt5 window)**:
+   - Every idle loop (`idle_videos`, or any idle video played with `play_idle(path)`) gets a resident surface that is opened once and loops inside VLC (`input-repeat`), instead of being rebuilt and seeked on every switch. Hidden idle loops are paused, not closed, so going back to one is instant. A loop that reaches the end of its repeats is started again.
+   - Replies alternate between two clip surfaces: the next reply is loaded on the surface that is not on screen while the current one keeps playing, and the stack switches to it only when VLC reports it ready (paused on its start). The surface it replaces is paused or stopped after the switch, so no empty frame is ever shown.
+   - When a reply ends the idle loop of the current mode is shown again.
+   - `play_video(path)` plays an idle loop if the path is one, a reply otherwise. Segmented (`.m3u8`) replies are read with the adaptive demuxer.
+"""
+
+# VLC's maximum. An idle loop that still runs out is restarted when VLC reports its end.
+IDLE_REPEAT = 65535
+PARSE_TIMEOUT_MS = 2000
+
+
+def attach(player, frame):
+    window = int(frame.winId())
+    if sys.platform == "darwin":
+        player.set_nsobject(window)
+    elif sys.platform.startswith("win"):
+        player.set_hwnd(window)
+    else:
+        player.set_xwindow(window)
+
+
+class Surface:
+    def __init__(self, vlc_instance, stack):
+        self.vlc_instance = vlc_instance
+        self.frame = QtWidgets.QFrame()
+        stack.addWidget(self.frame)
+        self.player = vlc_instance.media_player_new()
+        attach(self.player, self.frame)
+        self.path = None
+        self.options = ()
+
+    def load(self, path, options=()):
+        media = self.vlc_instance.media_new(path, ":start-paused", *options)
+        # Reads the headers now rather than when the video is due.
+        media.parse_with_options(vlc.MediaParseFlag.local, PARSE_TIMEOUT_MS)
+        self.player.set_media(media)
+        self.path = path
+        self.options = options
+        self.player.play()
+
+    def restart(self):
+        # Playing from the start right away, it is on screen.
+        self.player.set_media(self.vlc_instance.media_new(self.path, *self.options))
+        self.player.play()
+
+
 class VideoPlayer(QtWidgets.QMainWindow):
-    def __init__(self):
+    # Emitted from VLC's event threads, handled on the Qt thread.
+    clip_ready_signal = QtCore.pyqtSignal(object)
+    clip_ended_signal = QtCore.pyqtSignal(object)
+    idle_ended_signal = QtCore.pyqtSignal(object)
+
+    def __init__(self, idle_videos=()):
         super(VideoPlayer, self).__init__()
         print("Video Player Class")
         self.setWindowTitle("Video Player")
         self.setGeometry(100, 100, 200, 200)  # Set the geometry of the main window
 
-        # Create a basic video player widget
-        self.videoframe = QtWidgets.QFrame(self)
-        self.setCentralWidget(self.videoframe)
-        
-        # VLC player
-        self.vlc_instance = vlc.Instance()
-        self.player = self.vlc_instance.media_player_new()
+        # One frame per VLC player, only the one on top is visible
+        self.stack = QtWidgets.QStackedWidget(self)
+        self.setCentralWidget(self.stack)
 
-        # Set the player window
-        self.player.set_nsobject(int(self.videoframe.winId()))
+        # VLC players
+        self.vlc_instance = vlc.Instance()
+        self.idle_surfaces = {}
+        self.idle_path = None
+        self.clip_surfaces = [Surface(self.vlc_instance, self.stack) for _ in range(2)]
+        for surface in self.clip_surfaces:
+            events = surface.player.event_manager()
+            events.event_attach(vlc.EventType.MediaPlayerPaused, lambda event, surface=surface: self.clip_ready_signal.emit(surface))
+            events.event_attach(vlc.EventType.MediaPlayerEndReached, lambda event, surface=surface: self.clip_ended_signal.emit(surface))
+        self.clip_ready_signal.connect(self.on_clip_ready)
+        self.clip_ended_signal.connect(self.on_clip_ended)
+        self.idle_ended_signal.connect(self.on_idle_ended)
+        self.current = None
+        self.pending = None
+
+        for path in idle_videos:
+            if os.path.exists(path):
+                self.get_idle_surface(path)
+
+    def get_idle_surface(self, path):
+        surface = self.idle_surfaces.get(path)
+        if surface is None:
+            surface = Surface(self.vlc_instance, self.stack)
+            events = surface.player.event_manager()
+            events.event_attach(vlc.EventType.MediaPlayerEndReached, lambda event, surface=surface: self.idle_ended_signal.emit(surface))
+            surface.load(path, (f":input-repeat={IDLE_REPEAT}",))
+            self.idle_surfaces[path] = surface
+            print(f"Idle loop {path} loaded")
+        return surface
 
     def play_video(self, path):
-        if self.player.is_playing():
-            self.player.stop()  # Stop the current video if playing
-            print("Stopping previous playyer")
-        media = self.vlc_instance.media_new(path)
-        self.player.set_media(media)
-        self.player.play()
+        if path in self.idle_surfaces:
+            self.play_idle(path)
+        else:
+            self.play_clip(path)
+
+    def play_idle(self, path):
+        surface = self.get_idle_surface(path)
+        self.idle_path = path
+        if self.pending is not None:
+            # A mode switch replaces a reply that was not shown yet.
+            self.pending.player.stop()
+            self.pending = None
+        self.show_surface(surface)
+        surface.player.set_pause(0)
         print("Playing")
 
+    def play_clip(self, path):
+        surface = next(surface for surface in self.clip_surfaces if surface is not self.current)
+        surface.player.stop()
+        options = ()
+        if path.endswith(".m3u8"):
+            # Segmented output keeps growing while it renders, let the adaptive demuxer reload the playlist.
+            options = (":demux=adaptive",)
+        self.pending = surface
+        surface.load(path, options)
+        print(f"Preloading {path}")
+
+    def on_clip_ready(self, surface):
+        if surface is not self.pending:
+            return
+        self.pending = None
+        self.show_surface(surface)
+        surface.player.set_pause(0)
+        print("Playing")
+
+    def on_clip_ended(self, surface):
+        if surface is self.current and self.idle_path is not None:
+            self.play_idle(self.idle_path)
+
+    def on_idle_ended(self, surface):
+        # The loop used up its repeats. A hidden one is opened paused again, like when it was loaded.
+        if surface is self.current:
+            surface.restart()
+        else:
+            surface.load(surface.path, surface.options)
+
+    def show_surface(self, surface):
+        previous = self.current
+        self.stack.setCurrentWidget(surface.frame)
+        self.current = surface
+        if previous is None or previous is surface:
+            return
+        # Only once the new surface is on top, so the switch never shows an empty frame.
+        if previous in self.clip_surfaces:
+            previous.player.stop()
+        else:
+            previous.player.set_pause(1)
+
     def closeEvent(self, event):
-        self.player.stop()
+        for surface in self.clip_surfaces + list(self.idle_surfaces.values()):
+            surface.player.stop()
+            surface.player.release()
         self.vlc_instance.release()
         super(VideoPlayer, self).closeEvent(event)
 
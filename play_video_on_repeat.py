@@ -13,22 +13,20 @@ class VideoPlayer(QtWidgets.QWidget):
         self.video_widget = QtMultimediaWidgets.QVideoWidget()
         self.media_player = QtMultimedia.QMediaPlayer(None, QtMultimedia.QMediaPlayer.VideoSurface)
         self.media_player.setVideoOutput(self.video_widget)
+        # The playlist repeats the video inside the player, without stopping and seeking back at its end.
+        self.playlist = QtMultimedia.QMediaPlaylist(self)
+        self.playlist.setPlaybackMode(QtMultimedia.QMediaPlaylist.CurrentItemInLoop)
+        self.media_player.setPlaylist(self.playlist)
         
         self.layout = QtWidgets.QVBoxLayout()
         self.layout.addWidget(self.video_widget)
         self.setLayout(self.layout)
         
-        # Connect the media status changed signal to the loop video slot
-        self.media_player.mediaStatusChanged.connect(self.loop_video)
-        
     def play_video(self, path):
-        self.media_player.setMedia(QtMultimedia.QMediaContent(QtCore.QUrl.fromLocalFile(path)))
+        self.playlist.clear()
+        self.playlist.addMedia(QtMultimedia.QMediaContent(QtCore.QUrl.fromLocalFile(path)))
+        self.playlist.setCurrentIndex(0)
         self.media_player.play()
-        
-    def loop_video(self, status):
-        if status == QtMultimedia.QMediaPlayer.EndOfMedia:
-            self.media_player.setPosition(0)
-            self.media_player.play()
 
 class VideoApplication(QtWidgets.QApplication):
     play_video_signal = QtCore.pyqtSignal(str)  # Signal to play video
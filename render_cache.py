@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import unicodedata
+import uuid
+from pcm_audio import PcmAudio
+
+
+"""
+This module is a content-addressed store for finished replies. An entry holds the synthesized WAV, the viseme timeline and the final video, keyed by everything that changes the output: the normalized text, the voice, style and rate, the image set, the frame rate and the output format. A repeated phrase can then go straight to playback without calling Azure, rendering or encoding.
+
+### Key Components:
+
+1. **`RenderCache` Class**:
+   - `make_key(...)` hashes the normalized request into a SHA-256 key.
+   - `get(key)` returns the paths of a complete entry (and marks it as recently used) or `None`.
+   - `put(key, files)` copies the artifacts (file paths, or in-memory `PcmAudio` written as WAV) into a private temporary directory and renames it into place in one step, so readers and concurrent workers (threads or processes) never see a half-written entry. If another worker stored the same key first, its entry is kept.
+   - Entries are evicted least recently used first once the cache exceeds its disk budget.
+   - `stats()` reports hit and miss counters together with the number of entries and their size.
+
+2. **`get_render_cache(root, max_bytes)`**:
+   - Returns the process-wide cache for a directory, so counters are shared by every request in a server.
+"""
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+MANIFEST_FILE = "entry.json"
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def directory_size(path):
+    size = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                size += os.path.getsize(os.path.join(dir_path, file_name))
+            except OSError:
+                continue
+    return size
+
+
+class RenderCache:
+    def __init__(self, root="cache/render", max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def make_key(self, text, voice_actor, style, rate, im_dir, fps, output_format):
+        request = [normalize_text(text), voice_actor, style, rate.strip(), os.path.normpath(im_dir), fps, output_format]
+        return hashlib.sha256(json.dumps(request).encode("utf-8")).hexdigest()
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def read_entry(self, key):
+        entry_dir = self.entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, MANIFEST_FILE), "r") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+        return {name: os.path.join(entry_dir, file_name) for name, file_name in manifest["files"].items()}
+
+    def get(self, key):
+        entry = self.read_entry(key)
+        if entry is not None:
+            try:
+                # The manifest's modification time is the entry's last use, it drives LRU eviction.
+                os.utime(os.path.join(self.entry_dir(key), MANIFEST_FILE))
+            except OSError:
+                entry = None
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, key, files):
+        tmp_entry = os.path.join(self.tmp_dir, f"{key}.{uuid.uuid4().hex}")
+        os.makedirs(tmp_entry)
+        manifest = {"files": {}, "created": time.time()}
+        try:
+            for name, path in files.items():
+                if isinstance(path, PcmAudio):
+                    file_name = name + ".wav"
+                    path.write_wav(os.path.join(tmp_entry, file_name))
+                else:
+                    file_name = name + os.path.splitext(path)[1]
+                    shutil.copyfile(path, os.path.join(tmp_entry, file_name))
+                manifest["files"][name] = file_name
+            with open(os.path.join(tmp_entry, MANIFEST_FILE), "w") as manifest_file:
+                json.dump(manifest, manifest_file)
+            entry_dir = self.entry_dir(key)
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            os.rename(tmp_entry, entry_dir)
+        except OSError as e:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            # Most likely another worker stored the same key first, its entry is equally valid.
+            entry = self.read_entry(key)
+            if entry is None:
+                print(f"Could not store cache entry {key}: {e}")
+            return entry
+        self.evict()
+        return self.read_entry(key)
+
+    def list_entries(self):
+        entries = []
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix_dir == self.tmp_dir or not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, key)
+                try:
+                    last_used = os.path.getmtime(os.path.join(entry_dir, MANIFEST_FILE))
+                except OSError:
+                    continue
+                entries.append((last_used, key, entry_dir, directory_size(entry_dir)))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.list_entries())
+        total = sum(entry[3] for entry in entries)
+        for last_used, key, entry_dir, size in entries:
+            if total <= self.max_bytes:
+                break
+            # Move the entry out of the way first so readers never see it half deleted.
+            doomed = os.path.join(self.tmp_dir, f"{key}.evicted.{uuid.uuid4().hex}")
+            try:
+                os.rename(entry_dir, doomed)
+            except OSError:
+                continue
+            shutil.rmtree(doomed, ignore_errors=True)
+            total -= size
+            print(f"Evicted cache entry {key}.")
+
+    def stats(self):
+        entries = self.list_entries()
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": sum(entry[3] for entry in entries),
+            }
+
+
+render_caches = {}
+render_caches_lock = threading.Lock()
+
+
+def get_render_cache(root="cache/render", max_bytes=DEFAULT_MAX_BYTES):
+    with render_caches_lock:
+        cache = render_caches.get(os.path.abspath(root))
+        if cache is None:
+            cache = RenderCache(root, max_bytes)
+            render_caches[os.path.abspath(root)] = cache
+        return cache
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+
+"""
+This module runs `VideoMaker` renders in a pool of worker processes, so one machine can render as many replies at once as it has cores instead of rendering everything on the thread that called `generateViseme`.
+
+### Key Components:
+
+1. **`RenderJob` Class**:
+   - A plain, picklable description of one render: the viseme timeline (`[{"offset", "id"}, ...]`), the audio (a WAV path or in-memory `PcmAudio`, which is pickled along with the job), the image set, and the output spec (output path, fps, render mode, the mode: regular or a local avatar, and the transition length).
+
+2. **`render_job(job)`**:
+   - Runs inside a worker process. Each worker keeps its own `VideoMaker` per image set and its own frame atlas, so sprites are decoded once per worker and reused by every job it runs.
+   - Returns a dictionary with the output path, the video duration and the render time.
+
+3. **`RenderPool` Class**:
+   - Wraps a `ProcessPoolExecutor` sized to the core count. `submit(job)` returns a `concurrent.futures.Future`.
+   - Workers are started with the `spawn` method, so they do not inherit the Qt and VLC state of a server process.
+
+4. **`get_render_pool(workers)`**:
+   - Returns the process-wide pool shared by all requests.
+"""
+
+
+class RenderJob:
+    def __init__(self, visemes, audio, im_dir, out_path, fps=60, render_mode="direct", mode="regular-mode", transition_ms=0):
+        self.visemes = visemes
+        self.audio = audio
+        self.im_dir = im_dir
+        self.out_path = out_path
+        self.fps = fps
+        self.render_mode = render_mode
+        self.mode = mode
+        self.transition_ms = transition_ms
+
+
+worker_video_makers = {}
+
+
+def get_worker_video_maker(job):
+    from video_generator import VideoMaker
+
+    key = (job.im_dir, job.fps, job.render_mode, job.mode, job.transition_ms)
+    video_maker = worker_video_makers.get(key)
+    if video_maker is None:
+        video_maker = VideoMaker(
+            job.im_dir, None, None, os.path.dirname(job.out_path), job.fps, None, None, job.mode, job.render_mode,
+            transition_ms=job.transition_ms
+        )
+        worker_video_makers[key] = video_maker
+    return video_maker
+
+
+def render_job(job):
+    start = time.perf_counter()
+    video_maker = get_worker_video_maker(job)
+    # mp4v jobs only write frames, the other modes mux the audio in the same encoder pass.
+    mux_audio = job.audio is not None and job.render_mode != "mp4v"
+    duration_ms = video_maker.render_visemes(job.visemes, job.out_path, job.audio, mux_audio)
+    return {"out_path": job.out_path, "duration_ms": duration_ms, "render_seconds": time.perf_counter() - start}
+
+
+class RenderPool:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        print(f"Started render pool with {self.workers} worker processes.")
+
+    def submit(self, job):
+        return self.executor.submit(render_job, job)
+
+    def map(self, jobs):
+        return self.executor.map(render_job, jobs)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+render_pool = None
+render_pool_lock = threading.Lock()
+
+
+def get_render_pool(workers=None):
+    global render_pool
+    with render_pool_lock:
+        if render_pool is None:
+            render_pool = RenderPool(workers)
+        return render_pool
@@ -0,0 +1,144 @@
+import argparse
+import os
+import threading
+from video_generator import VideoMaker
+from viseme_timeline import StreamingTimeline, get_audio_duration_ms, visemes_to_arrays
+from timeline_file import load_timeline
+from tracing import Trace
+
+
+"""
+This module renders one reply to several outputs at once, e.g. the 200x200 kiosk window, a web client and an archive copy, instead of running `VideoMaker` from scratch for each of them.
+
+### Key Components:
+
+1. **`RenditionSpec` Class**:
+   - One output: its path, size (`None` keeps the size of the viseme images), image set (e.g. `image/mouth` or `image/mouth_dark_mode`), fps, video codec, render mode, mode (regular or a local avatar) and transition length.
+
+2. **`render_renditions(visemes, specs, audio=None, trace=None)`**:
+   - Walks the viseme timeline once. Every viseme is pushed to a `viseme_timeline.StreamingTimeline` per rendition (so renditions may have different frame rates) and the finished runs are written to that rendition's encoder, cut off where the audio ends. Each rendition gets the same frames `build_frame_plan` would give it, also when the audio ends before the last viseme. The encoders are separate ffmpeg processes, so they all work while the timeline is walked.
+   - Frames come from the shared frame atlas, decoded and resized once per image set and size, and the `VideoMaker` of each spec is kept for later calls, so a repeated rendition costs lookups and writes only.
+   - The audio (a WAV path or `PcmAudio`) is muxed into every rendition. Returns `{"out_path", "duration_ms"}` per spec.
+
+### How to Use:
+```bash
+python renditions.py metadata/text_to_viseme.json --audio audio/24.wav \
+    --rendition video/kiosk.mp4 200x200 --rendition video/dark.mp4 original image/mouth_dark_mode 30
+```
+"""
+
+
+class RenditionSpec:
+    def __init__(self, out_path, size=None, im_dir="image/mouth", fps=60, codec="libx264", render_mode="direct", mode="regular-mode", transition_ms=0):
+        self.out_path = out_path
+        self.size = size
+        self.im_dir = im_dir
+        self.fps = fps
+        self.codec = codec
+        self.render_mode = render_mode
+        self.mode = mode
+        self.transition_ms = transition_ms
+
+
+video_makers = {}
+video_makers_lock = threading.Lock()
+
+
+def get_video_maker(spec):
+    key = (os.path.abspath(spec.im_dir), spec.size, spec.fps, spec.codec, spec.render_mode, spec.mode, spec.transition_ms)
+    with video_makers_lock:
+        video_maker = video_makers.get(key)
+        if video_maker is None:
+            video_maker = VideoMaker(
+                spec.im_dir, None, None, None, spec.fps, None, None, spec.mode, spec.render_mode,
+                transition_ms=spec.transition_ms, size=spec.size, codec=spec.codec
+            )
+            video_makers[key] = video_maker
+        return video_maker
+
+
+class Rendition:
+    def __init__(self, spec, audio, audio_duration=None):
+        self.spec = spec
+        self.video_maker = get_video_maker(spec)
+        # mp4v writes frames only, like the render pool.
+        self.output = self.video_maker.get_out(spec.out_path, audio if spec.render_mode != "mp4v" else None)
+        self.timeline = StreamingTimeline(spec.fps)
+        # Audio that ends before the last viseme ends the video there, like build_frame_plan does.
+        self.frames_left = round(audio_duration * spec.fps / 1000) if audio_duration is not None else None
+        self.total_frames = 0
+        self.previous = None
+
+    def write(self, runs):
+        for mapped, count in runs:
+            if self.frames_left is not None:
+                count = min(count, self.frames_left)
+                self.frames_left -= count
+            if count <= 0:
+                continue
+            self.video_maker.write_run(self.output, self.previous, mapped, count)
+            self.previous = mapped
+            self.total_frames += count
+
+
+def render_renditions(visemes, specs, audio=None, trace=None):
+    trace = trace or Trace()
+    audio_duration = get_audio_duration_ms(audio) if audio is not None else getattr(visemes, "audio_duration_ms", None)
+    offsets, ids = visemes_to_arrays(visemes)
+    for spec in specs:
+        os.makedirs(os.path.dirname(spec.out_path) or ".", exist_ok=True)
+    renditions = [Rendition(spec, audio, audio_duration) for spec in specs]
+    with trace.span("render"):
+        for offset, viseme_id in zip(offsets.tolist(), ids.tolist()):
+            for rendition in renditions:
+                rendition.write(rendition.timeline.push(offset, viseme_id))
+        for rendition in renditions:
+            rendition.write(rendition.timeline.finish(audio_duration))
+    with trace.span("encode"):
+        for rendition in renditions:
+            rendition.output.release()
+    results = []
+    for rendition in renditions:
+        duration_ms = rendition.total_frames * 1000 / rendition.spec.fps
+        print(f"Generated {rendition.spec.out_path} ({duration_ms:.0f} ms at {rendition.spec.fps} fps).")
+        results.append({"out_path": rendition.spec.out_path, "duration_ms": duration_ms})
+    return results
+
+
+def parse_size(value):
+    if value == "original":
+        return None
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render one viseme timeline to several outputs in one pass.")
+    parser.add_argument("timeline", type=str, help="Viseme timeline (.json or .vtl).")
+    parser.add_argument("--audio", type=str, default=None, help="WAV file muxed into every rendition.")
+    parser.add_argument(
+        "--rendition", type=str, nargs="+", action="append", required=True,
+        metavar="OUT [SIZE [IM_DIR [FPS [CODEC]]]]",
+        help="An output path, optionally followed by WIDTHxHEIGHT (or original), image set, fps and video codec."
+    )
+    parser.add_argument(
+        "--render_mode", type=str, default="direct", choices=["direct", "vfr", "mp4v"], help="Writer used by every rendition."
+    )
+    parser.add_argument("--mode", type=str, default="regular-mode", help="regular-mode or a local avatar mode.")
+    parser.add_argument("--transition_ms", type=float, default=0, help="Cross-fade between mouth shapes for this long.")
+    args = parser.parse_args()
+
+    specs = []
+    for values in args.rendition:
+        if len(values) > 5:
+            parser.error(f"Too many values for --rendition {' '.join(values)}.")
+        out_path, size, im_dir, fps, codec = values + [None] * (5 - len(values))
+        specs.append(RenditionSpec(
+            out_path, parse_size(size or "original"), im_dir or "image/mouth", int(fps or 60), codec or "libx264",
+            args.render_mode, args.mode, args.transition_ms
+        ))
+    render_renditions(load_timeline(args.timeline), specs, args.audio)
+
+
+if __name__ == "__main__":
+    main()
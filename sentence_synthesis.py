@@ -0,0 +1,86 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pcm_audio import PcmAudio
+
+
+"""
+This module synthesizes a long reply sentence by sentence, in parallel, and stitches the pieces back into one reply. Azure's latency grows with the length of the SSML document, so a multi-paragraph answer sent as one request waits for every sentence in turn; sent as concurrent requests, it waits about as long as its longest sentence.
+
+### Key Components:
+
+1. **`split_sentences(text, min_chars=MIN_SENTENCE_CHARS)`**:
+   - Splits plain text after `.`, `!` and `?`. Fragments shorter than `min_chars` are merged into the previous sentence (a short first sentence into the next one), so short interjections do not cost a request of their own.
+   - Text containing SSML markup (`<break/>`, `<prosody>`, ...) is left in one piece, cutting it could break the markup.
+
+2. **`synthesize_sentences(synthesize, sentences, viseme_callback, completed_reason, workers, audio_callback=None)`**:
+   - Runs `synthesize(sentence, viseme_callback, audio_callback)` for every sentence on a thread pool and returns one result with the concatenated PCM (`audio_data`), or the first result that did not complete.
+   - Viseme offsets are rebased: every viseme of a sentence is shifted by the audio length of the sentences before it, so the stitched timeline lines up with the stitched audio.
+   - `viseme_callback` sees one ordered timeline. The first sentence's visemes are passed through live, so a streaming render starts as soon as Azure starts answering; the visemes of each later sentence are passed on, rebased, as soon as it and all sentences before it are done.
+   - `audio_callback`, if given, receives the PCM in the same order: the first sentence's chunks as Azure sends them, every later sentence's audio once it and the sentences before it are done.
+"""
+
+MIN_SENTENCE_CHARS = 20
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+TICKS_PER_MS = 10000
+
+
+def split_sentences(text, min_chars=MIN_SENTENCE_CHARS):
+    if "<" in text:
+        return [text]
+    sentences = []
+    for piece in SENTENCE_END.split(text.strip()):
+        piece = piece.strip()
+        if not piece:
+            continue
+        # A short fragment joins the sentence before it, a short first sentence the one after it.
+        if sentences and (len(piece) < min_chars or len(sentences[-1]) < min_chars):
+            sentences[-1] += " " + piece
+        else:
+            sentences.append(piece)
+    return sentences or [text]
+
+
+class RebasedViseme:
+    def __init__(self, audio_offset, viseme_id):
+        self.audio_offset = audio_offset
+        self.viseme_id = viseme_id
+
+    def __str__(self):
+        return f"RebasedViseme(audio_offset={self.audio_offset}, viseme_id={self.viseme_id})"
+
+
+class StitchedResult:
+    def __init__(self, reason, audio_data):
+        self.reason = reason
+        self.audio_data = audio_data
+        self.cancellation_details = None
+
+
+def synthesize_sentences(synthesize, sentences, viseme_callback, completed_reason, workers=4, audio_callback=None):
+    buffered = [[] for _ in sentences]
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(sentences))))
+    try:
+        futures = [
+            executor.submit(
+                synthesize, sentence, viseme_callback if index == 0 else buffered[index].append,
+                audio_callback if index == 0 else None
+            )
+            for index, sentence in enumerate(sentences)
+        ]
+        audio_parts = []
+        base_ticks = 0
+        for index, future in enumerate(futures):
+            result = future.result()
+            if result.reason != completed_reason:
+                return result
+            for event in buffered[index]:
+                viseme_callback(RebasedViseme(event.audio_offset + base_ticks, event.viseme_id))
+            if index > 0 and audio_callback is not None:
+                audio_callback(result.audio_data)
+            audio_parts.append(result.audio_data)
+            base_ticks += int(round(PcmAudio(result.audio_data).duration_ms * TICKS_PER_MS))
+            print(f"Sentence {index + 1}/{len(sentences)} synthesized, {base_ticks / TICKS_PER_MS:.0f} ms of audio so far.")
+        return StitchedResult(completed_reason, b"".join(audio_parts))
+    finally:
+        # Sentences still running after a failure finish in the background and return their synthesizers.
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,140 @@
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+from lipsync_cache import LipSyncCache
+from lipsync_client import LipSyncClient, generate_many
+from mock_lipsync_server import MockLipSyncServer
+
+
+"""
+This script is a stress test for the lipsync API client (`lipsync_client.py`) against the local mock API (`mock_lipsync_server.py`). It runs many jobs at once through one client, each uploading a face image and an audio file and downloading a large result video, while the server fails the first uploads with `503` and cuts off the first downloads halfway. It then sends `--identical_jobs` identical jobs at once through a `lipsync_cache.LipSyncCache`, twice.
+
+It then checks that:
+- every job downloaded the whole video and no `.part` file is left,
+- the failed uploads and downloads were retried,
+- the jobs shared the client's connections instead of opening one per request,
+- no file descriptor was leaked,
+- the peak memory grew by much less than the size of the videos, i.e. they were streamed to disk,
+- the identical jobs made one API call between them and got the same cached video, and repeating them made none,
+- the cache key follows the content of the audio: two different audios give two keys, the same audio at another path the same key.
+
+### How to Use:
+```bash
+python stress_lipsync_client.py --jobs 16 --workers 4 --video_mb 64
+```
+Exits with status 1 if any check fails.
+"""
+
+# Peak memory may grow by this much whatever the video size: buffers, threads and the mock server.
+MEMORY_TOLERANCE_MB = 64
+
+
+def count_open_files():
+    return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+
+
+def get_peak_memory_mb():
+    # Kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many lipsync jobs against the mock API and check retries, pooling and streaming.")
+    parser.add_argument("--jobs", type=int, default=16, help="Number of jobs to run.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of jobs running at the same time.")
+    parser.add_argument("--video_mb", type=int, default=64, help="Size of each result video in MB.")
+    parser.add_argument("--fail_first", type=int, default=3, help="Uploads answered with 503.")
+    parser.add_argument("--truncate_first", type=int, default=2, help="Downloads cut off halfway.")
+    parser.add_argument("--identical_jobs", type=int, default=8, help="Identical jobs sent at once through the lipsync cache.")
+    parser.add_argument("--face", type=str, default="avatars/beff.jpg", help="Face image to upload.")
+    parser.add_argument("--audio", type=str, default="audio/24.wav", help="Audio file to upload.")
+    args = parser.parse_args()
+
+    video_bytes = args.video_mb << 20
+    out_dir = tempfile.mkdtemp(prefix="stress_lipsync_")
+    errors = []
+    with MockLipSyncServer(video_bytes=video_bytes, fail_first=args.fail_first, truncate_first=args.truncate_first) as server:
+        client = LipSyncClient(server.api_url, pool_size=args.workers, backoff=0.05)
+        # One job first, so the descriptors of the session and the server threads are in the baseline.
+        client.generate(args.face, args.audio, os.path.join(out_dir, "warmup.mp4"), "sk-test")
+        open_files = count_open_files()
+        memory_mb = get_peak_memory_mb()
+        out_paths = [os.path.join(out_dir, f"job_{index}.mp4") for index in range(args.jobs)]
+        start = time.perf_counter()
+        generate_many(
+            [lambda out_path=out_path: client.generate(args.face, args.audio, out_path, "sk-test") for out_path in out_paths],
+            args.workers
+        )
+        elapsed = time.perf_counter() - start
+        client_stats = client.stats()
+        server_stats = server.stats()
+        memory_growth_mb = get_peak_memory_mb() - memory_mb
+
+        # Slow uploads, so the identical jobs overlap.
+        server.latency = 0.5
+        cache = LipSyncCache(os.path.join(out_dir, "cache"))
+        key = cache.make_key(args.face, args.audio)
+        uploads = server.stats()["uploads"]
+        cached_paths = []
+        for round_index in range(2):
+            cached_paths.append(generate_many([
+                lambda index=index: cache.get_or_generate(
+                    key, lambda: client.generate(args.face, args.audio, os.path.join(out_dir, f"identical_{round_index}_{index}.mp4"), "sk-test")
+                )
+                for index in range(args.identical_jobs)
+            ], args.identical_jobs))
+            round_uploads = server.stats()["uploads"] - uploads
+            uploads += round_uploads
+            if round_uploads != (1 if round_index == 0 else 0):
+                errors.append(f"{args.identical_jobs} identical jobs made {round_uploads} API calls in round {round_index + 1}")
+        client.close()
+
+    # Same content under another name, then different content.
+    audio_copy = shutil.copyfile(args.audio, os.path.join(out_dir, "copy.wav"))
+    if cache.make_key(args.face, audio_copy) != key:
+        errors.append("the same audio at another path gave another cache key")
+    with open(audio_copy, "ab") as f:
+        f.write(b"\0\0")
+    if cache.make_key(args.face, audio_copy) == key:
+        errors.append("two different audios gave the same cache key")
+    all_cached_paths = set(cached_paths[0] + cached_paths[1])
+    if len(all_cached_paths) != 1 or None in all_cached_paths:
+        errors.append(f"the identical jobs got {sorted(map(str, all_cached_paths))} instead of one cached video")
+    for out_path in out_paths:
+        if not os.path.exists(out_path):
+            errors.append(f"{out_path} was not downloaded")
+        elif os.path.getsize(out_path) != video_bytes:
+            errors.append(f"{out_path} has {os.path.getsize(out_path)} bytes, expected {video_bytes}")
+    leftovers = [name for name in os.listdir(out_dir) if name.endswith(".part")]
+    if leftovers:
+        errors.append(f"partial downloads left behind: {leftovers}")
+    expected_retries = min(args.fail_first, args.jobs + 1) + min(args.truncate_first, args.jobs + 1)
+    if client_stats["retries"] < expected_retries:
+        errors.append(f"{client_stats['retries']} retries, expected at least {expected_retries}")
+    # Every cut off download closes its connection, the others are reused.
+    max_connections = args.workers + args.truncate_first + 1
+    if server_stats["connections"] > max_connections:
+        errors.append(f"{server_stats['connections']} connections opened for {2 * (args.jobs + 1)} requests, expected at most {max_connections}")
+    if open_files is not None and count_open_files() > open_files:
+        errors.append(f"{count_open_files() - open_files} file descriptors leaked")
+    if memory_growth_mb > MEMORY_TOLERANCE_MB:
+        errors.append(f"peak memory grew by {memory_growth_mb:.0f} MB while downloading {args.video_mb} MB videos")
+
+    print(
+        f"Ran {args.jobs} jobs on {args.workers} workers in {elapsed:.2f} s: {client_stats['downloaded_bytes'] >> 20} MB downloaded, "
+        f"{client_stats['retries']} retries, {server_stats['connections']} connections, peak memory +{memory_growth_mb:.0f} MB."
+    )
+    print(f"LipSync cache: {cache.stats()}")
+    for error in errors:
+        print(f"FAIL: {error}")
+    shutil.rmtree(out_dir, ignore_errors=True)
+    if errors:
+        raise SystemExit(1)
+    print("All downloads were complete, retried and streamed, identical jobs made one API call.")
+
+
+if __name__ == "__main__":
+    main()
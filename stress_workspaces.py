@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import imageio_ffmpeg
+import fake_speechsdk
+from bench_viseme_timeline import synthetic_timeline
+from pcm_audio import PcmAudio
+
+# Nothing is synthesized, the stub keeps the synthesizer pool from connecting to Azure.
+fake_speechsdk.install()
+from viseme_generator import GenerateVideoAndAudio
+from workspace import JobWorkspace
+
+
+"""
+This script is a concurrency stress test for the per-job workspaces (`workspace.py`). It runs many replies at once through one shared `GenerateVideoAndAudio`, the way the TCP servers do, while another thread keeps calling `set_mode` on it. Azure is not called: each job writes a synthetic viseme timeline into its workspace and renders it with in-memory silence of its own length, then goes through `generateVideo` like a synthesized reply would.
+
+It then checks that:
+- every job kept the mode it was submitted with,
+- every job produced its own video inside its own workspace, and `regular-mode` videos are as long as that job's audio (a job that rendered or muxed another job's files would come out with the wrong length),
+- the intermediates (audio, visemes, temporary videos) were deleted and at most `--keep_jobs` finished workspaces are left.
+
+### How to Use:
+```bash
+python stress_workspaces.py --jobs 24 --workers 8
+```
+Exits with status 1 (keeping the workspaces for inspection) if any check fails.
+"""
+
+MODES = ["regular-mode", "jigar-mode"]
+# One frame plus the encoder padding of the audio track.
+DURATION_TOLERANCE_MS = 100
+
+
+def make_silence(duration_ms, sample_rate=16000):
+    return PcmAudio(b"\x00\x00" * int(sample_rate * duration_ms / 1000), sample_rate)
+
+
+def run_job(generator, args, index):
+    mode = MODES[index % len(MODES)]
+    # Lengths differ per job, so a job that picked up another job's files is detected by its duration.
+    seconds = 1 + index % 5 + random.random()
+    offsets, ids, audio_duration_ms = synthetic_timeline(seconds / 3600, seed=index)
+    workspace = JobWorkspace(args.work_dir, mode, keep_jobs=args.keep_jobs)
+    with workspace:
+        with open(workspace.visemes_file, "w") as f:
+            json.dump([{"offset": float(offset), "id": int(viseme_id)} for offset, viseme_id in zip(offsets, ids)], f)
+        generator.generateVideo(workspace, make_silence(audio_duration_ms), args)
+    return index, mode, audio_duration_ms, workspace
+
+
+def check_job(index, mode, audio_duration_ms, workspace):
+    errors = []
+    if workspace.mode != mode:
+        errors.append(f"job {index} ran in {workspace.mode} instead of {mode}")
+    for leftover in (workspace.visemes_file, os.path.join(workspace.out_dir, "audio.wav")):
+        if os.path.exists(leftover):
+            errors.append(f"job {index} left {leftover} behind")
+    if not os.path.isdir(workspace.dir):
+        # Pruned after newer jobs finished, only its mode can still be checked.
+        return errors
+    if workspace.final_path is None or not os.path.exists(workspace.final_path):
+        return errors + [f"job {index} has no video"]
+    if not os.path.abspath(workspace.final_path).startswith(os.path.abspath(workspace.dir) + os.sep):
+        errors.append(f"job {index} wrote its video outside its workspace: {workspace.final_path}")
+    if mode == "regular-mode":
+        _, seconds = imageio_ffmpeg.count_frames_and_secs(workspace.final_path)
+        if abs(seconds * 1000 - audio_duration_ms) > DURATION_TOLERANCE_MS:
+            errors.append(f"job {index} is {seconds * 1000:.0f} ms long, its audio is {audio_duration_ms:.0f} ms")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many jobs concurrently and check that their workspaces stay isolated.")
+    parser.add_argument("--jobs", type=int, default=24, help="Number of jobs to run.")
+    parser.add_argument("--workers", type=int, default=8, help="Number of jobs running at the same time.")
+    parser.add_argument("--keep_jobs", type=int, default=4, help="Number of finished workspaces kept.")
+    parser.add_argument("--render_mode", type=str, default="direct", choices=["direct", "vfr", "mp4v"], help="Writer used by the jobs.")
+    cli_args, _ = parser.parse_known_args()
+
+    generator = GenerateVideoAndAudio(None, "regular-mode")
+    args = generator.get_args()
+    args.render_mode = cli_args.render_mode
+    args.keep_jobs = cli_args.keep_jobs
+    args.work_dir = tempfile.mkdtemp(prefix="stress_workspaces_")
+
+    # Mode changes from other clients must not leak into jobs already submitted.
+    stop = threading.Event()
+
+    def flip_modes():
+        while not stop.is_set():
+            generator.set_mode(random.choice(MODES + ["beff-mode", "mickey-mode"]))
+            time.sleep(0.001)
+
+    flipper = threading.Thread(target=flip_modes)
+    flipper.start()
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=cli_args.workers) as executor:
+            results = list(executor.map(lambda index: run_job(generator, args, index), range(cli_args.jobs)))
+    finally:
+        stop.set()
+        flipper.join()
+    elapsed = time.perf_counter() - start
+
+    errors = []
+    for result in results:
+        errors.extend(check_job(*result))
+    final_paths = [result[3].final_path for result in results]
+    if len(set(final_paths)) != len(final_paths):
+        errors.append("several jobs reported the same video path")
+    remaining = os.listdir(args.work_dir)
+    if len(remaining) > cli_args.keep_jobs:
+        errors.append(f"{len(remaining)} workspaces left, expected at most {cli_args.keep_jobs}")
+
+    print(f"Ran {cli_args.jobs} jobs on {cli_args.workers} workers in {elapsed:.2f} s, {len(remaining)} workspaces kept in {args.work_dir}.")
+    for error in errors:
+        print(f"FAIL: {error}")
+    if errors:
+        raise SystemExit(1)
+    print("All workspaces stayed isolated.")
+    shutil.rmtree(args.work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
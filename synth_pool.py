@@ -0,0 +1,194 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+"""
+This module keeps pre-built, pre-connected Azure `SpeechSynthesizer` instances per voice, so a reply no longer pays for building a synthesizer and for the connection setup (DNS, TCP, TLS and websocket handshake) before Azure sends its first byte.
+
+### Key Components:
+
+1. **`PooledSynthesizer` Class**:
+   - One synthesizer (created with `audio_config=None`, the audio stays in memory) and its `Connection`, opened ahead of time with `connection.open(True)`.
+   - Tracks the connection state through the `connected` / `disconnected` events, and is marked failed when a synthesis using it was cancelled with an error.
+
+2. **`SynthesizerPool` Class**:
+   - `warm(voices)` builds and connects `size` synthesizers for each voice.
+   - `acquire(voice)` is a context manager that lends an idle synthesizer to one request at a time. Before it is handed out it is health checked: a failed one is rebuilt, a disconnected one is reconnected. If every synthesizer of the voice is busy, an extra one is built and kept if there is room (`max_idle`).
+   - Event handlers a request connected (`viseme_received`, ...) are disconnected when the synthesizer is returned. A request that fails calls `mark_failed()` on it, so it is closed and a replacement is built in the background instead of reusing it.
+   - A keep-warm thread reconnects idle synthesizers whose connection was dropped (Azure closes idle connections) and rebuilds the ones that fail to reconnect, every `keep_warm_interval` seconds.
+   - `stats()` reports how many synthesizers were built, rebuilt, reconnected and lent.
+
+3. **`get_synthesizer_pool(speech_config, ...)`**:
+   - Returns the process-wide pool.
+
+The voice itself is selected by the SSML of each request, the pool is keyed by voice so every voice has its own warm synthesizers. The SDK module is passed in (`sdk`), so the pool also runs against `fake_speechsdk` offline.
+"""
+
+DEFAULT_POOL_SIZE = 1
+DEFAULT_MAX_IDLE = 4
+DEFAULT_KEEP_WARM_INTERVAL = 60
+
+
+class PooledSynthesizer:
+    def __init__(self, sdk, speech_config, voice):
+        self.voice = voice
+        self.synthesizer = sdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self.connection = sdk.Connection.from_speech_synthesizer(self.synthesizer)
+        self.connected = False
+        self.failed = False
+        self.connection.connected.connect(self.on_connected)
+        self.connection.disconnected.connect(self.on_disconnected)
+
+    def on_connected(self, event):
+        self.connected = True
+
+    def on_disconnected(self, event):
+        self.connected = False
+
+    def open(self):
+        try:
+            self.connection.open(True)
+            self.connected = True
+        except Exception as e:
+            print(f"Could not connect synthesizer for {self.voice}: {e}")
+            self.failed = True
+        return not self.failed
+
+    def mark_failed(self):
+        self.failed = True
+
+    def reset(self):
+        # Handlers belong to the request that connected them.
+        for signal in (self.synthesizer.viseme_received, self.synthesizer.synthesizing, self.synthesizer.synthesis_started,
+                       self.synthesizer.synthesis_completed, self.synthesizer.synthesis_canceled):
+            signal.disconnect_all()
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class SynthesizerPool:
+    def __init__(self, speech_config, sdk=None, size=DEFAULT_POOL_SIZE, max_idle=DEFAULT_MAX_IDLE,
+                 keep_warm_interval=DEFAULT_KEEP_WARM_INTERVAL):
+        if sdk is None:
+            import azure.cognitiveservices.speech as sdk
+        self.sdk = sdk
+        self.speech_config = speech_config
+        self.size = size
+        self.max_idle = max(max_idle, size)
+        self.keep_warm_interval = keep_warm_interval
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.counters = {"built": 0, "rebuilt": 0, "reconnected": 0, "acquired": 0, "built_on_demand": 0}
+        self.stopped = threading.Event()
+        if keep_warm_interval:
+            threading.Thread(target=self.keep_warm, daemon=True).start()
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def build(self, voice):
+        entry = PooledSynthesizer(self.sdk, self.speech_config, voice)
+        entry.open()
+        self.count("built")
+        return entry
+
+    def warm(self, voices):
+        for voice in voices:
+            with self.lock:
+                missing = self.size - len(self.idle.setdefault(voice, deque()))
+            for _ in range(missing):
+                entry = self.build(voice)
+                self.release(entry)
+        print(f"Synthesizer pool warmed for {', '.join(voices)}.")
+
+    def check(self, entry):
+        # Returns a healthy synthesizer: failed ones are replaced, dropped connections are reopened.
+        if not entry.failed and not entry.connected:
+            if entry.open():
+                self.count("reconnected")
+        if entry.failed:
+            entry.close()
+            entry = self.build(entry.voice)
+            self.count("rebuilt")
+        return entry
+
+    @contextmanager
+    def acquire(self, voice):
+        with self.lock:
+            idle = self.idle.setdefault(voice, deque())
+            entry = idle.popleft() if idle else None
+            self.counters["acquired"] += 1
+        if entry is None:
+            self.count("built_on_demand")
+            entry = self.build(voice)
+        else:
+            entry = self.check(entry)
+        try:
+            yield entry
+        except Exception:
+            entry.mark_failed()
+            raise
+        finally:
+            entry.reset()
+            self.release(entry)
+
+    def release(self, entry):
+        if entry.failed:
+            # The replacement connects in the background, so the next request still finds a warm synthesizer.
+            entry.close()
+            threading.Thread(target=self.replace, args=(entry.voice,), daemon=True).start()
+            return
+        with self.lock:
+            idle = self.idle.setdefault(entry.voice, deque())
+            if len(idle) < self.max_idle:
+                idle.append(entry)
+                return
+        entry.close()
+
+    def replace(self, voice):
+        entry = self.build(voice)
+        self.count("rebuilt")
+        self.release(entry)
+
+    def keep_warm(self):
+        while not self.stopped.wait(self.keep_warm_interval):
+            # Idle synthesizers are taken out while they are checked, so no request gets one mid-reconnect.
+            with self.lock:
+                entries = [entry for idle in self.idle.values() for entry in idle]
+                for idle in self.idle.values():
+                    idle.clear()
+            for entry in entries:
+                self.release(self.check(entry))
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["idle"] = {voice: len(idle) for voice, idle in self.idle.items()}
+        return stats
+
+    def close(self):
+        self.stopped.set()
+        with self.lock:
+            entries = [entry for idle in self.idle.values() for entry in idle]
+            self.idle = {}
+        for entry in entries:
+            entry.close()
+
+
+synthesizer_pool = None
+synthesizer_pool_lock = threading.Lock()
+
+
+def get_synthesizer_pool(speech_config, sdk=None, size=DEFAULT_POOL_SIZE, max_idle=DEFAULT_MAX_IDLE,
+                         keep_warm_interval=DEFAULT_KEEP_WARM_INTERVAL):
+    global synthesizer_pool
+    with synthesizer_pool_lock:
+        if synthesizer_pool is None:
+            synthesizer_pool = SynthesizerPool(speech_config, sdk, size, max_idle, keep_warm_interval)
+        return synthesizer_pool
@@ -0,0 +1,147 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import numpy as np
+
+
+"""
+This module stores viseme timelines in a compact columnar binary file (`.vtl`) instead of the indented JSON written by `GenerateVideoAndAudio`, one dict per event. A `.vtl` file is a fixed header followed by two arrays, so it is about a tenth of the size of the JSON and loads without parsing: the arrays are NumPy views on a memory map of the file, nothing is copied.
+
+### File Layout (little-endian):
+
+- Header: magic `VTL1`, format version (uint16), voice length in bytes (uint16), number of visemes (uint32), audio length in ms (float64, NaN when unknown), then the voice name (UTF-8), zero-padded to a multiple of 8 bytes.
+- `offsets`: float32 per viseme, milliseconds from the start of the audio.
+- `ids`: uint8 per viseme, the Azure viseme id (0 to 21).
+
+### Key Components:
+
+1. **`VisemeTimeline` Class**:
+   - The `offsets` (float64 when read from JSON, float32 from `.vtl`) and `ids` arrays of one utterance, with its audio length and voice when known. `viseme_timeline.build_frame_plan_from_visemes` and `VideoMaker.render_visemes` accept it wherever they accept the list of `{"offset", "id"}` dicts.
+   - `from_visemes(data)` / `to_visemes()` convert from and to that list.
+
+2. **`read_timeline(path)` / `write_timeline(path, timeline)`**:
+   - Memory-mapped reading and writing of the binary format.
+
+3. **`load_timeline(path)` / `save_timeline(path, timeline)`**:
+   - Read or write either format, chosen by the file extension (`.json` or `.vtl`).
+
+### How to Use:
+```bash
+python timeline_file.py metadata/*.json --audio_dir audio --voice en-US-BrianNeural
+python timeline_file.py metadata/*.vtl --to json
+```
+Converts each file next to itself (or into `--out_dir`). The audio length of `<name>.json` is read from `<name>.wav` in `--audio_dir` when it exists.
+"""
+
+MAGIC = b"VTL1"
+VERSION = 1
+HEADER = struct.Struct("<4sHHId")
+BINARY_EXTENSION = ".vtl"
+JSON_EXTENSION = ".json"
+TIMELINE_EXTENSIONS = (JSON_EXTENSION, BINARY_EXTENSION)
+OFFSET_DTYPE = np.dtype("<f4")
+# JSON offsets keep their full precision, they are only narrowed when written to a .vtl file.
+JSON_OFFSET_DTYPE = np.dtype(np.float64)
+ID_DTYPE = np.dtype("u1")
+
+
+class VisemeTimeline:
+    def __init__(self, offsets, ids, audio_duration_ms=None, voice=None):
+        self.offsets = offsets
+        self.ids = ids
+        self.audio_duration_ms = audio_duration_ms
+        self.voice = voice
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_visemes(cls, data, audio_duration_ms=None, voice=None):
+        offsets = np.fromiter((chunk["offset"] for chunk in data), dtype=JSON_OFFSET_DTYPE, count=len(data))
+        ids = np.fromiter((chunk["id"] for chunk in data), dtype=ID_DTYPE, count=len(data))
+        return cls(offsets, ids, audio_duration_ms, voice)
+
+    def to_visemes(self):
+        return [{"offset": offset, "id": viseme_id} for offset, viseme_id in zip(self.offsets.tolist(), self.ids.tolist())]
+
+
+def padded(size):
+    return (size + 7) & ~7
+
+
+def read_timeline(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise ValueError(f"{path} is not a viseme timeline file.")
+        # The map outlives the file object, the arrays below keep it open.
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, voice_size, count, audio_duration_ms = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} viseme timeline file.")
+    voice = bytes(buffer[HEADER.size:HEADER.size + voice_size]).decode("utf-8") if voice_size else None
+    offsets_start = padded(HEADER.size + voice_size)
+    offsets = np.frombuffer(buffer, dtype=OFFSET_DTYPE, count=count, offset=offsets_start)
+    ids = np.frombuffer(buffer, dtype=ID_DTYPE, count=count, offset=offsets_start + count * OFFSET_DTYPE.itemsize)
+    return VisemeTimeline(offsets, ids, None if np.isnan(audio_duration_ms) else audio_duration_ms, voice)
+
+
+def write_timeline(path, timeline):
+    voice = (timeline.voice or "").encode("utf-8")
+    audio_duration_ms = np.nan if timeline.audio_duration_ms is None else timeline.audio_duration_ms
+    header = HEADER.pack(MAGIC, VERSION, len(voice), len(timeline), audio_duration_ms) + voice
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(header.ljust(padded(len(header)), b"\0"))
+        f.write(np.asarray(timeline.offsets, dtype=OFFSET_DTYPE).tobytes())
+        f.write(np.asarray(timeline.ids, dtype=ID_DTYPE).tobytes())
+    return path
+
+
+def load_timeline(path):
+    if path.endswith(BINARY_EXTENSION):
+        return read_timeline(path)
+    with open(path, "r") as f:
+        return VisemeTimeline.from_visemes(json.load(f))
+
+
+def save_timeline(path, timeline):
+    if path.endswith(BINARY_EXTENSION):
+        return write_timeline(path, timeline)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(timeline.to_visemes(), f, indent=4)
+    return path
+
+
+def main():
+    from viseme_timeline import get_audio_duration_ms
+
+    parser = argparse.ArgumentParser(description="Convert viseme timelines between JSON and the binary .vtl format.")
+    parser.add_argument("inputs", type=str, nargs="+", help="Timeline files (.json or .vtl).")
+    parser.add_argument("--to", type=str, default="vtl", choices=["vtl", "json"], help="Format to write.")
+    parser.add_argument("--out_dir", type=str, default=None, help="Directory to write to (default: next to each input).")
+    parser.add_argument("--audio_dir", type=str, default=None, help="Directory with the <name>.wav of each timeline.")
+    parser.add_argument("--voice", type=str, default=None, help="Voice to record in timelines that have none.")
+    args = parser.parse_args()
+
+    in_bytes = 0
+    out_bytes = 0
+    for in_path in args.inputs:
+        name = os.path.splitext(os.path.basename(in_path))[0]
+        timeline = load_timeline(in_path)
+        timeline.voice = timeline.voice or args.voice
+        audio_path = os.path.join(args.audio_dir, f"{name}.wav") if args.audio_dir is not None else None
+        if timeline.audio_duration_ms is None and audio_path is not None and os.path.exists(audio_path):
+            timeline.audio_duration_ms = get_audio_duration_ms(audio_path)
+        out_path = os.path.join(args.out_dir or os.path.dirname(in_path), f"{name}.{args.to}")
+        save_timeline(out_path, timeline)
+        in_bytes += os.path.getsize(in_path)
+        out_bytes += os.path.getsize(out_path)
+        print(f"Converted {in_path} ({len(timeline)} visemes) to {out_path}.")
+    print(f"Converted {len(args.inputs)} timelines, {in_bytes} bytes to {out_bytes} bytes.")
+
+
+if __name__ == "__main__":
+    main()
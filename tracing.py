@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+"""
+This module records where the time of every request goes and keeps process-wide metrics that can be read while the server runs.
+
+### Key Components:
+
+1. **`Trace` Class**:
+   - One per job (`trace = Trace(job_id)`). `with trace.span("render"):` times a stage, `trace.mark("tts_first_viseme")` records how long after the start of the job something happened.
+   - Every span and mark is also observed by `metrics`, so the per-stage latency histograms fill up without any extra calls.
+   - `summary()` returns one line with every stage of the job, printed when the job ends.
+
+2. **`Metrics` Class**:
+   - Latency histograms per stage (`observe(stage, seconds)`), counters (`increment(name)`, e.g. cache hits, busy rejections) and gauges (`set_gauge(name, value)` / `adjust_gauge(name, amount)`, e.g. the job queue depth).
+   - `snapshot()` returns everything as a dict (count, mean, p50, p95 and max per stage, from the last `RECENT_SAMPLES` samples), `to_prometheus()` as Prometheus text exposition.
+   - `metrics` is the process-wide instance, read by the `stats` command of the TCP servers (`async_server.py`).
+
+### Stages:
+
+`queue_wait` (time in the job queue of the server), `parse`, `tts_first_viseme` (mark), `tts_complete` (mark), `timeline`, `render` (frames written to the encoder), `encode` (waiting for the encoder to finish), `mux`, `handoff` (mark, the video reached the player) and `total`.
+"""
+
+METRIC_PREFIX = "avatar"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RECENT_SAMPLES = 1024
+
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[index] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def percentile(self, fraction):
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_s": self.sum / self.count if self.count else 0.0,
+            "p50_s": self.percentile(0.5),
+            "p95_s": self.percentile(0.95),
+            "max_s": self.max,
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.histograms.setdefault(stage, Histogram()).observe(seconds)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def adjust_gauge(self, name, amount):
+        with self.lock:
+            self.gauges[name] = self.gauges.get(name, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "stages": {stage: histogram.snapshot() for stage, histogram in self.histograms.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            name = f"{METRIC_PREFIX}_stage_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+            for counter, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{counter}_total counter")
+                lines.append(f"{METRIC_PREFIX}_{counter}_total {value}")
+            for gauge, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{gauge} gauge")
+                lines.append(f"{METRIC_PREFIX}_{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class Trace:
+    def __init__(self, job_id=None, registry=None):
+        self.job_id = job_id
+        self.metrics = registry or metrics
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        # A stage recorded again in the same job adds up in its summary.
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.metrics.observe(stage, seconds)
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def mark(self, stage):
+        # Only the first time a mark is reached counts, e.g. the first of many visemes.
+        seconds = time.perf_counter() - self.start
+        with self.lock:
+            if stage in self.stages:
+                return
+            self.stages[stage] = seconds
+        self.metrics.observe(stage, seconds)
+
+    def finish(self):
+        self.record("total", time.perf_counter() - self.start)
+
+    def summary(self):
+        with self.lock:
+            stages = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in self.stages.items())
+        return f"Job {self.job_id}: {stages}"
@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+import cv2
+
+
+"""
+This module keeps short transition sequences between viseme frames, so the mouth moves smoothly from one shape to the next instead of jumping, without blending anything while a reply is rendered.
+
+### Key Components:
+
+1. **`TransitionCache` Class**:
+   - `get(set_key, from_id, to_id, frames, get_frame)` returns the `frames` in-between frames from one viseme to another: eased cross-fades of the two frames returned by `get_frame(id)`, at the size and orientation of the frame set `set_key` (e.g. an image set, or a composited avatar).
+   - Sequences are built the first time a pair is needed and kept in an LRU ordered dictionary bounded by a byte budget, so a long-running server ends up with the pairs that actually occur in speech. The stored frames are read-only, they are shared by every request.
+   - `stats()` reports hits, misses and the memory used.
+
+2. **`transition_cache`**:
+   - The process-wide cache used by `VideoMaker` when `transition_ms` is set.
+"""
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def ease(fraction):
+    # Smoothstep: the mouth starts and ends its movement slowly.
+    return fraction * fraction * (3 - 2 * fraction)
+
+
+class TransitionCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.sequences = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def build(self, start, end, frames):
+        steps = []
+        for step in range(1, frames + 1):
+            weight = ease(step / (frames + 1))
+            frame = cv2.addWeighted(start, 1 - weight, end, weight, 0)
+            frame.flags.writeable = False
+            steps.append(frame)
+        return tuple(steps)
+
+    def get(self, set_key, from_id, to_id, frames, get_frame):
+        key = (set_key, int(from_id), int(to_id), frames)
+        with self.lock:
+            steps = self.sequences.get(key)
+            if steps is not None:
+                self.sequences.move_to_end(key)
+                self.hits += 1
+                return steps
+            self.misses += 1
+        # Two requests may build the same pair at once, the result is identical and only one copy is stored.
+        steps = self.build(get_frame(from_id), get_frame(to_id), frames)
+        with self.lock:
+            if key not in self.sequences:
+                self.store(key, steps)
+        return steps
+
+    def store(self, key, steps):
+        self.sequences[key] = steps
+        self.nbytes += sum(step.nbytes for step in steps)
+        while self.nbytes > self.max_bytes and len(self.sequences) > 1:
+            _, old_steps = self.sequences.popitem(last=False)
+            self.nbytes -= sum(step.nbytes for step in old_steps)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "sequences": len(self.sequences), "bytes": self.nbytes}
+
+    def clear(self):
+        with self.lock:
+            self.sequences.clear()
+            self.nbytes = 0
+
+
+transition_cache = TransitionCache()
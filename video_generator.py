@@ -1,13 +1,23 @@
 import sys
 import os
+import time
 import json
+import shutil
 import cv2
 from moviepy.editor import VideoFileClip, AudioFileClip
 import argparse
-import numpy as np
+import logging
 from lipsync_jeff import LipSync
 from play_video import VideoPlayer
 from PyQt5 import QtWidgets
+from frame_atlas import frame_atlas
+from ffmpeg_writer import FfmpegWriter, VfrWriter, mux_audio
+from pcm_audio import PcmAudio
+from viseme_timeline import StreamingTimeline, build_frame_plan_from_visemes, get_audio_duration_ms
+from tracing import Trace
+from avatar_compositor import AVATAR_MODES, get_compositor
+from transition_cache import transition_cache
+from timeline_file import TIMELINE_EXTENSIONS, load_timeline
 
 duration = 95
 fps = 60
@@ -26,26 +36,42 @@ This script generates a lip-sync video by combining viseme images (mouth shapes)
 2. **LipSync Mode**:
    - The script allows for different "modes" such as "beff-mode" and "Hulk-mode", which use the `LipSync` class to generate a video with different characteristics.
    - Depending on the mode selected, the script can either use predefined lip-sync behavior or generate a regular video using the provided viseme metadata and images.
+   - The local avatar modes (`"beff-local-mode"`, `"hulk-local-mode"`) render like the regular mode, but every frame is the avatar photo with the viseme blended into its mouth (`avatar_compositor.py`), without the remote lipsync round trip.
 
 3. **Audio and Video Synchronization**:
-   - After the video is generated from viseme images, the script uses `moviepy` to merge the corresponding audio.
+   - In the default `direct` render mode, frames and audio are piped into a single `ffmpeg` process (`ffmpeg_writer.FfmpegWriter`) that writes the final audio/video file in one pass.
+   - The `hls` render mode does the same but writes short, independently decodable segments and a playlist that grows as they finish. `segment_callback(playlist)` is called once the first segment is ready, so the player can start before rendering is done.
+   - The `vfr` render mode does what `direct` does with a variable frame rate (`ffmpeg_writer.VfrWriter`): each run of identical frames is encoded as a single frame that lasts as long as the run, so encoding costs a frame per viseme instead of one per 1/fps.
+   - In the legacy `mp4v` render mode, the video is first written with OpenCV and the script then uses `moviepy` to merge the corresponding audio.
    - If the audio is longer than the video, it is clipped to match the video duration, ensuring synchronization between the audio and video.
 
 ### Key Functions in the `VideoMaker` Class:
 
 1. **`__init__(self, images_dir, visemes_dir, audio_dir, out_dir, fps, map_file, callback, mode)`**:
    - Initializes the class with directories for viseme images, metadata, audio files, output video, and other configurations such as FPS (frames per second) and mode.
+   - `size` (width, height) renders at another size than the viseme images, `codec` picks the ffmpeg video encoder. The image size of a directory is read once per process.
+   - `lipsync_cache` (a `lipsync_cache.LipSyncCache`) lets the LipSync modes reuse videos of a face and audio that were lip-synced before. These modes upload the reply's audio passed to `generate_video` (in-memory audio is written to `out_dir` first).
+   - Every file the class writes (including the LipSync modes and the moviepy temporary) goes to `out_dir`, which is the job's workspace (`workspace.JobWorkspace`) when called from `GenerateVideoAndAudio`.
 
-2. **`generate_video(self, in_file)`**:
-   - Generates a video from viseme images and metadata stored in JSON files.
-   - It reads viseme timings from the JSON file and creates the video by displaying the corresponding viseme images for each time interval.
+2. **`generate_video(self, in_file, audio=None)`**:
+   - Generates a video from viseme images and metadata stored in JSON files or in the binary `.vtl` format (`timeline_file.py`).
+   - It reads viseme timings from the file, turns them into a drift-free run-length frame plan (`viseme_timeline.build_frame_plan`) and writes each viseme image for its number of frames. When audio is given (a WAV path or in-memory PCM straight from Azure), its length sets the duration of the last viseme, otherwise the audio length stored in a `.vtl` file does.
 
-3. **`add_audio(self, audio_file, video_file)`**:
-   - Adds an audio track to the generated video using `moviepy`.
+3. **`add_audio(self, audio, video_file, video_out_path=None)`**:
+   - Adds an audio track to the generated video using `moviepy`, written to `video_out_path` or next to the video. In-memory audio (`pcm_audio.PcmAudio`) is written to a WAV file in `out_dir` first, since moviepy only reads files.
    - The audio is synchronized with the video, and the script clips either the audio or video to ensure they match in duration.
 
 4. **`make_frame(self, id)`**:
-   - Loads and processes the viseme image corresponding to the given ID. This image is resized and rotated before being added to the video.
+   - Returns the viseme image corresponding to the given ID from the shared `frame_atlas`, which decodes, rotates and resizes each image set only once per process.
+
+5. **`write_run(self, output, previous_id, id, count)`**:
+   - Writes the `count` frames of one viseme. With `transition_ms`, the first frames of a viseme that follows another one are a short cross-fade from the previous mouth shape, taken from the shared `transition_cache`, so smooth transitions cost a lookup and a write per frame. The number of frames, and so the timing, does not change.
+
+The time spent building the timeline, writing frames, waiting for the encoder and muxing is recorded on the job's `tracing.Trace` (`trace`). Per-frame and per-viseme messages are logged at debug level (`logger`), so they cost nothing in the render loop unless debug logging is enabled.
+
+### Batch Rendering:
+
+`python video_generator.py` renders every `<name>.json` (or binary `<name>.vtl`) timeline in `--metadata_dir` with its own `<name>.wav` from `--audio_dir`, in a pool of `--workers` processes (`render_pool.py`), printing progress as videos finish. Every video (or HLS directory) is rendered under a `.part` name and renamed once complete, and removed if its render fails. Videos newer than their timeline and audio are skipped unless `--force` is given, so an interrupted overnight batch picks up where it stopped.
 
 ### How to Use:
 
@@ -55,25 +81,60 @@ This script generates a lip-sync video by combining viseme images (mouth shapes)
    pip install opencv-python moviepy numpy PyQt5
 """
 
+logger = logging.getLogger(__name__)
+
+# Modes rendered frame by frame from viseme images, the other modes use LipSync.
+RENDERED_MODES = ["regular-mode"] + list(AVATAR_MODES)
+# Modes whose video comes from the remote lipsync API, they upload the reply's audio.
+LIPSYNC_MODES = ["beff-mode", "Hulk-mode"]
+
+# (image directory, its modification time) -> (height, width) of its images.
+image_dims = {}
+
+
 class VideoMaker:
-    def __init__(self, images_dir, visemes_dir, audio_dir, out_dir, fps, map_file, callback, mode):
+    def __init__(self, images_dir, visemes_dir, audio_dir, out_dir, fps, map_file, callback, mode, render_mode="direct", segment_callback=None, segment_time=1, trace=None, transition_ms=0, size=None, codec="libx264", lipsync_cache=None):
         self.fourcc = cv2.VideoWriter_fourcc(*"mp4v")
         self.height, self.width = self.get_im_dims(images_dir)
         self.im_dir = images_dir
         self.metadata_dir = visemes_dir
         self.audio_dir = audio_dir
         self.out_dir = out_dir
-        self.fps = 60
+        self.fps = fps
         self.duration = 0
         self.callback = callback
         self.mode = mode
+        self.rotation = cv2.ROTATE_90_COUNTERCLOCKWISE
+        self.render_mode = render_mode
+        self.segment_callback = segment_callback
+        self.segment_time = segment_time
+        self.final_path = None
+        self.trace = trace or Trace()
+        self.transition_ms = transition_ms
+        self.codec = codec
+        self.lipsync_cache = lipsync_cache
+        if size is not None:
+            self.width, self.height = size
+        self.compositor = None
+        if mode in AVATAR_MODES:
+            # Frames are the avatar photo, in its own orientation and aspect ratio. A size only limits its height.
+            self.compositor = get_compositor(mode, images_dir) if size is None else get_compositor(mode, images_dir, size[1])
+            self.width, self.height = self.compositor.size
         print("Init VideoMaker")
 
     def load_json(self, file):
         with open(file, "r") as opened_file:
             return json.load(opened_file)
 
-    def get_im_dims(self, im_dir):  # should first check the file is an image
+    def get_im_dims(self, im_dir):
+        key = (os.path.abspath(im_dir), os.path.getmtime(im_dir))
+        dims = image_dims.get(key)
+        if dims is None:
+            dims = self.read_im_dims(im_dir)
+            image_dims[key] = dims
+        return dims
+
+    def read_im_dims(self, im_dir):  # should first check the file is an image
         for image in os.listdir(im_dir):
             try:
                 frame = cv2.imread(os.path.join(im_dir, image))
@@ -83,56 +144,191 @@ class VideoMaker:
                 print(f"Error: {e}")
                 continue
 
-    def get_out(self, out_path):
+    def get_out(self, out_path, audio=None):
+        if self.render_mode == "hls" and out_path.endswith(".m3u8"):
+            return FfmpegWriter(
+                out_path, self.fps, (self.width, self.height), audio, codec=self.codec,
+                segment_time=self.segment_time, on_first_segment=self.segment_callback
+            )
+        if self.render_mode == "vfr":
+            return VfrWriter(out_path, self.fps, (self.width, self.height), audio, codec=self.codec)
+        if self.render_mode in ("direct", "hls"):
+            return FfmpegWriter(out_path, self.fps, (self.width, self.height), audio, codec=self.codec)
         return cv2.VideoWriter(out_path, self.fourcc, self.fps, (self.width, self.height))
 
+    def get_final_path(self, video_file):
+        return os.path.join(self.out_dir, f'2{os.path.basename(self.im_dir)}_with_audio_{os.path.basename(video_file)}')
+
+    def get_playlist_path(self, video_file):
+        # Segments of the previous reply must not be picked up by the player.
+        segment_dir = os.path.splitext(self.get_final_path(video_file))[0]
+        shutil.rmtree(segment_dir, ignore_errors=True)
+        os.makedirs(segment_dir)
+        return os.path.join(segment_dir, "playlist.m3u8")
+
     def read_chunk_data(self, chunk):
         return chunk["id"], chunk["offset"]
 
     def make_frame(self, id):
-        print(f"Generating frame for viseme id {id}.")
-        frame = cv2.imread(os.path.join(self.im_dir, f"viseme-id-{id}.jpg"))
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        return cv2.resize(frame, (self.width, self.height))
-
-    def frame_to_video(self, output, frame, dur):
-        for i in range(int(np.round(dur / 1000 * self.fps, 0))):
+        logger.debug("Generating frame for viseme id %s.", id)
+        if self.compositor is not None:
+            return self.compositor.get_frame(id)
+        # Frames come pre-decoded, rotated and resized from the shared atlas.
+        return frame_atlas.get_frame(self.im_dir, id, self.rotation, (self.width, self.height))
+
+    def frame_to_video(self, output, frame, count):
+        for i in range(count):
             output.write(frame)
 
-    def generate_video(self, in_file):
+    def get_frame_set_key(self):
+        if self.compositor is not None:
+            return self.mode, os.path.abspath(self.im_dir), self.compositor.size
+        return frame_atlas.make_key(self.im_dir, self.rotation, (self.width, self.height))
+
+    def write_run(self, output, previous_id, id, count):
+        transition_frames = int(round(self.transition_ms * self.fps / 1000))
+        if transition_frames > 0 and previous_id is not None and previous_id != id and count > 1:
+            steps = transition_cache.get(self.get_frame_set_key(), previous_id, id, transition_frames, self.make_frame)
+            # A short viseme keeps at least one frame of its own shape.
+            steps = steps[:count - 1]
+            for step in steps:
+                output.write(step)
+            count -= len(steps)
+        self.frame_to_video(output, self.make_frame(id), count)
+
+    def render_visemes(self, data, out_path, audio=None, mux_audio=False):
+        # The audio length (if known) sets the duration of the last viseme.
+        audio_duration = get_audio_duration_ms(audio) if audio is not None else getattr(data, "audio_duration_ms", None)
+        print(f"Generating video from {out_path}.")
+        with self.trace.span("timeline"):
+            plan = build_frame_plan_from_visemes(data, self.fps, audio_duration)
+        with self.trace.span("render"):
+            output = self.get_out(out_path, audio if mux_audio else None)
+            previous = None
+            for mapped, count in plan:
+                logger.debug("Viseme id %s is shown for %s frames.", mapped, count)
+                self.write_run(output, previous, mapped, count)
+                previous = mapped
+        viseme_dur = plan.duration_ms
+        # The encoder works while frames are written, what is left is flushing it (and the muxing of the direct mode).
+        with self.trace.span("encode"):
+            output.release()
+        print(f"Generated video of {viseme_dur} milliseconds from viseme images.")
+        return viseme_dur
+
+    def get_lipsync(self, person, audio):
+        # The reply's audio is uploaded (and hashed by the lipsync cache), audio/24.wav only without one.
+        audio_path = self.get_audio_path(audio) if audio is not None else "audio/24.wav"
+        return LipSync(person, self.out_dir, audio_path, cache=self.lipsync_cache)
+
+    def generate_video(self, in_file, audio=None):
         if(self.mode == "beff-mode"):
             print("\n Beff Mode \n")
-            lipSync = LipSync("beff")
-            lipSync.generateVideo()
+            lipSync = self.get_lipsync("beff", audio)
+            with self.trace.span("render"):
+                lipSync.generateVideo()
+            self.final_path = lipSync.out_path
             return
         elif(self.mode == "Hulk-mode"):
             print("\n Hulk Mode \n")
-            lipSync = LipSync("hulk")
-            lipSync.generateVideo()
+            lipSync = self.get_lipsync("hulk", audio)
+            with self.trace.span("render"):
+                lipSync.generateVideo()
+            self.final_path = lipSync.out_path
             return
 
         in_path = os.path.join(self.metadata_dir, in_file)
-        self.out_path = os.path.join(self.out_dir, f'{in_file.strip(".json")}_{self.fps}.mp4')
-        print(f"Generating video from {self.out_path}.")
-        output = self.get_out(self.out_path)
-        data = self.load_json("metadata/text_to_viseme.json")
-        print(len(data))
-
-        total_time = 0
-        viseme_dur = 0
-        for chunk in data:
-            mapped, dur = self.read_chunk_data(chunk)
-            dur = dur - total_time
-            print(f"Viseme id {mapped} has duration {dur} milliseconds.")
-            total_time += dur
-            frame = self.make_frame(mapped)
-            self.frame_to_video(output, frame, dur)
-            viseme_dur += dur
-        output.release()
+        self.out_path = os.path.join(self.out_dir, f'{os.path.splitext(in_file)[0]}_{self.fps}.mp4')
+        mux_audio = self.render_mode in ("direct", "hls", "vfr") and audio is not None
+        if mux_audio and self.render_mode == "hls":
+            # Segments are playable as soon as they are listed in the playlist.
+            self.out_path = self.get_playlist_path(self.out_path)
+        elif mux_audio:
+            # Frames and audio go through a single encoder pass straight into the final file.
+            self.out_path = self.get_final_path(self.out_path)
+        data = load_timeline(in_path)
+        logger.debug("Loaded %s visemes from %s.", len(data), in_path)
+        self.duration = self.render_visemes(data, self.out_path, audio, mux_audio)
         cv2.destroyAllWindows()
-        print(f"Generated video of {viseme_dur} milliseconds from viseme images.")
+        self.final_path = self.out_path
+        if mux_audio:
+            print(f"Video successfully saved to {self.out_path}.")
+            if self.callback is not None:
+                self.callback()
+
+    def generate_video_stream(self, viseme_queue, audio=None, in_file="text_to_viseme.json"):
+        # Consumes {"offset", "id"} chunks while Azure is still synthesizing. The producer ends the
+        # stream with {"end": audio_duration_ms} once the audio is complete, or None to cancel it.
+        # In-memory audio is only known at that point, so the end chunk may carry it as "audio".
+        self.out_path = os.path.join(self.out_dir, f'{os.path.splitext(in_file)[0]}_{self.fps}.mp4')
+        print(f"Streaming video to {self.out_path}.")
+        output = self.get_out(self.out_path)
+        timeline = StreamingTimeline(self.fps)
+        # Most of the loop waits for Azure, only the time spent on frames counts as rendering.
+        render_seconds = 0.0
+        previous = None
+        try:
+            while True:
+                chunk = viseme_queue.get()
+                if chunk is None:
+                    output.release()
+                    print("Streaming render cancelled.")
+                    return
+                if "end" in chunk:
+                    audio = chunk.get("audio", audio)
+                    runs = timeline.finish(chunk["end"])
+                else:
+                    mapped, offset = self.read_chunk_data(chunk)
+                    runs = timeline.push(offset, mapped)
+                start = time.perf_counter()
+                for mapped, count in runs:
+                    logger.debug("Viseme id %s is shown for %s frames.", mapped, count)
+                    self.write_run(output, previous, mapped, count)
+                    previous = mapped
+                render_seconds += time.perf_counter() - start
+                if "end" in chunk:
+                    break
+        except Exception:
+            # Stop the encoder of a failed render, the caller reports the original error.
+            try:
+                output.release()
+            except Exception as e:
+                logger.debug("Releasing the writer of a failed render: %s", e)
+            raise
+        self.trace.record("render", render_seconds)
+        with self.trace.span("encode"):
+            output.release()
+        print(f"Generated video of {timeline.total_frames * 1000 / self.fps} milliseconds from viseme images.")
+
+        if self.render_mode == "mp4v":
+            self.add_audio(audio, self.out_path)
+            return
+        # The frames are already encoded, only the audio track has to be added.
+        video_out_path = self.get_final_path(self.out_path)
+        with self.trace.span("mux"):
+            mux_audio(self.out_path, audio, video_out_path)
+        self.out_path = video_out_path
+        self.final_path = video_out_path
+        print(f"Video successfully saved to {video_out_path}.")
+        if self.callback is not None:
+            self.callback()
+
+    def get_audio_path(self, audio):
+        # moviepy only reads files, in-memory audio is written next to the video it belongs to.
+        if isinstance(audio, PcmAudio):
+            return audio.write_wav(os.path.join(self.out_dir, "audio.wav"))
+        return audio
 
-    def add_audio(self, audio_file, video_file):
+    def add_audio(self, audio, video_file, video_out_path=None):
+        with self.trace.span("mux"):
+            self.mux_with_moviepy(audio, video_file, video_out_path)
+        print(f"Video successfully saved to {self.final_path}.")
+
+        if self.callback is not None:
+            self.callback()
+
+    def mux_with_moviepy(self, audio, video_file, video_out_path=None):
+        audio_file = self.get_audio_path(audio)
         video_clip = VideoFileClip(video_file)
         audio_clip = AudioFileClip(audio_file)
         print("Audio File: "  + audio_file)
@@ -145,17 +341,181 @@ class VideoMaker:
             print(f"Clipped video file to {audio_clip.end} milliseconds.")
 
         final_clip = video_clip.set_audio(audio_clip)
-        final_clip.write_videofile(f'video/temp.mp4', codec="libx264", audio_codec="aac")
+        final_clip.write_videofile(os.path.join(self.out_dir, "temp.mp4"), codec="libx264", audio_codec="aac")
 
         final_video = video_clip.set_audio(audio_clip)
         print(f"Successfully generated video of {final_video.end} milliseconds from video and audio streams.")
-        video_out_path = f'video/2{os.path.basename(self.im_dir)}_with_audio_{video_file.strip(".json").strip("video/")}'
+        if video_out_path is None:
+            video_out_path = self.get_final_path(video_file)
         # final_video.write_videofile(video_out_path, fps=self.fps)
         final_video.write_videofile(video_out_path, fps=self.fps, audio_codec="aac")
+        self.final_path = video_out_path
 
-        print(f"Video successfully saved to {video_out_path}.")
 
-        self.callback()
+def find_batch_inputs(args):
+    # Every <name>.json or <name>.vtl timeline is rendered with its own <name>.wav.
+    items = []
+    names = set()
+    for in_file in sorted(os.listdir(args.metadata_dir)):
+        name, extension = os.path.splitext(in_file)
+        if extension not in TIMELINE_EXTENSIONS:
+            continue
+        if name in names:
+            print(f"Skipping {in_file}, {name} has a timeline in both formats.")
+            continue
+        names.add(name)
+        audio_path = None
+        if args.no_audio is not True:
+            audio_path = os.path.join(args.audio_dir, f"{name}.wav")
+            if not os.path.exists(audio_path):
+                print(f"Skipping {in_file}, there is no {audio_path}.")
+                continue
+        items.append((name, os.path.join(args.metadata_dir, in_file), audio_path))
+    return items
+
+
+def get_batch_out_path(video_maker, name, args):
+    out_path = os.path.join(args.out_dir, f"{name}_{args.fps}.mp4")
+    if args.no_audio:
+        return out_path
+    if args.render_mode == "hls":
+        return os.path.join(os.path.splitext(video_maker.get_final_path(out_path))[0], "playlist.m3u8")
+    return video_maker.get_final_path(out_path)
+
+
+def is_up_to_date(out_path, input_paths):
+    if not os.path.exists(out_path):
+        return False
+    return os.path.getmtime(out_path) >= max(os.path.getmtime(path) for path in input_paths if path is not None)
+
+
+def get_render_path(out_path):
+    # Written under another name first, so an interrupted or failed render never leaves an output that looks up to date.
+    if out_path.endswith(".m3u8"):
+        # A playlist is rendered with its segments in a directory of their own, renamed once complete.
+        render_dir = f"{os.path.dirname(out_path)}.part"
+        shutil.rmtree(render_dir, ignore_errors=True)
+        os.makedirs(render_dir)
+        return os.path.join(render_dir, os.path.basename(out_path))
+    return f"{os.path.splitext(out_path)[0]}.part.mp4"
+
+
+def publish_render(render_path, out_path):
+    if out_path.endswith(".m3u8"):
+        shutil.rmtree(os.path.dirname(out_path), ignore_errors=True)
+        os.replace(os.path.dirname(render_path), os.path.dirname(out_path))
+    else:
+        os.replace(render_path, out_path)
+
+
+def discard_render(render_path):
+    if render_path.endswith(".m3u8"):
+        shutil.rmtree(os.path.dirname(render_path), ignore_errors=True)
+    elif os.path.exists(render_path):
+        os.remove(render_path)
+
+
+def render_in_process(video_maker, item, out_path, args):
+    name, in_path, audio_path = item
+    render_path = get_render_path(out_path)
+    start = time.perf_counter()
+    # mp4v muxes its audio with moviepy afterwards, from a silent video.
+    mux_later = args.render_mode == "mp4v" and audio_path is not None
+    video_path = os.path.join(args.out_dir, f"{name}_{args.fps}.mp4") if mux_later else render_path
+    try:
+        duration_ms = video_maker.render_visemes(load_timeline(in_path), video_path, audio_path, audio_path is not None and not mux_later)
+        if mux_later:
+            video_maker.add_audio(audio_path, video_path, render_path)
+    except Exception:
+        discard_render(render_path)
+        raise
+    publish_render(render_path, out_path)
+    return {"duration_ms": duration_ms, "render_seconds": time.perf_counter() - start}
+
+
+def submit_to_pool(pool, item, out_path, args):
+    from render_pool import RenderJob
+
+    name, in_path, audio_path = item
+    visemes = load_timeline(in_path)
+    render_path = get_render_path(out_path)
+    job = RenderJob(
+        visemes, audio_path, args.im_dir, render_path, args.fps, args.render_mode,
+        transition_ms=args.transition_ms
+    )
+    return pool.submit(job), render_path
+
+
+def render_batch(args):
+    from concurrent.futures import as_completed
+    from render_pool import RenderPool
+
+    video_maker = VideoMaker(
+        args.im_dir, args.metadata_dir, args.audio_dir, args.out_dir, args.fps, args.map, None, "regular-mode", args.render_mode,
+        segment_time=args.segment_time, transition_ms=args.transition_ms
+    )
+    pending = []
+    skipped = 0
+    for item in find_batch_inputs(args):
+        out_path = get_batch_out_path(video_maker, item[0], args)
+        if not args.force and is_up_to_date(out_path, item[1:]):
+            skipped += 1
+            continue
+        pending.append((item, out_path))
+    print(f"Rendering {len(pending)} videos, {skipped} already up to date.")
+    if not pending:
+        # Nothing to render, so no worker processes are started.
+        return 0
+
+    # mp4v muxes its audio with moviepy afterwards, which only the in-process renderer does.
+    workers = args.workers if args.render_mode != "mp4v" else 0
+    start = time.perf_counter()
+    failed = 0
+
+    def report(done, name, result):
+        elapsed = time.perf_counter() - start
+        remaining = elapsed / done * (len(pending) - done)
+        print(
+            f"[{done}/{len(pending)}] {name}: {result['duration_ms'] / 1000:.1f} s of video in {result['render_seconds']:.1f} s, "
+            f"about {remaining:.0f} s left."
+        )
+
+    if workers == 0:
+        for done, (item, out_path) in enumerate(pending, 1):
+            try:
+                report(done, item[0], render_in_process(video_maker, item, out_path, args))
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(pending)}] {item[0]} failed: {e}")
+    else:
+        pool = RenderPool(workers)
+        futures = {}
+        done = 0
+        for item, out_path in pending:
+            try:
+                future, render_path = submit_to_pool(pool, item, out_path, args)
+            except Exception as e:
+                # An unreadable timeline fails its own video, not the batch.
+                done += 1
+                failed += 1
+                print(f"[{done}/{len(pending)}] {item[0]} failed: {e}")
+                continue
+            futures[future] = (item[0], render_path, out_path)
+        for done, future in enumerate(as_completed(futures), done + 1):
+            name, render_path, out_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(pending)}] {name} failed: {e}")
+                discard_render(render_path)
+                continue
+            publish_render(render_path, out_path)
+            report(done, name, result)
+        pool.shutdown()
+
+    print(f"Rendered {len(pending) - failed} videos in {time.perf_counter() - start:.1f} s, {skipped} skipped, {failed} failed.")
+    return failed
 
 
 def main():
@@ -171,19 +531,24 @@ def main():
     parser.add_argument("--fps", type=int, default=60, help="Frame rate (in frames per second) to generate video.")
     parser.add_argument("--map", type=str, default="map/viseme_map.json", help="Path to viseme mapping file.")
     parser.add_argument("--no_audio", action="store_true", help="Generated video without audio.")
+    parser.add_argument(
+        "--render_mode", type=str, default="direct", choices=["direct", "hls", "vfr", "mp4v"],
+        help="direct: encode frames and mux audio in one ffmpeg pass. hls: same, written as a growing segmented playlist. "
+        "vfr: same as direct, with one variable-length frame per viseme. mp4v: OpenCV writer followed by moviepy muxing."
+    )
+    parser.add_argument("--segment_time", type=float, default=1, help="Segment length in seconds for --render_mode hls.")
+    parser.add_argument(
+        "--transition_ms", type=float, default=0, help="Cross-fade between mouth shapes for this long (0 cuts between them)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Render processes for the batch (0 renders one video after the other in this process)."
+    )
+    parser.add_argument("--force", action="store_true", help="Render videos that are already up to date again.")
     args = parser.parse_args()
-    viseme_video_maker = VideoMaker(args.im_dir, args.metadata_dir, args.audio_dir, args.out_dir, args.fps, args.map, None)
-
-    for in_file in os.listdir(args.metadata_dir):
-        if ".json" not in in_file:
-            continue
-        else:
-            viseme_video_maker.generate_video(in_file)
-            print(f"Generated video from {in_file}.")
-            if (viseme_video_maker.mode != "beff-mode"):
-                if args.no_audio is not True:
-                    viseme_video_maker.add_audio(f'audio/text_to_audio.wav', viseme_video_maker.out_path)
-                    # combine_audio_video(audio_file_path_new, video_file_path_new, output_file_path_new)
+    os.makedirs(args.out_dir, exist_ok=True)
+    if render_batch(args):
+        sys.exit(1)
 
 
 def combine_audio_video(audio_file_path, video_file_path, output_file_path):
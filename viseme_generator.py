@@ -1,8 +1,19 @@
 import azure.cognitiveservices.speech as speechsdk
 import json
-from video_generator import VideoMaker
+from video_generator import LIPSYNC_MODES, RENDERED_MODES, VideoMaker
+from render_cache import get_render_cache
+from lipsync_cache import get_lipsync_cache
+from render_pool import RenderJob, get_render_pool
+from workspace import JobWorkspace
+from pcm_audio import PcmAudio
+from synth_pool import get_synthesizer_pool
+from sentence_synthesis import split_sentences, synthesize_sentences
+from tracing import Metrics, Trace, metrics
 import argparse
+import logging
 import os
+import queue
+import threading
 
 
 """
@@ -12,12 +23,14 @@ This script integrates Azure Cognitive Services' Text-to-Speech (TTS) API with a
 
 1. **Azure Cognitive Services TTS Integration**:
    - The script uses Azure's Text-to-Speech service to convert input text into speech and generate viseme data, which maps phonemes (speech sounds) to mouth shapes.
-   - The viseme data is saved in a JSON file (`metadata/text_to_viseme.json`) and is used to create a synchronized video of mouth movements.
+   - The synthesized audio is kept in memory as raw PCM (`pcm_audio.PcmAudio`) and piped straight into the encoder and the cache, it is only written to disk with `--save_audio`.
+   - The viseme data of a request is saved in its own workspace (`work/<job_id>/visemes.json`, see `workspace.py`) and is used to create a synchronized video of mouth movements.
 
 2. **`GenerateVideoAndAudio` Class**:
    - Handles the generation of both audio and video. It takes a callback function and a mode as parameters to control behavior dynamically.
    - The class configures the Azure TTS engine, generates audio from text using SSML (Speech Synthesis Markup Language), and captures the viseme data during speech synthesis.
    - Different modes like "beff-mode", "jigar-mode", and "mickey-mode" change the voice actor and style used in speech synthesis.
+   - The local avatar modes ("beff-local-mode", "hulk-local-mode") use the voice of their character and render the avatar locally (`avatar_compositor.py`), with streaming, the render pool and the cache like the regular mode.
 
 3. **Video Generation**:
    - After generating audio and viseme data, the script uses the `VideoMaker` class (from the `video_generator` module) to produce a video based on the viseme images and timing.
@@ -25,20 +38,37 @@ This script integrates Azure Cognitive Services' Text-to-Speech (TTS) API with a
 
 ### Key Functions in the `GenerateVideoAndAudio` Class:
 
-1. **`__init__(self, callback, mode)`**:
+1. **`__init__(self, callback, mode, play_callback=None, live_player=None)`**:
    - Initializes the class with a callback function (e.g., for playing videos) and sets the mode for voice generation.
+   - `play_callback(path)` receives the playlist of a segmented (`--render_mode hls`) video as soon as its first segment is ready.
+   - `live_player` is a `live_player.LivePlayer` widget used by `--live`.
 
-2. **`generateViseme(self, text)`**:
+2. **`generateViseme(self, text, mode=None)`**:
    - Converts the input text to speech using Azure's TTS API and captures viseme data (mouth movements).
-   - The speech is synthesized according to the selected mode (which controls voice and style).
+   - The speech is synthesized according to the mode passed with the request, or the default mode (which controls voice and style).
+   - Every call runs in its own `JobWorkspace`, so concurrent requests never share files or modes. It returns the workspace, whose `final_path` is the video to play and whose `streamed_to_player` tells whether the player already received it. Intermediates are deleted when the job ends.
    - After generating the viseme data, it calls `generateVideo()` to create the video.
+   - Finished replies are stored in a content-addressed cache (`render_cache.py`) keyed by the normalized text, voice, style, rate, image set, fps and output format. A repeated phrase skips Azure and rendering and goes straight to playback.
+   - The videos of the remote lipsync modes are also cached by the hashes of the face image and the audio (`lipsync_cache.py`), so audio that was lip-synced before is not sent to the API again, and identical requests in flight share one API call.
+   - With `--streaming`, visemes are put into a bounded queue as they arrive and a render worker (`VideoMaker.generate_video_stream`, run by `StreamingRender`) writes their frames while synthesis is still running. Only the audio track is muxed once synthesis completes. If the render fails, the queue stops accepting visemes and the job raises the render's exception.
+   - With `--live`, nothing is rendered or encoded: the visemes and the PCM chunks Azure sends (`synthesizing` events) are pushed to the `LivePlayer`, which shows the frames in step with the audio it plays, so the mouth moves about as soon as the first viseme arrives. No files are written and the render cache is not used. `--live_archive_dir` additionally encodes each reply in the background once it was shown.
+   - Every job is traced (`workspace.trace`, see `tracing.py`): parsing, the first viseme, the end of synthesis, timeline, render, encode, mux and the handoff to the player are recorded in the process-wide latency histograms, together with job and cache hit counters, and a one-line summary is printed when the job ends. Individual visemes are only logged with `--log_level DEBUG`, which the entry points (`TCP.py`, `TCPConnection.py`) apply to the root logger; the class itself never configures logging.
 
-3. **`generateVideo(self)`**:
-   - Uses the `VideoMaker` class to generate a video based on the viseme data.
+3. **`synthesize(self, voice_actor, ssml, viseme_callback)`**:
+   - Runs the synthesis on a warm, pre-connected synthesizer borrowed from the per-voice pool (`synth_pool.py`). The pool is warmed for every mode's voice when the class is created, and a synthesizer whose request was cancelled is rebuilt. With `--synth_pool_size 0` a new synthesizer is built for every request.
+
+4. **`synthesize_text(self, voice_actor, style, text, ssml, viseme_callback, args)`**:
+   - Splits a long reply into sentences and synthesizes up to `--sentence_workers` of them at once (`sentence_synthesis.py`). Their audio and rebased viseme timelines are stitched into one reply, and the first sentence's visemes reach the (streaming) renderer while the rest is still being synthesized.
+
+5. **`render_in_pool(self, args, workspace, viseme_data, audio)`**:
+   - With `--render_workers N`, submits the render as a `RenderJob` to a shared pool of worker processes (`render_pool.py`) instead of rendering on the calling thread.
+
+6. **`generateVideo(self, workspace, audio=None, args=None)`**:
+   - Uses the `VideoMaker` class to generate a video based on the viseme data of the workspace.
    - The video is created by displaying the appropriate viseme image (mouth shape) for the corresponding duration, synchronized with the audio.
 
-4. **`set_mode(self, new_mode)`**:
-   - Updates the mode used for generating the voice and video, allowing the behavior of the class to be changed dynamically.
+7. **`set_mode(self, new_mode)`**:
+   - Updates the default mode, used by requests that do not carry a mode of their own.
 
 ### How to Use:
 
@@ -48,20 +78,92 @@ This script integrates Azure Cognitive Services' Text-to-Speech (TTS) API with a
    pip install azure-cognitiveservices-speech moviepy opencv-python argparse
 """
 
+logger = logging.getLogger(__name__)
+# How long a viseme waits for room in the streaming queue before checking that the render worker is still running.
+STREAM_PUT_TIMEOUT = 0.1
+
+
+class StreamingRender:
+    # Runs VideoMaker.generate_video_stream on its own thread. A render that fails keeps its exception
+    # for the job instead of leaving the synthesis callbacks blocked on a full queue.
+    def __init__(self, video_maker, queue_size):
+        self.video_maker = video_maker
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def run(self):
+        try:
+            self.video_maker.generate_video_stream(self.queue)
+        except Exception as e:
+            self.error = e
+            print(f"Streaming render failed: {e}")
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def put(self, chunk):
+        while self.thread.is_alive():
+            try:
+                self.queue.put(chunk, timeout=STREAM_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self, chunk):
+        # Ends the stream with the end chunk (or None to cancel it) and raises the render's exception, if any.
+        self.closed = True
+        self.put(chunk)
+        self.join()
+
+    def cancel(self):
+        # For a job that failed before the stream was closed: stops the worker and its encoder without
+        # hiding the job's own exception behind the render's.
+        if self.closed:
+            return
+        self.closed = True
+        self.put(None)
+        self.thread.join()
+
+    def join(self):
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
 
 class GenerateVideoAndAudio:
-    def __init__(self, callback, mode):
+    def __init__(self, callback, mode, play_callback=None, live_player=None):
         self.callback = callback
         self.mode = mode
+        self.play_callback = play_callback
+        self.live_player = live_player
+        self.synthesizer_pool = None
+        args = self.get_args()
+        if args.synth_pool_size > 0:
+            self.synthesizer_pool = get_synthesizer_pool(
+                self.speech_config, speechsdk, args.synth_pool_size, keep_warm_interval=args.keep_warm_seconds
+            )
+            # Connections open in the background, a request that comes first builds its own synthesizer.
+            threading.Thread(target=self.synthesizer_pool.warm, args=(self.get_voices(),), daemon=True).start()
 
     speech_key = "YOUR-SPEECH-KEY"
     service_region = "westus2"
     speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
     speech_config.speech_synthesis_voice_name = "en-US-BrianNeural"
+    # Raw PCM with no container, so the samples can be piped to ffmpeg as they are.
+    speech_config.set_speech_synthesis_output_format(speechsdk.SpeechSynthesisOutputFormat.Raw24Khz16BitMonoPcm)
 
     duration = 95
     fps = 1 / (duration / 1000)
 
+    # Modes whose voices get warm synthesizers at start-up.
+    voice_modes = ["regular-mode", "beff-mode", "jigar-mode", "sarayu-mode", "mickey-mode", "beff-local-mode", "hulk-local-mode"]
+
     def set_mode(self, new_mode):
         self.mode = new_mode
 
@@ -76,69 +178,214 @@ class GenerateVideoAndAudio:
             </voice>
         </speak>"""
 
-    def generateViseme(self, text):
-        print("Viseme Generate():")
-        print(self.mode)
+    def get_voice_settings(self, mode):
         # ssml = self.speech_config_txt
         voice_actor = "en-US-EmmaNeural"
         style = "default"
         rate = ""
         # text = "Hi, I'm your default virtual assistant"
 
-        if self.mode == "beff-mode":
+        if mode in ("beff-mode", "beff-local-mode"):
             voice_actor = "en-US-BrianNeural"
             # text = "Hey There, I'll be your new Virtual Assistant!"
 
-        elif self.mode == "jigar-mode":
+        elif mode == "jigar-mode":
             voice_actor = "en-US-BrandonNeural"
             # text = "Hi, my name is Jigar, I'll be your custom Virtual Assistant"
 
-        elif self.mode == "sarayu-mode":
+        elif mode == "sarayu-mode":
             voice_actor = "en-US-SaraNeural"
             # text = "Hi, my name is Sarayu, I'll be your Virtual Assistant"
             style = "cheerful"
 
-        elif self.mode == "mickey-mode":
+        elif mode in ("mickey-mode", "hulk-local-mode"):
             voice_actor = "en-US-DavisNeural"
             # text = """I AM HULK, Hulk SMASH,<break time="1500ms"/> Hulk is strongest there is"""
             style = "shouting"
             rate = """ "rate="slow" pitch="-20%" """
             #regular
         # text = """<prosody volume="x-loud">Why does Waldo always wear stripes?<break time="1500ms"/><mark name="punchline"/>Because he doesn&apos;t want to be spotted.</prosody>"""
-        ssml = self.speech_config_text.format(voice_actor, style, text)
+        return voice_actor, style, rate
+
+    def get_render_cache(self, args):
+        # Segmented output is a growing directory of segments, only single-file outputs are cached.
+        if args.no_cache or args.render_mode == "hls" or args.live:
+            return None
+        return get_render_cache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+
+    def get_lipsync_cache(self, args):
+        if args.no_cache:
+            return None
+        return get_lipsync_cache(args.lipsync_cache_dir, args.lipsync_cache_max_mb * 1024 * 1024)
+
+    def play_cached(self, entry, workspace):
+        workspace.final_path = entry["video"]
+        if self.play_callback is not None:
+            workspace.streamed_to_player = True
+            workspace.trace.mark("handoff")
+            self.play_callback(entry["video"])
+        if self.callback is not None:
+            self.callback()
+
+    def generateViseme(self, text, mode=None):
+        # Each job gets its own workspace and keeps the mode it was submitted with, so jobs can run in parallel.
+        args = self.get_args()
+        workspace = JobWorkspace(args.work_dir, mode or self.mode, keep_jobs=args.keep_jobs)
+        metrics.increment("jobs")
+        metrics.adjust_gauge("jobs_in_flight", 1)
+        try:
+            with workspace:
+                self.run_job(workspace, text, args)
+        except Exception:
+            metrics.increment("jobs_failed")
+            raise
+        finally:
+            metrics.adjust_gauge("jobs_in_flight", -1)
+        workspace.trace.finish()
+        print(workspace.trace.summary())
+        return workspace
+
+    def run_job(self, workspace, text, args):
+        print("Viseme Generate():")
+        print(f"Job {workspace.job_id} in {workspace.mode}")
+        trace = workspace.trace
+        with trace.span("parse"):
+            voice_actor, style, rate = self.get_voice_settings(workspace.mode)
+            ssml = self.speech_config_text.format(voice_actor, style, text)
+
+        render_cache = self.get_render_cache(args)
+        if render_cache is not None:
+            image_set = f"{workspace.mode}:{args.im_dir}"
+            if args.transition_ms:
+                image_set += f":transition={args.transition_ms}"
+            cache_key = render_cache.make_key(text, voice_actor, style, rate, image_set, args.fps, args.render_mode)
+            entry = render_cache.get(cache_key)
+            if entry is not None:
+                metrics.increment("render_cache_hits")
+                print(f"Render cache hit {cache_key}, playing {entry['video']}.")
+                self.play_cached(entry, workspace)
+                return
+            metrics.increment("render_cache_misses")
 
         print("\n")
         print(text)
         print("\n")
 
-        file_name = "audio/text_to_audio.wav"
-        file_config = speechsdk.audio.AudioOutputConfig(filename=file_name)
-
-        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=file_config)
-
         viseme_data = []
 
-        def viseme_callback(event):
-            print(event)
-            viseme_data.append({"offset": event.audio_offset / 10000, "id": event.viseme_id})
-
+        # In live mode the player shows the visemes and plays the audio as they arrive, nothing is rendered.
+        live = args.live and self.live_player is not None and workspace.mode in RENDERED_MODES and args.no_audio is not True
+        audio_callback = None
+        if live:
+            frame_source = self.get_video_maker(args, workspace)
+            session = self.live_player.start_session(frame_source.make_frame, frame_source.get_frame_set_key())
 
-        speech_synthesizer.viseme_received.connect(viseme_callback)
+            def audio_callback(data):
+                trace.mark("handoff")
+                session.push_audio(data)
 
-        result = speech_synthesizer.speak_ssml_async(ssml=ssml).get()
-
-        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            with open("metadata/text_to_viseme.json", "w") as f:
-                json.dump(viseme_data, f, indent=4)
-            
-            self.generateVideo()
-        elif result.reason == speechsdk.ResultReason.Canceled:
-            cancellation_details = result.cancellation_details
-            if cancellation_details.reason == speechsdk.CancellationReason.Error:
-                print("Error details: {}".format(cancellation_details.error_details))
+        # In streaming mode the render worker consumes visemes while Azure is still synthesizing.
+        streaming = args.streaming and not live and workspace.mode in RENDERED_MODES and args.no_audio is not True
+        if streaming:
+            viseme_video_maker = self.get_video_maker(args, workspace)
+            streaming_render = StreamingRender(viseme_video_maker, args.stream_queue_size)
 
+        def viseme_callback(event):
+            trace.mark("tts_first_viseme")
+            logger.debug("%s", event)
+            chunk = {"offset": event.audio_offset / 10000, "id": event.viseme_id}
+            viseme_data.append(chunk)
+            if live:
+                session.push_viseme(chunk["offset"], chunk["id"])
+            if streaming:
+                streaming_render.put(chunk)
+
+        try:
+            result = self.synthesize_text(voice_actor, style, text, ssml, viseme_callback, args, audio_callback)
+            trace.mark("tts_complete")
+
+            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+                audio = PcmAudio(result.audio_data)
+                if args.save_audio:
+                    print(f"Saved audio to {audio.write_wav(os.path.join(args.audio_dir, f'{workspace.job_id}.wav'))}.")
+                if not live:
+                    with open(workspace.visemes_file, "w") as f:
+                        json.dump(viseme_data, f, indent=4)
+
+                if live:
+                    session.finish(audio.duration_ms)
+                    workspace.streamed_to_player = True
+                    if args.live_archive_dir is not None:
+                        threading.Thread(target=self.archive, args=(args, workspace, viseme_data, audio)).start()
+                elif streaming:
+                    # Raises the render's exception, so the job fails instead of returning without a video.
+                    streaming_render.close({"end": audio.duration_ms, "audio": audio})
+                    workspace.final_path = viseme_video_maker.final_path
+                elif args.render_workers > 0 and workspace.mode in RENDERED_MODES and args.no_audio is not True and args.render_mode in ("direct", "vfr"):
+                    self.render_in_pool(args, workspace, viseme_data, audio)
+                else:
+                    self.generateVideo(workspace, audio, args)
+
+                if render_cache is not None and workspace.final_path is not None and os.path.exists(workspace.final_path):
+                    render_cache.put(cache_key, {
+                        "audio": audio,
+                        "visemes": workspace.visemes_file,
+                        "video": workspace.final_path,
+                    })
+                    print(f"Render cache: {render_cache.stats()}")
+            elif result.reason == speechsdk.ResultReason.Canceled:
+                metrics.increment("synthesis_canceled")
+                cancellation_details = result.cancellation_details
+                if cancellation_details.reason == speechsdk.CancellationReason.Error:
+                    print("Error details: {}".format(cancellation_details.error_details))
+                if streaming:
+                    streaming_render.close(None)
+        finally:
+            # Synthesis raised, was canceled or ended with another reason: the render worker must not wait for visemes forever,
+            # and the player must not wait for the rest of the reply.
+            if streaming:
+                streaming_render.cancel()
+            if live and not session.is_finished():
+                session.cancel()
+
+
+    def get_voices(self):
+        return sorted({self.get_voice_settings(mode)[0] for mode in self.voice_modes})
+
+    def connect_callbacks(self, synthesizer, viseme_callback, audio_callback):
+        synthesizer.viseme_received.connect(viseme_callback)
+        if audio_callback is not None:
+            # Audio chunks as Azure sends them, before the result is complete.
+            synthesizer.synthesizing.connect(lambda event: audio_callback(event.result.audio_data))
+
+    def synthesize(self, voice_actor, ssml, viseme_callback, audio_callback=None):
+        if self.synthesizer_pool is None:
+            # Without an audio config the synthesized audio stays in memory (result.audio_data), nothing is written or played.
+            speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+            self.connect_callbacks(speech_synthesizer, viseme_callback, audio_callback)
+            return speech_synthesizer.speak_ssml_async(ssml=ssml).get()
+
+        with self.synthesizer_pool.acquire(voice_actor) as pooled:
+            self.connect_callbacks(pooled.synthesizer, viseme_callback, audio_callback)
+            result = pooled.synthesizer.speak_ssml_async(ssml=ssml).get()
+            if result.reason == speechsdk.ResultReason.Canceled:
+                # Usually a dropped or rejected connection, the synthesizer is rebuilt rather than reused.
+                pooled.mark_failed()
+        return result
+
+    def synthesize_text(self, voice_actor, style, text, ssml, viseme_callback, args, audio_callback=None):
+        sentences = split_sentences(text) if args.sentence_workers > 1 else [text]
+        if len(sentences) == 1:
+            return self.synthesize(voice_actor, ssml, viseme_callback, audio_callback)
+        print(f"Synthesizing {len(sentences)} sentences in parallel.")
+        return synthesize_sentences(
+            lambda sentence, callback, sentence_audio_callback: self.synthesize(
+                voice_actor, self.speech_config_text.format(voice_actor, style, sentence), callback, sentence_audio_callback
+            ),
+            sentences, viseme_callback, speechsdk.ResultReason.SynthesizingAudioCompleted, args.sentence_workers, audio_callback
+        )
 
-    def generateVideo(self):
+    def get_args(self):
         parser = argparse.ArgumentParser(
             description="Specify metadata, audio, image and output directories, and viseme mapping file."
         )
@@ -151,15 +398,121 @@ class GenerateVideoAndAudio:
         parser.add_argument("--fps", type=int, default=50, help="Frame rate (in frames per second) to generate video.")
         parser.add_argument("--map", type=str, default="map/viseme_map.json", help="Path to viseme mapping file.")
         parser.add_argument("--no_audio", action="store_true", help="Generated video without audio.")
-        args = parser.parse_args()
-        viseme_video_maker = VideoMaker(args.im_dir, args.metadata_dir, args.audio_dir, args.out_dir, args.fps, args.map, self.callback, self.mode)
+        parser.add_argument(
+            "--render_mode", type=str, default="direct", choices=["direct", "hls", "vfr", "mp4v"],
+            help="direct: encode frames and mux audio in one ffmpeg pass. hls: same, written as a growing segmented playlist "
+            "that is handed to the player after the first segment. vfr: same as direct, with one variable-length frame per "
+            "viseme. mp4v: OpenCV writer followed by moviepy muxing."
+        )
+        parser.add_argument("--segment_time", type=float, default=1, help="Segment length in seconds for --render_mode hls.")
+        parser.add_argument("--streaming", action="store_true", help="Render frames while Azure is still emitting visemes.")
+        parser.add_argument("--stream_queue_size", type=int, default=256, help="Maximum number of visemes waiting to be rendered.")
+        parser.add_argument(
+            "--live", action="store_true",
+            help="Show replies on the live player while they are synthesized, without encoding (needs a LivePlayer)."
+        )
+        parser.add_argument(
+            "--live_archive_dir", type=str, default=None,
+            help="With --live, also encode every reply to <dir>/<job_id>.mp4 in the background."
+        )
+        parser.add_argument(
+            "--transition_ms", type=float, default=0,
+            help="Cross-fade between mouth shapes for this long, from precomputed transitions (0 cuts between them)."
+        )
+        parser.add_argument(
+            "--render_workers", type=int, default=0,
+            help="Render in a pool of this many worker processes (0 renders on the calling thread)."
+        )
+        parser.add_argument("--cache_dir", type=str, default="cache/render", help="Directory of the synthesis/render cache.")
+        parser.add_argument("--cache_max_mb", type=int, default=1024, help="Disk budget of the render cache in megabytes.")
+        parser.add_argument(
+            "--lipsync_cache_dir", type=str, default="cache/lipsync", help="Directory of the cache of remote lipsync videos."
+        )
+        parser.add_argument(
+            "--lipsync_cache_max_mb", type=int, default=1024, help="Disk budget of the remote lipsync cache in megabytes."
+        )
+        parser.add_argument("--no_cache", action="store_true", help="Always synthesize and render, bypassing the caches.")
+        parser.add_argument(
+            "--save_audio", action="store_true",
+            help="Also write the synthesized audio to <audio_dir>/<job_id>.wav. By default it only exists in memory."
+        )
+        parser.add_argument("--work_dir", type=str, default="work", help="Directory holding one workspace per job.")
+        parser.add_argument(
+            "--synth_pool_size", type=int, default=1,
+            help="Pre-connected synthesizers kept per voice (0 builds a new synthesizer for every request)."
+        )
+        parser.add_argument(
+            "--keep_warm_seconds", type=float, default=60,
+            help="How often idle pooled synthesizers are health checked and reconnected."
+        )
+        parser.add_argument(
+            "--sentence_workers", type=int, default=4,
+            help="Sentences of a long reply synthesized at the same time (1 sends the whole reply as one request)."
+        )
+        parser.add_argument("--keep_jobs", type=int, default=8, help="Number of finished job workspaces kept for playback.")
+        parser.add_argument(
+            "--log_level", type=str, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+            help="DEBUG also logs every viseme and frame, which slows down rendering."
+        )
+        args, _ = parser.parse_known_args()
+        return args
+
+    def get_video_maker(self, args, workspace):
+        segment_callback = None
+        if self.play_callback is not None:
+            segment_callback = lambda playlist_path: self.on_first_segment(workspace, playlist_path)
+        return VideoMaker(
+            args.im_dir, workspace.dir, args.audio_dir, workspace.out_dir, args.fps, args.map, self.callback, workspace.mode,
+            args.render_mode, segment_callback=segment_callback, segment_time=args.segment_time, trace=workspace.trace,
+            transition_ms=args.transition_ms, lipsync_cache=self.get_lipsync_cache(args)
+        )
 
-        for in_file in os.listdir(args.metadata_dir):
-            if ".json" not in in_file:
-                continue
-            else:
-                viseme_video_maker.generate_video(in_file)
-                print(f"Generated video from {in_file}.")
-                if viseme_video_maker.mode == "regular-mode":
-                    if args.no_audio is not True:
-                        viseme_video_maker.add_audio(f'audio/text_to_audio.wav', viseme_video_maker.out_path)
\ No newline at end of file
+    def on_first_segment(self, workspace, playlist_path):
+        print(f"First segment of job {workspace.job_id} ready, playing {playlist_path}.")
+        workspace.streamed_to_player = True
+        workspace.trace.mark("handoff")
+        self.play_callback(playlist_path)
+
+    def archive(self, args, workspace, viseme_data, audio):
+        # Runs after the reply was shown, so its stages are kept out of the latency metrics.
+        os.makedirs(args.live_archive_dir, exist_ok=True)
+        video_maker = VideoMaker(
+            args.im_dir, None, None, args.live_archive_dir, args.fps, None, None, workspace.mode, "direct",
+            trace=Trace(workspace.job_id, Metrics()), transition_ms=args.transition_ms
+        )
+        out_path = os.path.join(args.live_archive_dir, f"{workspace.job_id}.mp4")
+        video_maker.render_visemes(viseme_data, out_path, audio, mux_audio=True)
+        print(f"Archived job {workspace.job_id} to {out_path}.")
+
+    def render_in_pool(self, args, workspace, viseme_data, audio):
+        video_maker = self.get_video_maker(args, workspace)
+        out_path = video_maker.get_final_path(os.path.join(workspace.out_dir, f"text_to_viseme_{video_maker.fps}.mp4"))
+        job = RenderJob(
+            viseme_data, audio, args.im_dir, out_path, video_maker.fps, args.render_mode, workspace.mode, args.transition_ms
+        )
+        # The stages of a pooled render happen in another process, they are recorded as one.
+        with workspace.trace.span("render"):
+            result = get_render_pool(args.render_workers).submit(job).result()
+        print(f"Video successfully saved to {result['out_path']} in {result['render_seconds']:.2f} seconds.")
+        workspace.final_path = result["out_path"]
+        if self.callback is not None:
+            self.callback()
+
+    def generateVideo(self, workspace, audio=None, args=None):
+        args = args or self.get_args()
+        viseme_video_maker = self.get_video_maker(args, workspace)
+        in_file = os.path.basename(workspace.visemes_file)
+
+        if viseme_video_maker.mode in RENDERED_MODES and args.no_audio is not True:
+            viseme_video_maker.generate_video(in_file, audio)
+            print(f"Generated video from {in_file}.")
+            if args.render_mode == "mp4v":
+                viseme_video_maker.add_audio(audio, viseme_video_maker.out_path)
+        elif viseme_video_maker.mode in LIPSYNC_MODES:
+            # The remote lipsync modes upload the reply's audio.
+            viseme_video_maker.generate_video(in_file, audio)
+            print(f"Generated video from {in_file}.")
+        else:
+            viseme_video_maker.generate_video(in_file)
+            print(f"Generated video from {in_file}.")
+        workspace.final_path = viseme_video_maker.final_path
@@ -0,0 +1,141 @@
+import wave
+import numpy as np
+from pcm_audio import PcmAudio
+from timeline_file import VisemeTimeline
+
+
+"""
+This module turns the viseme events reported by Azure TTS (a list of `{"offset": ms, "id": viseme_id}` entries, or a `timeline_file.VisemeTimeline` loaded from a binary file) into a run-length frame plan: which viseme image to show and for how many frames. All frame boundaries are computed from the absolute offsets in one vectorized NumPy pass, so rounding never accumulates over long utterances.
+
+### Key Components:
+
+1. **`build_frame_plan(offsets, ids, fps, audio_duration_ms=None, tail_ms=DEFAULT_TAIL_MS)`**:
+   - Viseme `i` is shown from its own offset until the next viseme's offset; the first viseme also covers the lead-in from 0 ms and the last one runs until the end of the audio.
+   - Each boundary is rounded to a frame index independently, so the error of any run is at most half a frame and never piles up.
+   - Visemes shorter than a frame are dropped and consecutive identical visemes are merged into a single run.
+
+2. **`FramePlan` Class**:
+   - Holds the run-length plan as NumPy arrays (`ids`, `counts`, `starts`) and iterates as `(viseme_id, frame_count)` pairs.
+
+3. **`StreamingTimeline` Class**:
+   - Incremental version of `build_frame_plan` for visemes that arrive one by one while Azure is still synthesizing. A viseme's frame count is known once the next viseme arrives, so `push()` returns the runs that are finished and `finish()` returns the tail. Boundaries are rounded the same way as in `build_frame_plan`, so both produce the same frames.
+
+4. **`get_audio_duration_ms(audio)`**:
+   - Reads the length of a WAV file from its header, or of an in-memory `PcmAudio` buffer, used to size the tail of the last viseme.
+"""
+
+DEFAULT_TAIL_MS = 1000
+
+
+class FramePlan:
+    def __init__(self, ids, counts, starts, fps):
+        self.ids = ids
+        self.counts = counts
+        self.starts = starts
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return zip(self.ids.tolist(), self.counts.tolist())
+
+    @property
+    def total_frames(self):
+        return int(self.counts.sum())
+
+    @property
+    def duration_ms(self):
+        return self.total_frames * 1000 / self.fps
+
+
+def get_audio_duration_ms(audio):
+    if isinstance(audio, PcmAudio):
+        return audio.duration_ms
+    with wave.open(audio, "rb") as opened_file:
+        return opened_file.getnframes() * 1000 / opened_file.getframerate()
+
+
+def visemes_to_arrays(data):
+    if isinstance(data, VisemeTimeline):
+        return data.offsets, data.ids
+    offsets = np.fromiter((chunk["offset"] for chunk in data), dtype=np.float64, count=len(data))
+    ids = np.fromiter((chunk["id"] for chunk in data), dtype=np.int64, count=len(data))
+    return offsets, ids
+
+
+def build_frame_plan(offsets, ids, fps, audio_duration_ms=None, tail_ms=DEFAULT_TAIL_MS):
+    offsets = np.asarray(offsets, dtype=np.float64)
+    ids = np.asarray(ids, dtype=np.int64)
+    if offsets.size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return FramePlan(empty, empty, empty, fps)
+
+    end_ms = audio_duration_ms if audio_duration_ms is not None else offsets[-1] + tail_ms
+    starts_ms = offsets.copy()
+    starts_ms[0] = 0.0
+    boundaries = np.rint(np.append(starts_ms, end_ms) * fps / 1000).astype(np.int64)
+    # Out of order offsets or audio that ends early must not produce negative runs.
+    boundaries = np.minimum(np.maximum.accumulate(boundaries), boundaries[-1])
+    counts = np.diff(boundaries)
+
+    keep = counts > 0
+    ids = ids[keep]
+    starts = boundaries[:-1][keep]
+    if ids.size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return FramePlan(empty, empty, empty, fps)
+
+    new_run = np.ones(ids.size, dtype=bool)
+    new_run[1:] = ids[1:] != ids[:-1]
+    run_ids = ids[new_run]
+    run_starts = starts[new_run]
+    run_counts = np.diff(np.append(run_starts, boundaries[-1]))
+    return FramePlan(run_ids, run_counts, run_starts, fps)
+
+
+def build_frame_plan_from_visemes(data, fps, audio_duration_ms=None, tail_ms=DEFAULT_TAIL_MS):
+    offsets, ids = visemes_to_arrays(data)
+    return build_frame_plan(offsets, ids, fps, audio_duration_ms, tail_ms)
+
+
+class StreamingTimeline:
+    def __init__(self, fps, tail_ms=DEFAULT_TAIL_MS):
+        self.fps = fps
+        self.tail_ms = tail_ms
+        self.pending_id = None
+        self.pending_start = 0
+        self.last_boundary = 0
+        self.last_offset = 0.0
+        self.total_frames = 0
+
+    def to_frame(self, offset):
+        return max(self.last_boundary, int(np.rint(offset * self.fps / 1000)))
+
+    def close_pending(self, boundary):
+        count = boundary - self.pending_start
+        self.pending_start = boundary
+        self.last_boundary = boundary
+        if count <= 0:
+            return []
+        self.total_frames += count
+        return [(self.pending_id, count)]
+
+    def push(self, offset, id):
+        self.last_offset = offset
+        if self.pending_id is None:
+            self.pending_id = id
+            return []
+        if id == self.pending_id:
+            return []
+        runs = self.close_pending(self.to_frame(offset))
+        self.pending_id = id
+        return runs
+
+    def finish(self, audio_duration_ms=None):
+        if self.pending_id is None:
+            return []
+        end_ms = audio_duration_ms if audio_duration_ms is not None else self.last_offset + self.tail_ms
+        runs = self.close_pending(self.to_frame(end_ms))
+        self.pending_id = None
+        return runs
@@ -0,0 +1,92 @@
+import json
+import socket
+import struct
+
+
+"""
+This module defines the framed wire protocol of the TCP servers. Unlike the legacy protocol (one `recv(8192)` searched for `"beff-mode"` and `<speak>...</speak>`), every message is a length-prefixed frame, so split or coalesced TCP reads are handled and a client can pipeline many requests on one connection.
+
+### Format:
+
+- A client opts in by sending `MAGIC` (`b"GAVF"`) once, right after connecting. Anything else is treated as the legacy protocol.
+- Every message after that is a frame: a 4-byte big-endian length followed by that many bytes of UTF-8 JSON.
+- Requests: `{"id": ..., "mode": "regular-mode", "text": "..."}`. `mode` is optional and sticks to the connection like the legacy mode commands. `{"id": ..., "type": "close"}` closes the connection once all pending responses are sent, `{"id": ..., "type": "stats"}` is answered with the server's latency histograms, counters and gauges (`tracing.Metrics.snapshot()`) as its result.
+- Responses carry the request ID: `{"id": ..., "status": "ok", "result": ...}`, `{"id": ..., "status": "busy"}` when the job queue is full, or `{"id": ..., "status": "error", "error": "..."}`. They are sent as jobs finish, not necessarily in request order.
+
+### Key Components:
+
+1. **`encode_frame(message)`**: serializes one message into a frame.
+2. **`FrameDecoder` Class**: incremental parser, `feed(data)` returns every message completed by `data` and keeps the remainder for the next call.
+3. **`FramedClient` Class**: small blocking client for pushing requests from another process (e.g. the LLM front end) and reading the tagged responses.
+"""
+
+MAGIC = b"GAVF"
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 1024 * 1024
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def encode_frame(message):
+    body = json.dumps(message).encode("utf-8")
+    if len(body) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(body)} bytes exceeds the {MAX_FRAME_SIZE} byte limit.")
+    return HEADER.pack(len(body)) + body
+
+
+class FrameDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        while len(self.buffer) >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer)
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit.")
+            if len(self.buffer) < HEADER.size + length:
+                break
+            body = bytes(self.buffer[HEADER.size:HEADER.size + length])
+            del self.buffer[:HEADER.size + length]
+            try:
+                message = json.loads(body.decode("utf-8"))
+            except ValueError as e:
+                raise ProtocolError(f"Invalid frame: {e}")
+            if not isinstance(message, dict):
+                raise ProtocolError("A frame must contain a JSON object.")
+            messages.append(message)
+        return messages
+
+
+class FramedClient:
+    def __init__(self, host, port, timeout=None):
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+        self.socket.sendall(MAGIC)
+        self.decoder = FrameDecoder()
+        self.pending = []
+
+    def send(self, request_id, text, mode=None):
+        message = {"id": request_id, "text": text}
+        if mode is not None:
+            message["mode"] = mode
+        self.socket.sendall(encode_frame(message))
+
+    def request_stats(self, request_id=None):
+        self.socket.sendall(encode_frame({"id": request_id, "type": "stats"}))
+
+    def receive(self):
+        while not self.pending:
+            data = self.socket.recv(65536)
+            if not data:
+                raise ConnectionError("Server closed the connection.")
+            self.pending.extend(self.decoder.feed(data))
+        return self.pending.pop(0)
+
+    def close(self):
+        try:
+            self.socket.sendall(encode_frame({"id": None, "type": "close"}))
+        finally:
+            self.socket.close()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from tracing import Trace
+
+
+"""
+This module gives every request its own workspace directory, so concurrent jobs never write to the same files. Before, every reply went through `audio/text_to_audio.wav`, `metadata/text_to_viseme.json`, `video/temp.mp4` and `video/2.mp4`, and two clients served at the same time overwrote each other's artifacts.
+
+### Key Components:
+
+1. **`JobWorkspace` Class**:
+   - Creates `work/<job_id>/` with unique paths for the viseme timeline (`visemes.json`) and the rendered videos (`video/`).
+   - Carries the per-job state that used to live on the shared `GenerateVideoAndAudio` instance: the mode the job was submitted with, the final video path, whether the player was already handed a segmented stream and the job's latency `trace` (`tracing.Trace`).
+   - `cleanup()` deletes the intermediates once the job is done. The final video is kept so the player can still open it, and older finished workspaces beyond `keep_jobs` are pruned.
+   - Used as a context manager, a job that fails is removed entirely.
+
+2. **`prune_workspaces(root, keep_jobs)`**:
+   - Deletes the oldest workspaces under `root` except the newest `keep_jobs` and the ones still in use.
+"""
+
+DEFAULT_ROOT = "work"
+DEFAULT_KEEP_JOBS = 8
+
+active_jobs = set()
+active_jobs_lock = threading.Lock()
+
+
+def make_job_id():
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:12]}"
+
+
+class JobWorkspace:
+    def __init__(self, root=DEFAULT_ROOT, mode=None, job_id=None, keep_jobs=DEFAULT_KEEP_JOBS):
+        self.root = root
+        self.mode = mode
+        self.job_id = job_id or make_job_id()
+        self.keep_jobs = keep_jobs
+        self.dir = os.path.join(root, self.job_id)
+        self.out_dir = os.path.join(self.dir, "video")
+        self.visemes_file = os.path.join(self.dir, "visemes.json")
+        self.final_path = None
+        self.streamed_to_player = False
+        self.trace = Trace(self.job_id)
+        with active_jobs_lock:
+            active_jobs.add(self.job_id)
+        os.makedirs(self.out_dir)
+
+    def kept_path(self):
+        # The final video (or the segment directory of a playlist) survives cleanup if it lives in the workspace.
+        if self.final_path is None:
+            return None
+        kept = os.path.abspath(self.final_path)
+        if not kept.startswith(os.path.abspath(self.dir) + os.sep):
+            return None
+        if kept.endswith(".m3u8"):
+            kept = os.path.dirname(kept)
+        return kept
+
+    def cleanup(self, keep_final=True):
+        kept = self.kept_path() if keep_final else None
+        if kept is None:
+            shutil.rmtree(self.dir, ignore_errors=True)
+        else:
+            for dir_path, dir_names, file_names in os.walk(self.dir, topdown=False):
+                for file_name in file_names:
+                    path = os.path.abspath(os.path.join(dir_path, file_name))
+                    if path != kept and not path.startswith(kept + os.sep):
+                        os.remove(path)
+                if dir_path != self.dir:
+                    try:
+                        os.rmdir(dir_path)
+                    except OSError:
+                        pass
+        with active_jobs_lock:
+            active_jobs.discard(self.job_id)
+        prune_workspaces(self.root, self.keep_jobs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup(keep_final=exc_type is None)
+        return False
+
+
+def prune_workspaces(root=DEFAULT_ROOT, keep_jobs=DEFAULT_KEEP_JOBS):
+    try:
+        job_ids = os.listdir(root)
+    except OSError:
+        return
+    finished = []
+    with active_jobs_lock:
+        running = set(active_jobs)
+    for job_id in job_ids:
+        job_dir = os.path.join(root, job_id)
+        if job_id in running or not os.path.isdir(job_dir):
+            continue
+        try:
+            finished.append((os.path.getmtime(job_dir), job_id, job_dir))
+        except OSError:
+            continue
+    finished.sort(reverse=True)
+    for _, job_id, job_dir in finished[keep_jobs:]:
+        shutil.rmtree(job_dir, ignore_errors=True)